@@ -0,0 +1,277 @@
+# src/book_parser/catalog.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.book_parser.index import BookIndex
+from src.book_parser.store import PageStore, compile_book_store, is_store_fresh
+from src.utils.logger import get_logger
+
+logger = get_logger("book_parser")
+
+# Допустимый идентификатор книги: имя папки книги без путей
+BOOK_SLUG_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class BookNotFoundError(LookupError):
+    """Книга с указанным идентификатором не найдена в каталоге."""
+
+
+def load_json(file_path: Path) -> Dict[str, Any]:
+    """
+    Загружает JSON данные из указанного файла.
+
+    Args:
+        file_path (Path): Путь к JSON файлу.
+
+    Returns:
+        dict: Загруженные данные.
+    """
+    try:
+        logger.debug(f"Загрузка JSON: {file_path.name}")
+        with file_path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        logger.debug(f"JSON загружен успешно")
+        return data
+    except Exception as e:
+        logger.error(f"Ошибка загрузки {file_path.name}: {e}")
+        raise
+
+
+def _file_signature(file_path: Path) -> Tuple[int, int, int]:
+    """
+    Возвращает подпись файла: время изменения, размер и inode.
+    Меняется при перезаписи файла как на месте, так и через rename.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+@dataclass(frozen=True)
+class BookPaths:
+    """Пути к файлам одной книги."""
+    know_map_path: Path
+    kniga_path: Path
+    store_path: Optional[Path] = None
+
+
+class BookEntry:
+    """
+    Книга в каталоге: пути к файлам и текущий снимок индекса.
+
+    Ссылка на индекс заменяется целиком при перезагрузке, поэтому запрос,
+    уже получивший индекс, работает со своим снимком до конца.
+    """
+    def __init__(self, slug: str, paths: BookPaths) -> None:
+        self.slug = slug
+        self.paths = paths
+        self.index: Optional[BookIndex] = None
+        self.signature: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def files_signature(self) -> Tuple:
+        """
+        Возвращает подпись файлов книги: исходных JSON и, если задано, хранилища.
+        Отсутствующие JSON при заданном хранилище не учитываются.
+        """
+        paths = [self.paths.know_map_path, self.paths.kniga_path]
+        if self.paths.store_path:
+            paths = [path for path in paths if path.exists()] + [self.paths.store_path]
+        return tuple(_file_signature(path) for path in paths)
+
+    def ensure_store(self) -> Path:
+        """
+        Проверяет скомпилированное хранилище книги и перекомпилирует его,
+        если оно отсутствует или собрано из старых версий JSON-файлов.
+
+        Returns:
+            Path: Путь к актуальному хранилищу.
+        """
+        store_path = self.paths.store_path
+        if not is_store_fresh(store_path, self.paths.know_map_path, self.paths.kniga_path):
+            logger.info(f"Хранилище книги {store_path.name} отсутствует или устарело, компилируем")
+            compile_book_store(self.paths.know_map_path, self.paths.kniga_path, store_path)
+        return store_path
+
+    def build_index(self, signature: Optional[Tuple] = None) -> BookIndex:
+        """
+        Загружает know_map_full.json и kniga_full_content.json
+        и строит по ним индекс книги.
+
+        Если задан store_path, структура книги берётся из скомпилированного
+        хранилища, а страницы читаются из него по запросу.
+
+        Args:
+            signature (Optional[Tuple]): Подпись файлов, из которой вычисляется версия индекса.
+
+        Returns:
+            BookIndex: Индекс книги.
+        """
+        version = hashlib.sha1(repr(signature).encode()).hexdigest()[:12] if signature else ""
+        if self.paths.store_path:
+            page_store = self._reusable_store() or PageStore(self.paths.store_path)
+            return BookIndex(page_store.read_meta("know_map"), version=version, page_store=page_store)
+        know_map_data = load_json(self.paths.know_map_path)
+        kniga_data = load_json(self.paths.kniga_path)
+        return BookIndex(know_map_data, kniga_data, version=version)
+
+    def _reusable_store(self) -> Optional[PageStore]:
+        # Файл хранилища не менялся - новый индекс читает страницы через открытое соединение
+        store = self.index.pages if self.index is not None else None
+        if not isinstance(store, PageStore) or not self.signature:
+            return None
+        if self.signature[-1] != _file_signature(self.paths.store_path):
+            return None
+        return store
+
+    def _release(self, previous: Optional[BookIndex]) -> None:
+        """
+        Закрывает хранилище заменённого индекса, если новый индекс его не использует.
+        Запросы, уже получившие старый индекс, дорабатывают на нём, поэтому
+        соединение закрывается, когда на старый индекс не остаётся ссылок.
+        """
+        store = previous.pages if previous is not None else None
+        if isinstance(store, PageStore) and (self.index is None or store is not self.index.pages):
+            weakref.finalize(previous, store.close)
+
+    def close(self) -> None:
+        """
+        Выгружает индекс книги и освобождает его хранилище.
+        """
+        with self._lock:
+            previous, self.index, self.signature = self.index, None, None
+            self._release(previous)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Перестраивает индекс книги, если её файлы изменились.
+
+        Новый индекс строится целиком и только затем подменяет старый.
+        При ошибке загрузки остаётся старый индекс.
+
+        Args:
+            force (bool): Перестроить индекс даже без изменений в файлах.
+
+        Returns:
+            bool: True, если индекс был перестроен.
+        """
+        with self._lock:
+            if self.paths.store_path:
+                self.ensure_store()
+            signature = self.files_signature()
+            if not force and self.index is not None and signature == self.signature:
+                return False
+            index = self.build_index(signature)
+            previous, self.index, self.signature = self.index, index, signature
+            self._release(previous)
+        logger.info(f"Индекс книги {self.slug} перезагружен (версия {index.version})")
+        return True
+
+    def get_index(self) -> BookIndex:
+        """
+        Возвращает индекс книги, при первом обращении строит его.
+        """
+        if self.index is None:
+            self.reload()
+        return self.index
+
+    def estimated_size(self) -> int:
+        """
+        Оценивает память, занимаемую индексом, по размеру исходных файлов (байты).
+        При работе через хранилище в памяти держится только структура книги.
+        """
+        if self.paths.store_path:
+            paths = [self.paths.know_map_path if self.paths.know_map_path.exists() else self.paths.store_path]
+        else:
+            paths = [self.paths.know_map_path, self.paths.kniga_path]
+        return sum(path.stat().st_size for path in paths if path.exists())
+
+
+class BookCatalog:
+    """
+    Каталог книг сервиса, ключ - идентификатор книги (slug).
+
+    Книги загружаются лениво при первом обращении. Загруженные книги
+    упорядочены по давности использования; если оценка занимаемой памяти
+    превышает бюджет, давно не использованные книги выгружаются.
+    """
+    def __init__(self, resolve_paths: Callable[[str], Optional[BookPaths]], memory_budget_bytes: int) -> None:
+        self._resolve_paths = resolve_paths
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[str, BookEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, slug: str) -> BookEntry:
+        """
+        Возвращает книгу каталога и отмечает её как недавно использованную.
+
+        Raises:
+            BookNotFoundError: Если книга не найдена.
+        """
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None:
+                self._entries.move_to_end(slug)
+                return entry
+
+        paths = self._resolve_paths(slug) if BOOK_SLUG_PATTERN.match(slug or "") else None
+        if paths is None:
+            raise BookNotFoundError(f"Книга '{slug}' не найдена")
+
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None:
+                entry = BookEntry(slug, paths)
+                self._entries[slug] = entry
+            self._entries.move_to_end(slug)
+            return entry
+
+    def get_index(self, slug: str) -> BookIndex:
+        """
+        Возвращает индекс книги, при необходимости загружая её
+        и выгружая давно не использованные книги сверх бюджета памяти.
+        """
+        entry = self.get_entry(slug)
+        loaded = entry.index is None
+        index = entry.get_index()
+        if loaded:
+            self._evict(keep=slug)
+        return index
+
+    def _evict(self, keep: str) -> None:
+        """
+        Выгружает давно не использованные книги, пока оценка памяти выше бюджета.
+        Только что запрошенная книга не выгружается.
+        """
+        with self._lock:
+            loaded = [(slug, entry) for slug, entry in self._entries.items() if entry.index is not None]
+            total = sum(entry.estimated_size() for _, entry in loaded)
+            for slug, entry in loaded:
+                if total <= self.memory_budget_bytes:
+                    break
+                if slug == keep:
+                    continue
+                total -= entry.estimated_size()
+                del self._entries[slug]
+                entry.close()
+                logger.info(f"Книга {slug} выгружена из памяти (бюджет {self.memory_budget_bytes // (1024 * 1024)} МБ)")
+
+    def loaded_entries(self) -> List[BookEntry]:
+        """
+        Возвращает загруженные книги.
+        """
+        with self._lock:
+            return [entry for entry in self._entries.values() if entry.index is not None]
+
+    def loaded_books(self) -> List[str]:
+        """
+        Возвращает идентификаторы загруженных книг от давно к недавно использованным.
+        """
+        return [entry.slug for entry in self.loaded_entries()]
@@ -2,14 +2,29 @@
 
 from src.config import BaseAppSettings
 from pydantic import ConfigDict
+from typing import Optional
 
 class BookParserSettings(BaseAppSettings):
     """
     Настройки для сервиса парсинга книг.
     """
 
+    # Файлы книги по умолчанию (доступна и по маршрутам без идентификатора книги)
     know_map_path: str 
     kniga_path: str
+    # Путь к скомпилированному хранилищу книги (SQLite); если не задан - читаем JSON
+    store_path: Optional[str] = None
+    # Период проверки файлов книги на изменения (секунды), 0 - отключить
+    reload_interval: float = 5.0
+
+    # Каталог книг: книга <slug> ищется в knowledge_maps_dir/<slug>/know_map_full.json
+    # и books_dir/<slug>/kniga_full_content.json, хранилище - в store_dir/<slug>.sqlite
+    default_book: str = "goldsmith"
+    knowledge_maps_dir: str = "data/knowledge_maps"
+    books_dir: str = "data/row"
+    store_dir: Optional[str] = None
+    # Бюджет памяти под загруженные книги (МБ); сверх него выгружаются давно не использованные
+    catalog_memory_budget_mb: int = 512
 
     model_config = ConfigDict(
         env_file='.env',
@@ -0,0 +1,146 @@
+# src/book_parser/index.py
+
+import re
+from collections.abc import Iterable as IterableABC
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from src.utils.logger import get_logger
+
+logger = get_logger("book_parser")
+
+
+def _to_int(value: Any) -> Optional[int]:
+    """
+    Приводит номер части/главы/страницы к int.
+    Возвращает None, если значение не является числом.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_page_number(value: Any) -> Optional[int]:
+    """
+    Приводит номер страницы к int.
+    В kniga номер страницы может быть строкой ("17"), в know_map - числом.
+    Возвращает None, если значение не является номером страницы.
+    """
+    if isinstance(value, bool):
+        return None
+    return _to_int(value.strip() if isinstance(value, str) else value)
+
+
+def normalize_page_numbers(value: Any) -> List[int]:
+    """
+    Приводит поле pages подглавы к списку номеров страниц (int) без повторов.
+
+    Поддерживаемые формы: список чисел или строк ([30, "31"]),
+    строка со списком ("[30, 31]" или "30, 31") и одиночный номер (30 или "30").
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        candidates: List[Any] = re.findall(r"\d+", value)
+    elif isinstance(value, IterableABC):
+        candidates = list(value)
+    else:
+        candidates = [value]
+    numbers = (normalize_page_number(candidate) for candidate in candidates)
+    return list(dict.fromkeys(number for number in numbers if number is not None))
+
+
+class BookIndex:
+    """
+    Индекс книги в памяти процесса.
+
+    Строится один раз из know_map_full.json и kniga_full_content.json
+    и содержит словари для быстрого поиска:
+      - parts: part_number -> часть
+      - chapters: (part_number, chapter_number) -> глава
+      - subchapters: subchapter_number -> подглава
+      - subchapter_pages: subchapter_number -> номера страниц подглавы (int)
+      - pages: номер страницы (int) -> страница
+
+    Номера страниц из обоих файлов приводятся к int при построении,
+    поэтому выборка страниц подглавы - это k обращений к словарю.
+
+    Парсеры работают с индексом, поэтому стоимость запроса сводится
+    к поиску по словарю вместо полного разбора JSON.
+
+    Индекс не изменяется после построения: при перезагрузке книги
+    строится новый экземпляр, а запросы в работе дочитывают старый.
+
+    Вместо kniga_data можно передать page_store - отображение номер -> страница
+    с методом get_many (см. src.book_parser.store.PageStore). Тогда страницы
+    не держатся в памяти, а читаются из скомпилированного хранилища по запросу.
+    """
+    def __init__(
+        self,
+        know_map_data: Dict[str, Any],
+        kniga_data: Optional[Dict[str, Any]] = None,
+        version: str = "",
+        page_store: Optional[Mapping[int, Dict[str, Any]]] = None,
+    ) -> None:
+        self.version = version
+        self.parts: Dict[int, Dict[str, Any]] = {}
+        self.chapters: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.chapters_by_part: Dict[int, List[Dict[str, Any]]] = {}
+        self.subchapters: Dict[str, Dict[str, Any]] = {}
+        self.subchapters_by_chapter: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        self.subchapter_pages: Dict[str, List[int]] = {}
+        self.pages: Mapping[int, Dict[str, Any]] = {}
+
+        self._index_know_map(know_map_data)
+        if page_store is not None:
+            self.pages = page_store
+        else:
+            self._index_pages(kniga_data or {})
+        logger.info(
+            f"Индекс книги построен: {len(self.parts)} частей, {len(self.chapters)} глав, "
+            f"{len(self.subchapters)} подглав, {len(self.pages)} страниц"
+        )
+
+    def _index_know_map(self, know_map_data: Dict[str, Any]) -> None:
+        """
+        Раскладывает части, главы и подглавы из know_map по словарям.
+        """
+        parts = know_map_data.get("content", {}).get("parts", [])
+        for part in parts:
+            part_number = _to_int(part.get("part_number"))
+            self.parts[part_number] = part
+            part_chapters = self.chapters_by_part.setdefault(part_number, [])
+            for chapter in part.get("chapters", []):
+                chapter_number = _to_int(chapter.get("chapter_number"))
+                self.chapters[(part_number, chapter_number)] = chapter
+                part_chapters.append(chapter)
+                chapter_subchapters = self.subchapters_by_chapter.setdefault((part_number, chapter_number), [])
+                for sub in chapter.get("subchapters", []):
+                    subchapter_number = str(sub.get("subchapter_number"))
+                    self.subchapters[subchapter_number] = sub
+                    self.subchapter_pages[subchapter_number] = normalize_page_numbers(sub.get("pages"))
+                    chapter_subchapters.append(sub)
+
+    def _index_pages(self, kniga_data: Dict[str, Any]) -> None:
+        """
+        Раскладывает страницы книги по номеру страницы.
+        """
+        pages: Dict[int, Dict[str, Any]] = {}
+        for page in kniga_data.get("book", {}).get("pages", []):
+            page_number = normalize_page_number(page.get("pageNumber"))
+            if page_number is None:
+                logger.debug(f"Пропущена страница без номера: {page.get('pageNumber')!r}")
+                continue
+            pages[page_number] = page
+        self.pages = pages
+
+    def get_pages(self, page_numbers: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Возвращает страницы по списку номеров в порядке их следования.
+        Номера приводятся к int, отсутствующие в книге номера пропускаются.
+        """
+        numbers = normalize_page_numbers(page_numbers)
+        get_many = getattr(self.pages, "get_many", None)
+        if get_many is not None:
+            return get_many(numbers)
+        pages = (self.pages.get(number) for number in numbers)
+        return [page for page in pages if page is not None]
@@ -1,11 +1,27 @@
 # src/book_parser/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from src.book_parser.routes import router as book_parser_router
+from src.book_parser.services import (
+    init_book_index,
+    start_book_index_watcher,
+    stop_book_index_watcher,
+)
 from src.config import settings
 
 
-app = FastAPI(title="Book Parser Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Строим индекс книги один раз при старте сервиса
+    # и следим за изменениями файлов книги, чтобы подхватывать их без рестарта
+    init_book_index()
+    start_book_index_watcher()
+    yield
+    stop_book_index_watcher()
+
+
+app = FastAPI(title="Book Parser Service", lifespan=lifespan)
 
 app.include_router(book_parser_router)
 
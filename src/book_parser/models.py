@@ -1,7 +1,7 @@
 # src/book_parser/models.py
 
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 
 class PartOutput(BaseModel):
@@ -31,6 +31,21 @@ class SubchapterOutput(BaseModel):
     summary: str
     key_points: str
 
+class SubchapterInfoOutput(SubchapterOutput):
+    """
+    Модель подглавы для справочной таблицы подглав:
+    описание подглавы вместе с номерами её страниц.
+    """
+    pages: List[int]
+
+class SubchapterSearchResult(BaseModel):
+    """
+    Модель результата поиска подглав по вопросу: номер, заголовок и оценка BM25.
+    """
+    subchapter_number: str
+    title: str
+    score: float
+
 class PageMetadata(BaseModel):
     """
     Модель для представления метаданных отдельной страницы.
@@ -46,3 +61,16 @@ class PageContentOutput(BaseModel):
     """
     subchapter_title: str
     pages: List[PageMetadata]
+
+class SubchaptersContentRequest(BaseModel):
+    """
+    Модель запроса содержимого нескольких подглав за один вызов.
+    """
+    subchapter_numbers: List[str]
+
+class SubchaptersContentOutput(BaseModel):
+    """
+    Модель ответа с содержимым нескольких подглав,
+    ключ - номер подглавы, порядок совпадает с порядком в запросе.
+    """
+    contents: Dict[str, PageContentOutput]
@@ -1,13 +1,14 @@
 from typing import List, Dict, Any
+from src.book_parser.index import BookIndex
 from src.book_parser.models import ChapterOutput
 from src.utils.logger import get_logger
 
 
 class ChapterParser:
     """
-    Класс для парсинга глав из файла know_map_full.json.
+    Класс для парсинга глав из индекса BookIndex.
 
-    Ожидаемый формат:
+    Индекс строится из know_map_full.json следующего формата:
     {
         "content": {
             "parts": [
@@ -28,8 +29,8 @@ class ChapterParser:
         }
     }
     """
-    def __init__(self, data: Dict[str, Any]) -> None:
-        self.data = data
+    def __init__(self, index: BookIndex) -> None:
+        self.index = index
         self.logger = get_logger(__name__)
 
     def to_model(self, chapter: Dict[str, Any]) -> ChapterOutput:
@@ -53,13 +54,11 @@ class ChapterParser:
         Находит часть с заданным part_number и парсит все её главы.
         Логгирует список заголовков всех распарсенных глав.
         """
-        parts = self.data.get("content", {}).get("parts", [])
-        for part in parts:
-            if part.get("part_number") == selected_part:
-                chapters = part.get("chapters", [])
-                models = [self.to_model(chapter) for chapter in chapters]
-                chapter_titles = [model.title for model in models]
-                self.logger.debug(f"Успешно распарсены главы: {chapter_titles}")
-                return models
+        chapters = self.index.chapters_by_part.get(selected_part)
+        if chapters is not None:
+            models = [self.to_model(chapter) for chapter in chapters]
+            chapter_titles = [model.title for model in models]
+            self.logger.debug(f"Успешно распарсены главы: {chapter_titles}")
+            return models
         self.logger.warning(f"Для части {selected_part} главы не найдены")
         return []
@@ -1,12 +1,13 @@
 from typing import List, Dict, Any
+from src.book_parser.index import BookIndex
 from src.book_parser.models import PartOutput
 from src.utils.logger import get_logger
 
 class ContentPartsParser:
     """
-    Класс для парсинга частей книги из JSON-структуры.
+    Класс для парсинга частей книги из индекса BookIndex.
 
-    Ожидаемый формат JSON:
+    Индекс строится из JSON следующего формата:
     {
         "content": {
             "parts": [
@@ -21,8 +22,8 @@ class ContentPartsParser:
         }
     }
     """
-    def __init__(self, data: Dict[str, Any]) -> None:
-        self.data = data
+    def __init__(self, index: BookIndex) -> None:
+        self.index = index
         self.logger = get_logger(__name__)
 
     def to_model(self, part: Dict[str, Any]) -> PartOutput:
@@ -46,7 +47,7 @@ class ContentPartsParser:
         Парсит список частей книги и возвращает список моделей PartOutput.
         Логгирует список заголовков всех распарсенных частей.
         """
-        parts = self.data.get("content", {}).get("parts", [])
+        parts = self.index.parts.values()
         models = [self.to_model(part) for part in parts]
         part_titles = [model.title for model in models]
         self.logger.debug(f"Успешно распарсены части: {part_titles}")
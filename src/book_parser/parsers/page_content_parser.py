@@ -1,4 +1,5 @@
 from typing import List, Dict, Any, Tuple
+from src.book_parser.index import BookIndex, normalize_page_number
 from src.book_parser.models import PageContentOutput, PageMetadata
 from src.utils.logger import get_logger
 
@@ -6,11 +7,12 @@ class PageContentParser:
     """
     Парсинг страниц по выбранной подглаве.
 
-    Сначала ищем в know_map_full.json подглаву с нужным subchapter_number,
-    затем извлекаем список номеров страниц (поле pages) и по ним ищем
-    содержимое в файле kniga.json.
+    Сначала ищем в индексе подглаву с нужным subchapter_number,
+    затем берём её номера страниц, заранее приведённые к int (поле pages
+    может быть и списком, и строкой вида "[30, 31]"), и по ним выбираем
+    содержимое страниц из индекса (номер страницы -> страница).
 
-    Ожидаемый формат know_map_full.json для подглав:
+    Индекс строится из know_map_full.json:
     {
         "content": {
             "parts": [
@@ -36,7 +38,7 @@ class PageContentParser:
         }
     }
 
-    Ожидаемый формат kniga_full_content.json:
+    и из kniga_full_content.json:
     {
         "book": {
             "pages": [
@@ -49,45 +51,35 @@ class PageContentParser:
         }
     }
     """
-    def __init__(self, know_map_data: Dict[str, Any], kniga_data: Dict[str, Any]) -> None:
-        self.know_map_data = know_map_data
-        self.kniga_data = kniga_data
+    def __init__(self, index: BookIndex) -> None:
+        self.index = index
         self.logger = get_logger(__name__)
 
     def get_pages_for_subchapter(self, selected_subchapter: str) -> Tuple[List[int], str]:
         """
-        Ищет в know_map_data подглаву с заданным subchapter_number и возвращает
+        Ищет в индексе подглаву с заданным subchapter_number и возвращает
         кортеж: список номеров страниц и заголовок подглавы.
         Логгирует найденные номера страниц.
         """
-        parts = self.know_map_data.get("content", {}).get("parts", [])
-        for part in parts:
-            chapters = part.get("chapters", [])
-            for chapter in chapters:
-                subchapters = chapter.get("subchapters", [])
-                for sub in subchapters:
-                    if str(sub.get("subchapter_number")) == str(selected_subchapter):
-                        pages = sub.get("pages", [])
-                        # Предполагается, что заголовок подглавы хранится в поле "title"
-                        subchapter_title = sub.get("title", "Неизвестный заголовок")
-                        self.logger.debug(f"Найдено страницы для подглавы {selected_subchapter}: {pages} с заголовком '{subchapter_title}'")
-                        return pages, subchapter_title
+        sub = self.index.subchapters.get(str(selected_subchapter))
+        if sub is not None:
+            pages = self.index.subchapter_pages.get(str(selected_subchapter), [])
+            # Предполагается, что заголовок подглавы хранится в поле "title"
+            subchapter_title = sub.get("title", "Неизвестный заголовок")
+            self.logger.debug(f"Найдено страницы для подглавы {selected_subchapter}: {pages} с заголовком '{subchapter_title}'")
+            return pages, subchapter_title
         self.logger.debug(f"Страницы для подглавы {selected_subchapter} не найдены")
         return [], "Неизвестный заголовок"
 
     def get_page_content(self, page_numbers: List[int]) -> (str, str):
         """
-        Ищет содержимое страниц в kniga_full_content по заданным номерам страниц.
+        Берёт содержимое страниц из индекса по заданным номерам страниц.
         Логгирует номера страниц, для которых получено содержимое.
         Возвращает кортеж из объединенного текста 'content' и 'summary'.
         """
-        pages = self.kniga_data.get("book", {}).get("pages", [])
-        contents: List[str] = []
-        summaries: List[str] = []
-        for page in pages:
-            if page.get("pageNumber") in page_numbers:
-                contents.append(str(page.get("content", "")))
-                summaries.append(str(page.get("summary", "")))
+        pages = self.index.get_pages(page_numbers)
+        contents = [str(page.get("content", "")) for page in pages]
+        summaries = [str(page.get("summary", "")) for page in pages]
         self.logger.debug(f"Получено содержимое и резюме для страниц: {page_numbers}")
         combined_content = "\n\n".join(contents)
         combined_summary = "\n\n".join(summaries)
@@ -101,17 +93,14 @@ class PageContentParser:
         Логгирует успешное получение финального контента.
         """
         page_numbers, subchapter_title = self.get_pages_for_subchapter(selected_subchapter)
-        pages_data = self.kniga_data.get("book", {}).get("pages", [])
-        pages_list: List[PageMetadata] = []
-        
-        for page in pages_data:
-            if page.get("pageNumber") in page_numbers:
-                page_metadata = PageMetadata(
-                    page_number=page.get("pageNumber"),
-                    content=str(page.get("content", "")),
-                    summary=str(page.get("summary", ""))
-                )
-                pages_list.append(page_metadata)
+        pages_list: List[PageMetadata] = [
+            PageMetadata(
+                page_number=normalize_page_number(page.get("pageNumber")),
+                content=str(page.get("content", "")),
+                summary=str(page.get("summary", ""))
+            )
+            for page in self.index.get_pages(page_numbers)
+        ]
         
         self.logger.debug(f"Финальное содержимое успешно распарсено для подглавы {selected_subchapter}")
         return PageContentOutput(subchapter_title=subchapter_title, pages=pages_list)
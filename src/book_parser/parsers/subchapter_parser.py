@@ -1,12 +1,13 @@
 from typing import List, Dict, Any
+from src.book_parser.index import BookIndex
 from src.book_parser.models import SubchapterOutput
 from src.utils.logger import get_logger
 
 class SubchapterParser:
     """
-    Парсинг подглав для выбранной главы в know_map_full.json.
+    Парсинг подглав для выбранной главы из индекса BookIndex.
 
-    Ожидаемый формат:
+    Индекс строится из know_map_full.json следующего формата:
     {
         "content": {
             "parts": [
@@ -33,8 +34,8 @@ class SubchapterParser:
         }
     }
     """
-    def __init__(self, data: Dict[str, Any]) -> None:
-        self.data = data
+    def __init__(self, index: BookIndex) -> None:
+        self.index = index
         self.logger = get_logger(__name__)
 
     def to_model(self, subchapter: Dict[str, Any]) -> SubchapterOutput:
@@ -55,19 +56,14 @@ class SubchapterParser:
 
     def parse_subchapters_by_chapter(self, selected_part: int, selected_chapter: int) -> List[SubchapterOutput]:
         """
-        Находит часть с заданным part_number, затем главу с заданным chapter_number и парсит её подглавы.
+        Находит главу по ключу (part_number, chapter_number) и парсит её подглавы.
         Логгирует список заголовков всех распарсенных подглав.
         """
-        parts = self.data.get("content", {}).get("parts", [])
-        for part in parts:
-            if part.get("part_number") == selected_part:
-                chapters = part.get("chapters", [])
-                for chapter in chapters:
-                    if chapter.get("chapter_number") == selected_chapter:
-                        subchapters = chapter.get("subchapters", [])
-                        models = [self.to_model(sub) for sub in subchapters]
-                        subchapter_titles = [model.title for model in models]
-                        self.logger.debug(f"Успешно распарсены подглавы: {subchapter_titles}")
-                        return models
+        subchapters = self.index.subchapters_by_chapter.get((selected_part, selected_chapter))
+        if subchapters is not None:
+            models = [self.to_model(sub) for sub in subchapters]
+            subchapter_titles = [model.title for model in models]
+            self.logger.debug(f"Успешно распарсены подглавы: {subchapter_titles}")
+            return models
         self.logger.debug(f"Для части {selected_part} и главы {selected_chapter} подглавы не найдены")
         return []
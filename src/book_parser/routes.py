@@ -1,80 +1,243 @@
 # src/book_parser/routes.py
 
-from fastapi import APIRouter, HTTPException
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Optional
 from src.book_parser.services import (
     get_parts,
     get_chapters_by_part,
     get_subchapters_by_chapter,
     get_page_content,
+    get_pages_content,
+    get_subchapter_table,
+    search_subchapters,
+    get_book_index,
+    reload_book_index,
+    list_books,
+    catalog,
+    BookNotFoundError,
 )
+from src.book_parser.models import SubchaptersContentRequest, SubchaptersContentOutput
 from src.utils.logger import get_logger
 
 logger = get_logger("book_parser")
 
 router = APIRouter(prefix="/parser", tags=["book_parser"])
 
+# Каждый эндпоинт книги доступен в двух вариантах: /parser/... для книги
+# по умолчанию и /parser/{book}/... для книги из каталога по её идентификатору.
+
+@router.get("/health", response_model=Dict)
+def health() -> Dict:
+    """
+    Лёгкая проверка работоспособности: не строит индекс и не читает файлы книги,
+    только сообщает, какие книги уже загружены в память.
+    """
+    return {"status": "ok", "loaded": catalog.loaded_books()}
+
+
+@router.get("/books", response_model=Dict)
+def books() -> Dict:
+    """
+    Эндпоинт для получения списка книг каталога и загруженных в память книг.
+    """
+    try:
+        logger.debug("Запрос списка книг")
+        return {"books": list_books(), "loaded": catalog.loaded_books()}
+    except Exception as e:
+        logger.error(f"Ошибка получения списка книг: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/version", response_model=Dict)
+@router.get("/{book}/version", response_model=Dict)
+def version(book: Optional[str] = None) -> Dict:
+    """
+    Эндпоинт для получения версии индекса книги.
+    Версия меняется при перезагрузке изменённых файлов книги.
+
+    Args:
+        book (Optional[str]): Идентификатор книги.
+    """
+    try:
+        return {"version": get_book_index(book).version}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка получения версии книги: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/parts", response_model=Dict)
-def parts() -> Dict:
+@router.get("/{book}/parts", response_model=Dict)
+def parts(book: Optional[str] = None) -> Dict:
     """
     Эндпоинт для получения списка частей книги.
+
+    Args:
+        book (Optional[str]): Идентификатор книги.
     """
     try:
         logger.debug("Запрос списка частей")
-        parts_data = get_parts()
+        parts_data = get_parts(book)
         return {"parts": parts_data}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка получения частей: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/parts/{part_number}/chapters", response_model=Dict)
-def chapters(part_number: int) -> Dict:
+@router.get("/{book}/parts/{part_number}/chapters", response_model=Dict)
+def chapters(part_number: int, book: Optional[str] = None) -> Dict:
     """
     Эндпоинт для получения списка глав для выбранной части книги.
 
     Args:
         part_number (int): Номер части книги.
+        book (Optional[str]): Идентификатор книги.
     """
     try:
         logger.debug(f"Запрос глав для части {part_number}")
-        chapters_data = get_chapters_by_part(part_number)
+        chapters_data = get_chapters_by_part(part_number, book)
         return {"chapters": chapters_data}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка получения глав для части {part_number}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/parts/{part_number}/chapters/{chapter_number}/subchapters", response_model=Dict)
-def subchapters(part_number: int, chapter_number: int) -> Dict:
+@router.get("/{book}/parts/{part_number}/chapters/{chapter_number}/subchapters", response_model=Dict)
+def subchapters(part_number: int, chapter_number: int, book: Optional[str] = None) -> Dict:
     """
     Эндпоинт для получения списка подглав для выбранной главы книги.
 
     Args:
         part_number (int): Номер части книги.
         chapter_number (int): Номер главы книги.
+        book (Optional[str]): Идентификатор книги.
     """
     try:
         logger.debug(f"Запрос подглав для части {part_number}, главы {chapter_number}")
-        subchapters_data = get_subchapters_by_chapter(part_number, chapter_number)
+        subchapters_data = get_subchapters_by_chapter(part_number, chapter_number, book)
         return {"subchapters": subchapters_data}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка получения подглав для части {part_number}, главы {chapter_number}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/subchapters", response_model=Dict)
+@router.get("/{book}/subchapters", response_model=Dict)
+def subchapter_table(book: Optional[str] = None) -> Dict:
+    """
+    Эндпоинт для получения таблицы всех подглав книги по номеру подглавы
+    (заголовок, summary, ключевые моменты, номера страниц).
+
+    Args:
+        book (Optional[str]): Идентификатор книги.
+    """
+    try:
+        logger.debug("Запрос таблицы подглав")
+        return {"subchapters": get_subchapter_table(book)}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка получения таблицы подглав: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search", response_model=Dict)
+@router.get("/{book}/search", response_model=Dict)
+def search(
+    query: str = Query(..., min_length=1),
+    k: int = Query(5, ge=1, le=50),
+    book: Optional[str] = None,
+) -> Dict:
+    """
+    Эндпоинт для поиска подглав, наиболее подходящих к тексту вопроса (BM25).
+
+    Args:
+        query (str): Текст вопроса.
+        k (int): Максимальное количество подглав в ответе.
+        book (Optional[str]): Идентификатор книги.
+    """
+    try:
+        logger.debug(f"Поиск подглав: {len(query)} символов, k={k}")
+        return {"results": search_subchapters(query, k, book)}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка поиска подглав: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/subchapters/{subchapter_number}/content", response_model=Dict)
-def content(subchapter_number: str) -> Dict:
+@router.get("/{book}/subchapters/{subchapter_number}/content", response_model=Dict)
+def content(subchapter_number: str, book: Optional[str] = None) -> Dict:
     """
     Эндпоинт для получения содержимого страниц для выбранной подглавы книги.
 
     Args:
         subchapter_number (str): Номер подглавы книги.
+        book (Optional[str]): Идентификатор книги.
     """
     try:
         logger.debug(f"Запрос контента подглавы {subchapter_number}")
-        content_data = get_page_content(subchapter_number)
+        content_data = get_page_content(subchapter_number, book)
         return {"content": content_data}
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка получения контента подглавы {subchapter_number}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/subchapters/content", response_model=SubchaptersContentOutput)
+@router.post("/{book}/subchapters/content", response_model=SubchaptersContentOutput)
+def contents(payload: SubchaptersContentRequest, book: Optional[str] = None) -> SubchaptersContentOutput:
+    """
+    Эндпоинт для получения содержимого страниц сразу для нескольких подглав книги.
+
+    Args:
+        payload (SubchaptersContentRequest): Номера подглав книги.
+        book (Optional[str]): Идентификатор книги.
+    """
+    try:
+        logger.debug(f"Запрос контента подглав {payload.subchapter_numbers}")
+        contents_data = get_pages_content(payload.subchapter_numbers, book)
+        return SubchaptersContentOutput(contents=contents_data)
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка получения контента подглав {payload.subchapter_numbers}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/admin/reload", response_model=Dict)
+def reload_index(book: Optional[str] = None) -> Dict:
+    """
+    Эндпоинт для принудительной перезагрузки индекса книги из файлов.
+    Запросы, начатые до перезагрузки, дорабатывают на старом индексе.
+
+    Args:
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+    """
+    try:
+        logger.info(f"Принудительная перезагрузка индекса книги {book or ''}".rstrip())
+        reload_book_index(force=True, book=book)
+        index = get_book_index(book)
+        return {
+            "reloaded": True,
+            "version": index.version,
+            "subchapters": len(index.subchapters),
+            "pages": len(index.pages),
+        }
+    except BookNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка перезагрузки индекса книги: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,242 @@
+# src/book_parser/search.py
+
+"""
+Полнотекстовый поиск подглав по вопросу (BM25).
+
+Строится в памяти по индексу книги (BookIndex) из двух коллекций:
+  - описания подглав из know_map (заголовок, summary, key_points)
+  - страницы книги из kniga (content)
+
+Текст разбивается на слова, стоп-слова отбрасываются, слова приводятся
+к основе стеммером Портера для русского языка (алгоритм Snowball).
+Оценка подглавы - BM25 её описания плюс лучшая BM25 среди её страниц.
+"""
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from src.book_parser.index import BookIndex, normalize_page_number
+from src.utils.logger import get_logger
+
+logger = get_logger("book_parser")
+
+# --------------------------------------------------------------------
+# Стеммер Snowball для русского языка
+# --------------------------------------------------------------------
+_VOWELS = "аеиоуыэюя"
+
+# Окончания первой группы удаляются, только если перед ними стоит "а" или "я"
+_PERFECTIVE_GERUND = (("в", "вши", "вшись"), ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"))
+_ADJECTIVE = ((), (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+))
+_PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+_REFLEXIVE = ((), ("ся", "сь"))
+_VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+    (
+        "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым",
+        "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+    ),
+)
+_NOUN = ((), (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой", "ий",
+    "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю",
+    "ия", "ья", "я",
+))
+_DERIVATIONAL = ("ость", "ост")
+_SUPERLATIVE = ("ейше", "ейш")
+
+
+def _longest_first(groups: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> List[Tuple[str, bool]]:
+    endings = [(ending, True) for ending in groups[0]] + [(ending, False) for ending in groups[1]]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+_PERFECTIVE_GERUND_ENDINGS = _longest_first(_PERFECTIVE_GERUND)
+_ADJECTIVE_ENDINGS = _longest_first(_ADJECTIVE)
+_PARTICIPLE_ENDINGS = _longest_first(_PARTICIPLE)
+_REFLEXIVE_ENDINGS = _longest_first(_REFLEXIVE)
+_VERB_ENDINGS = _longest_first(_VERB)
+_NOUN_ENDINGS = _longest_first(_NOUN)
+
+
+def _strip_ending(rv: str, endings: List[Tuple[str, bool]]) -> Optional[str]:
+    """
+    Удаляет самое длинное подходящее окончание из области RV.
+    Возвращает None, если окончание не найдено.
+    """
+    for ending, after_a_ya in endings:
+        if not rv.endswith(ending):
+            continue
+        stem = rv[:-len(ending)]
+        if after_a_ya and not (stem and stem[-1] in "ая"):
+            continue
+        return stem
+    return None
+
+
+def _next_region(word: str, start: int) -> int:
+    # Начало области после первой согласной, стоящей за гласной (R1/R2)
+    for i in range(max(start, 1), len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100_000)
+def stem_russian(word: str) -> str:
+    """
+    Возвращает основу русского слова (стеммер Snowball для русского языка).
+    """
+    word = word.replace("ё", "е")
+    rv_start = next((i + 1 for i, ch in enumerate(word) if ch in _VOWELS), len(word))
+    r2_start = _next_region(word, _next_region(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие или (возвратная частица и) прилагательное/глагол/существительное
+    stem = _strip_ending(rv, _PERFECTIVE_GERUND_ENDINGS)
+    if stem is None:
+        rv = _strip_ending(rv, _REFLEXIVE_ENDINGS) or rv
+        stem = _strip_ending(rv, _ADJECTIVE_ENDINGS)
+        if stem is not None:
+            stem = _strip_ending(stem, _PARTICIPLE_ENDINGS) or stem
+        else:
+            stem = _strip_ending(rv, _VERB_ENDINGS)
+            if stem is None:
+                stem = _strip_ending(rv, _NOUN_ENDINGS)
+    rv = stem if stem is not None else rv
+
+    # Шаг 2: конечное "и"
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в области R2
+    for ending in _DERIVATIONAL:
+        if rv.endswith(ending) and rv_start + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4: превосходная степень, двойное "н", мягкий знак
+    for ending in _SUPERLATIVE:
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+# --------------------------------------------------------------------
+# Токенизация
+# --------------------------------------------------------------------
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+STOP_WORDS = frozenset(
+    """
+    а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его
+    ее ей ему если есть еще же за здесь и из или им их к как какой когда кто ли либо мне может мы на над
+    надо наш не него нее нет ни них но ну о об однако он она они оно от очень по под при про с со так такое
+    также такой там те тем то того тоже той только том ты у уже хотя чего чей чем что чтобы чье чья эта
+    эти это этого этой этом этот я
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на основы слов без стоп-слов.
+    """
+    words = _WORD_RE.findall(text.lower().replace("ё", "е"))
+    return [stem_russian(word) for word in words if len(word) > 1 and word not in STOP_WORDS]
+
+
+# --------------------------------------------------------------------
+# BM25
+# --------------------------------------------------------------------
+class BM25:
+    """
+    Индекс BM25 над коллекцией документов (списков основ слов).
+
+    Args:
+        documents: Документы по их идентификаторам.
+        k1 (float): Насыщение частоты термина.
+        b (float): Степень нормализации по длине документа.
+    """
+    def __init__(self, documents: Dict[Hashable, List[str]], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = {doc_id: len(terms) for doc_id, terms in documents.items()}
+        self.avg_length = sum(self.doc_lengths.values()) / len(documents) if documents else 0.0
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        for doc_id, terms in documents.items():
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def scores(self, query_terms: Iterable[str]) -> Dict[Hashable, float]:
+        """
+        Возвращает оценки документов, содержащих хотя бы один термин запроса.
+        """
+        scores: Dict[Hashable, float] = {}
+        for term in set(query_terms):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+class SubchapterSearchIndex:
+    """
+    Поиск подглав книги по тексту вопроса.
+
+    Строится один раз на экземпляр BookIndex: индекс книги не меняется
+    после построения, а при перезагрузке книги строится новый.
+    """
+    def __init__(self, index: BookIndex) -> None:
+        self.order = list(index.subchapters)
+        self.descriptions = BM25({
+            number: tokenize(" ".join(str(sub.get(field, "")) for field in ("title", "summary", "key_points")))
+            for number, sub in index.subchapters.items()
+        })
+        self.page_subchapters: Dict[int, List[str]] = {}
+        for number, pages in index.subchapter_pages.items():
+            for page_number in pages:
+                self.page_subchapters.setdefault(page_number, []).append(number)
+        page_texts: Dict[Hashable, List[str]] = {}
+        for page in index.get_pages(sorted(self.page_subchapters)):
+            page_number = normalize_page_number(page.get("pageNumber"))
+            if page_number is not None:
+                page_texts[page_number] = tokenize(page.get("content", ""))
+        self.pages = BM25(page_texts)
+        logger.info(f"Поисковый индекс построен: {len(self.order)} подглав, {len(page_texts)} страниц")
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Возвращает до k подглав с наибольшей оценкой по убыванию оценки.
+        Подглавы без совпадений с вопросом не возвращаются.
+        """
+        terms = tokenize(query)
+        scores = dict(self.descriptions.scores(terms))
+        best_page: Dict[str, float] = {}
+        for page_number, score in self.pages.scores(terms).items():
+            for number in self.page_subchapters.get(page_number, []):
+                best_page[number] = max(best_page.get(number, 0.0), score)
+        for number, score in best_page.items():
+            scores[number] = scores.get(number, 0.0) + score
+        position = {number: i for i, number in enumerate(self.order)}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], position.get(item[0], 0)))
+        return ranked[:k]
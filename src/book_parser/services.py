@@ -1,9 +1,14 @@
 # src/book_parser/services.py
 
-import json
+import threading
+import weakref
 from pathlib import Path
-from typing import Any, Dict
+from typing import Dict, List, Optional
 from src.book_parser.config import settings
+from src.book_parser.catalog import BookCatalog, BookNotFoundError, BookPaths, load_json
+from src.book_parser.index import BookIndex
+from src.book_parser.models import PageContentOutput, SubchapterInfoOutput, SubchapterSearchResult
+from src.book_parser.search import SubchapterSearchIndex
 from src.book_parser.parsers.content_parts_parser import ContentPartsParser
 from src.book_parser.parsers.chapter_parser import ChapterParser
 from src.book_parser.parsers.subchapter_parser import SubchapterParser
@@ -12,90 +17,281 @@ from src.utils.logger import get_logger
 
 logger = get_logger("book_parser")
 
-def load_json(file_path: Path) -> Dict[str, Any]:
+KNOW_MAP_FILENAME = "know_map_full.json"
+KNIGA_FILENAME = "kniga_full_content.json"
+
+def resolve_book_paths(book: str) -> Optional[BookPaths]:
+    """
+    Находит файлы книги по её идентификатору.
+
+    Книга по умолчанию берёт пути из know_map_path/kniga_path/store_path,
+    остальные ищутся в папках каталога по имени книги.
+
+    Args:
+        book (str): Идентификатор книги (имя папки).
+
+    Returns:
+        Optional[BookPaths]: Пути к файлам книги или None, если книги нет.
+    """
+    if book == settings.default_book:
+        return BookPaths(
+            know_map_path=Path(settings.know_map_path),
+            kniga_path=Path(settings.kniga_path),
+            store_path=Path(settings.store_path) if settings.store_path else None,
+        )
+    paths = BookPaths(
+        know_map_path=Path(settings.knowledge_maps_dir) / book / KNOW_MAP_FILENAME,
+        kniga_path=Path(settings.books_dir) / book / KNIGA_FILENAME,
+        store_path=Path(settings.store_dir) / f"{book}.sqlite" if settings.store_dir else None,
+    )
+    if paths.store_path and paths.store_path.exists():
+        return paths
+    if paths.know_map_path.exists() and paths.kniga_path.exists():
+        return paths
+    return None
+
+def list_books() -> List[str]:
+    """
+    Возвращает идентификаторы всех книг, доступных в каталоге.
+    """
+    books = {settings.default_book}
+    knowledge_maps_dir = Path(settings.knowledge_maps_dir)
+    if knowledge_maps_dir.is_dir():
+        books.update(path.parent.name for path in knowledge_maps_dir.glob(f"*/{KNOW_MAP_FILENAME}"))
+    if settings.store_dir and Path(settings.store_dir).is_dir():
+        books.update(path.stem for path in Path(settings.store_dir).glob("*.sqlite"))
+    return sorted(book for book in books if resolve_book_paths(book) is not None)
+
+# Каталог книг, общий для всего процесса
+catalog = BookCatalog(resolve_book_paths, settings.catalog_memory_budget_mb * 1024 * 1024)
+
+# Фоновый наблюдатель за файлами книг
+_watcher_thread: Optional[threading.Thread] = None
+_watcher_stop = threading.Event()
+
+def reload_book_index(force: bool = False, book: Optional[str] = None) -> bool:
+    """
+    Перестраивает индекс книги, если файлы книги изменились.
+
+    Новый индекс строится целиком и только затем подменяет старый,
+    поэтому запросы в работе продолжают использовать прежний снимок.
+    При ошибке загрузки остаётся старый индекс.
+
+    Args:
+        force (bool): Перестроить индекс даже без изменений в файлах.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+
+    Returns:
+        bool: True, если индекс был перестроен.
+    """
+    return catalog.get_entry(book or settings.default_book).reload(force=force)
+
+def init_book_index() -> BookIndex:
+    """
+    Строит индекс книги по умолчанию при старте сервиса.
+    Остальные книги каталога загружаются при первом обращении.
+
+    Returns:
+        BookIndex: Построенный индекс книги.
+    """
+    return catalog.get_index(settings.default_book)
+
+def get_book_index(book: Optional[str] = None) -> BookIndex:
     """
-    Загружает JSON данные из указанного файла.
+    Возвращает индекс книги, при первом обращении строит его.
 
     Args:
-        file_path (Path): Путь к JSON файлу.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
 
     Returns:
-        dict: Загруженные данные.
+        BookIndex: Индекс книги.
+
+    Raises:
+        BookNotFoundError: Если книга не найдена в каталоге.
+    """
+    return catalog.get_index(book or settings.default_book)
+
+def _watch_book_files(interval: float) -> None:
+    """
+    Периодически сверяет подписи файлов загруженных книг и перезагружает изменившиеся.
+    """
+    while not _watcher_stop.wait(interval):
+        for entry in catalog.loaded_entries():
+            try:
+                entry.reload()
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки индекса книги {entry.slug}: {e}")
+
+def start_book_index_watcher() -> None:
+    """
+    Запускает фоновый поток, следящий за изменениями файлов загруженных книг.
+    Период проверки задаётся настройкой reload_interval (0 - не запускать).
+    """
+    global _watcher_thread
+    if settings.reload_interval <= 0 or (_watcher_thread and _watcher_thread.is_alive()):
+        return
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(
+        target=_watch_book_files,
+        args=(settings.reload_interval,),
+        name="book-index-watcher",
+        daemon=True,
+    )
+    _watcher_thread.start()
+    logger.debug(f"Наблюдение за файлами книги запущено (каждые {settings.reload_interval}с)")
+
+def stop_book_index_watcher() -> None:
     """
-    try:
-        logger.debug(f"Загрузка JSON: {file_path.name}")
-        with file_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        logger.debug(f"JSON загружен успешно")
-        return data
-    except Exception as e:
-        logger.error(f"Ошибка загрузки {file_path.name}: {e}")
-        raise
+    Останавливает фоновый поток наблюдения за файлами книг.
+    """
+    global _watcher_thread
+    _watcher_stop.set()
+    if _watcher_thread:
+        _watcher_thread.join(timeout=5)
+    _watcher_thread = None
 
-def get_parts():
+def get_parts(book: Optional[str] = None):
     """
     Получает список частей книги с использованием ContentPartsParser.
 
+    Args:
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+
     Returns:
         List[PartOutput]: Список моделей частей книги.
     """
-    know_map_path = Path(settings.know_map_path)
-    know_map_data = load_json(know_map_path)
-    parser = ContentPartsParser(know_map_data)
+    parser = ContentPartsParser(get_book_index(book))
     parts = parser.parse_parts()
     logger.info(f"Получено {len(parts)} частей книги")
     return parts
 
-def get_chapters_by_part(part_number: int):
+def get_chapters_by_part(part_number: int, book: Optional[str] = None):
     """
     Получает список глав для указанной части книги с использованием ChapterParser.
 
     Args:
         part_number (int): Номер части книги.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
 
     Returns:
         List[ChapterOutput]: Список моделей глав книги.
     """
-    know_map_path = Path(settings.know_map_path)
-    know_map_data = load_json(know_map_path)
-    parser = ChapterParser(know_map_data)
+    parser = ChapterParser(get_book_index(book))
     chapters = parser.parse_chapters_by_part(part_number)
     logger.info(f"Для части {part_number} найдено {len(chapters)} глав")
     return chapters
 
-def get_subchapters_by_chapter(part_number: int, chapter_number: int):
+def get_subchapters_by_chapter(part_number: int, chapter_number: int, book: Optional[str] = None):
     """
     Получает список подглав для указанной главы книги с использованием SubchapterParser.
 
     Args:
         part_number (int): Номер части книги.
         chapter_number (int): Номер главы книги.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
 
     Returns:
         List[SubchapterOutput]: Список моделей подглав книги.
     """
-    know_map_path = Path(settings.know_map_path)
-    know_map_data = load_json(know_map_path)
-    parser = SubchapterParser(know_map_data)
+    parser = SubchapterParser(get_book_index(book))
     subchapters = parser.parse_subchapters_by_chapter(part_number, chapter_number)
     logger.info(f"Для части {part_number}, главы {chapter_number} найдено {len(subchapters)} подглав")
     return subchapters
 
-def get_page_content(subchapter_number: str):
+def get_page_content(subchapter_number: str, book: Optional[str] = None):
     """
     Получает содержимое страниц для выбранной подглавы книги с использованием PageContentParser.
 
     Args:
         subchapter_number (str): Номер подглавы книги.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
 
     Returns:
         PageContentOutput: Модель с содержимом страниц.
     """
-    know_map_path = Path(settings.know_map_path)
-    kniga_path = Path(settings.kniga_path)
-    know_map_data = load_json(know_map_path)
-    kniga_data = load_json(kniga_path)
-    parser = PageContentParser(know_map_data, kniga_data)
+    parser = PageContentParser(get_book_index(book))
     content = parser.parse_final_content(subchapter_number)
     logger.info(f"Получен контент подглавы {subchapter_number}: {len(content.pages)} страниц")
-    return content
\ No newline at end of file
+    return content
+
+def get_pages_content(subchapter_numbers: List[str], book: Optional[str] = None) -> Dict[str, PageContentOutput]:
+    """
+    Получает содержимое страниц сразу для нескольких подглав книги.
+    Все подглавы читаются из одного снимка индекса.
+
+    Args:
+        subchapter_numbers (List[str]): Номера подглав книги.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+
+    Returns:
+        Dict[str, PageContentOutput]: Содержимое подглав по их номерам в порядке запроса.
+    """
+    parser = PageContentParser(get_book_index(book))
+    contents = {number: parser.parse_final_content(number) for number in dict.fromkeys(subchapter_numbers)}
+    logger.info(f"Получен контент {len(contents)} подглав")
+    return contents
+
+def get_subchapter_table(book: Optional[str] = None) -> Dict[str, SubchapterInfoOutput]:
+    """
+    Получает справочную таблицу всех подглав книги:
+    номер подглавы -> заголовок, summary, ключевые моменты и номера страниц.
+
+    Args:
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+
+    Returns:
+        Dict[str, SubchapterInfoOutput]: Подглавы книги по их номерам.
+    """
+    index = get_book_index(book)
+    parser = SubchapterParser(index)
+    table = {
+        number: SubchapterInfoOutput(
+            **parser.to_model(sub).model_dump(),
+            pages=index.subchapter_pages.get(number, []),
+        )
+        for number, sub in index.subchapters.items()
+    }
+    logger.info(f"Сформирована таблица из {len(table)} подглав")
+    return table
+
+# Поисковые индексы по экземплярам индекса книги: строятся при первом поиске
+# и освобождаются вместе с индексом книги после перезагрузки или выгрузки
+_search_indexes: "weakref.WeakKeyDictionary[BookIndex, SubchapterSearchIndex]" = weakref.WeakKeyDictionary()
+_search_lock = threading.Lock()
+
+def get_search_index(book: Optional[str] = None) -> SubchapterSearchIndex:
+    """
+    Возвращает поисковый индекс подглав для текущего индекса книги.
+    """
+    index = get_book_index(book)
+    with _search_lock:
+        search_index = _search_indexes.get(index)
+        if search_index is None:
+            search_index = SubchapterSearchIndex(index)
+            _search_indexes[index] = search_index
+    return search_index
+
+def search_subchapters(query: str, k: int = 5, book: Optional[str] = None) -> List[SubchapterSearchResult]:
+    """
+    Ищет подглавы, наиболее подходящие к тексту вопроса (BM25 по описаниям
+    подглав и страницам книги).
+
+    Args:
+        query (str): Текст вопроса.
+        k (int): Максимальное количество подглав в ответе.
+        book (Optional[str]): Идентификатор книги, по умолчанию - книга по умолчанию.
+
+    Returns:
+        List[SubchapterSearchResult]: Подглавы по убыванию оценки.
+    """
+    index = get_book_index(book)
+    results = [
+        SubchapterSearchResult(
+            subchapter_number=number,
+            title=str(index.subchapters[number].get("title", "")),
+            score=round(score, 4),
+        )
+        for number, score in get_search_index(book).search(query, k)
+    ]
+    logger.info(f"Поиск подглав: найдено {len(results)} из {k}")
+    return results
@@ -0,0 +1,197 @@
+# src/book_parser/store.py
+
+"""
+Скомпилированное хранилище книги на SQLite.
+
+Разовый шаг компиляции переносит know_map_full.json и kniga_full_content.json
+в один файл SQLite: структура книги (части, главы, подглавы) хранится
+целиком, а страницы - отдельной таблицей с ключом по номеру страницы.
+Сервис открывает файл только на чтение с включённым mmap и читает лишь те
+страницы, которые нужны запросу, поэтому память процесса не растёт
+вместе с объёмом текста книги.
+
+Запуск компиляции по путям из настроек:
+    python -m src.book_parser.store
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from src.book_parser.index import normalize_page_number
+from src.utils.logger import get_logger
+
+logger = get_logger("book_parser")
+
+# Версия формата файла; при изменении схемы хранилище перекомпилируется
+STORE_FORMAT_VERSION = "1"
+
+# Сколько байт файла SQLite разрешено отображать в память
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def source_signature(know_map_path: Path, kniga_path: Path) -> str:
+    """
+    Возвращает подпись исходных JSON-файлов (время изменения и размер).
+    Сохраняется в хранилище, чтобы понять, не устарело ли оно.
+    """
+    parts = []
+    for path in (know_map_path, kniga_path):
+        stat = os.stat(path)
+        parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return "|".join(parts)
+
+
+def compile_book_store(know_map_path: Path, kniga_path: Path, store_path: Path) -> Path:
+    """
+    Компилирует JSON-файлы книги в файл SQLite.
+
+    Запись идёт во временный файл, который затем атомарно подменяет
+    старое хранилище: открытые соединения дочитывают прежнюю версию.
+
+    Args:
+        know_map_path (Path): Путь к know_map_full.json.
+        kniga_path (Path): Путь к kniga_full_content.json.
+        store_path (Path): Путь к файлу хранилища.
+
+    Returns:
+        Path: Путь к скомпилированному хранилищу.
+    """
+    signature = source_signature(know_map_path, kniga_path)
+    with know_map_path.open("r", encoding="utf-8") as f:
+        know_map_data = json.load(f)
+    with kniga_path.open("r", encoding="utf-8") as f:
+        kniga_data = json.load(f)
+
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE pages (page_number INTEGER PRIMARY KEY, data TEXT NOT NULL);
+            """
+        )
+        pages = {}
+        for page in kniga_data.get("book", {}).get("pages", []):
+            page_number = normalize_page_number(page.get("pageNumber"))
+            if page_number is not None:
+                pages[page_number] = json.dumps(page, ensure_ascii=False)
+        conn.executemany("INSERT INTO pages (page_number, data) VALUES (?, ?)", pages.items())
+
+        # Всё, кроме страниц, - небольшие метаданные книги
+        book_meta = {key: value for key, value in kniga_data.get("book", {}).items() if key != "pages"}
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("format_version", STORE_FORMAT_VERSION),
+                ("source_signature", signature),
+                ("know_map", json.dumps(know_map_data, ensure_ascii=False)),
+                ("book", json.dumps(book_meta, ensure_ascii=False)),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, store_path)
+    logger.info(f"Хранилище книги скомпилировано: {store_path.name} ({len(pages)} страниц)")
+    return store_path
+
+
+def is_store_fresh(store_path: Path, know_map_path: Path, kniga_path: Path) -> bool:
+    """
+    Проверяет, что хранилище существует и собрано из текущих версий JSON-файлов.
+    Если исходных JSON рядом нет (поставляется только хранилище), оно считается актуальным.
+    """
+    if not store_path.exists():
+        return False
+    if not (know_map_path.exists() and kniga_path.exists()):
+        return True
+    try:
+        conn = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True)
+        try:
+            rows = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('format_version', 'source_signature')"))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Хранилище книги {store_path.name} не читается: {e}")
+        return False
+    return (
+        rows.get("format_version") == STORE_FORMAT_VERSION
+        and rows.get("source_signature") == source_signature(know_map_path, kniga_path)
+    )
+
+
+class PageStore(Mapping):
+    """
+    Страницы книги из скомпилированного хранилища.
+
+    Ведёт себя как словарь номер страницы -> страница, но читает страницы
+    из файла по запросу. Соединение открыто только на чтение и разделяется
+    между потоками под блокировкой.
+    """
+    def __init__(self, store_path: Path) -> None:
+        self.store_path = store_path
+        self._conn = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def read_meta(self, key: str) -> Optional[Any]:
+        """
+        Читает JSON-значение из таблицы meta.
+        """
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_many(self, page_numbers: List[int]) -> List[Dict[str, Any]]:
+        """
+        Читает страницы одним запросом и возвращает их в порядке page_numbers.
+        """
+        if not page_numbers:
+            return []
+        placeholders = ", ".join("?" for _ in page_numbers)
+        rows = self._query(
+            f"SELECT page_number, data FROM pages WHERE page_number IN ({placeholders})",
+            tuple(page_numbers),
+        )
+        found = {number: json.loads(data) for number, data in rows}
+        return [found[number] for number in page_numbers if number in found]
+
+    def __getitem__(self, page_number: int) -> Dict[str, Any]:
+        pages = self.get_many([page_number])
+        if not pages:
+            raise KeyError(page_number)
+        return pages[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self._query("SELECT page_number FROM pages ORDER BY page_number")])
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self._query("SELECT COUNT(*) FROM pages")[0][0]
+        return self._count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    from src.book_parser.config import settings
+
+    if not settings.store_path:
+        raise SystemExit("Не задан путь к хранилищу: BOOK_PARSER_STORE_PATH")
+    compile_book_store(Path(settings.know_map_path), Path(settings.kniga_path), Path(settings.store_path))
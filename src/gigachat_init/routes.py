@@ -16,6 +16,14 @@ client = GigaChatClient()
 def root():
     return {"message": "GigaChat Token Service is running"}
 
+@router.get("/health", tags=["Health Check"])
+def health():
+    """
+    Лёгкая проверка работоспособности: без обращения к GigaChat,
+    только состояние уже полученного токена.
+    """
+    return {"status": "ok", "token_valid": client.get_token_info()["is_valid"]}
+
 @router.get("/token", response_model=TokenResponse, tags=["Token"])
 def get_token():
     try:
@@ -8,7 +8,49 @@ class GoogleSheetsSettings(BaseAppSettings):
     Настройки для сервиса Google Sheets.
     """
     data_dir: str
+    # Хранилище форм: "sqlite" или "journal" (см. src.google_sheets.storage)
+    storage_backend: str = "sqlite"
+    # Прежний JSON-файл форм; читается только для переноса в хранилище
     form_data_filename: str
+    # База форм SQLite
+    form_db_filename: str = "form_data.sqlite3"
+    # Журнал форм на дозапись (JSONL)
+    form_journal_filename: str = "form_data.jsonl"
+    # Журнал компактизируется при открытии, если записей больше этого числа
+    # и больше чем вдвое больше числа форм
+    journal_compact_min_records: int = 1000
+
+    # Сколько пар вопрос-ответ одной формы оценивать одновременно
+    llm_concurrency_per_form: int = 4
+    # Сколько оценок одновременно по всем формам
+    llm_concurrency_global: int = 8
+    # Таймаут запроса к LLM сервису (секунды)
+    llm_request_timeout: float = 60.0
+
+    # Очередь задач обработки форм (SQLite) и пул воркеров
+    jobs_db_filename: str = "form_jobs.sqlite3"
+    # Сколько форм обрабатывать одновременно
+    worker_count: int = 2
+    # Попытки обработки формы и задержка между ними: base * 2^(попытка-1), не больше max (секунды)
+    job_max_attempts: int = 5
+    job_backoff_base: float = 5.0
+    job_backoff_max: float = 300.0
+    # Как часто воркер без задач проверяет очередь (секунды)
+    job_poll_interval: float = 1.0
+
+    # Проверка доступности сервисов: срок жизни результата, интервал
+    # фоновой проверки и таймаут одного запроса к /health (секунды)
+    health_ttl: float = 10.0
+    health_interval: float = 5.0
+    health_timeout: float = 2.0
+
+    # Прогресс обработки в памяти: сколько форм хранить в таблице состояний
+    # и как часто отправлять keep-alive в поток /sheets/progress (секунды)
+    progress_table_size: int = 1000
+    progress_keepalive: float = 15.0
+
+    # Максимальное количество строк в одном запросе /sheets/receive-data/bulk
+    bulk_max_rows: int = 1000
 
     model_config = ConfigDict(
         env_file='.env',
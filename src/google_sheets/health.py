@@ -0,0 +1,127 @@
+# src/google_sheets/health.py
+
+"""
+Мониторинг доступности сервисов, нужных для обработки форм.
+
+Сервисы проверяются параллельно через лёгкие эндпоинты /health, результат
+кэшируется на health_ttl секунд. Фоновая задача обновляет его каждые
+health_interval секунд, поэтому проверка перед обработкой формы обычно
+берёт готовый результат и не делает запросов.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+from src.google_sheets.config import settings
+from src.config import settings as port_settings
+from src.utils.logger import get_logger
+
+logger = get_logger("google_sheets")
+
+# Результат проверки сервиса: (доступен, подробности)
+ServiceStatus = Tuple[bool, str]
+
+
+class HealthMonitor:
+    """
+    Кэш доступности сервисов с параллельными проверками.
+
+    Args:
+        services: Список (имя сервиса, порт, путь к /health).
+        ttl (float): Сколько секунд результат проверки считается актуальным.
+        timeout (float): Таймаут одной проверки (секунды).
+    """
+    def __init__(self, services: List[Tuple[str, int, str]], ttl: float = 10.0, timeout: float = 2.0) -> None:
+        self.services = services
+        self.ttl = ttl
+        self.timeout = timeout
+        self.statuses: Dict[str, ServiceStatus] = {}
+        self.checked_at: float = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio.Lock привязан к циклу событий, поэтому при смене цикла создаём новый
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    def is_fresh(self) -> bool:
+        return bool(self.statuses) and time.monotonic() - self.checked_at < self.ttl
+
+    def all_available(self) -> bool:
+        return bool(self.statuses) and all(available for available, _ in self.statuses.values())
+
+    async def _probe(self, client: httpx.AsyncClient, port: int, path: str) -> ServiceStatus:
+        try:
+            response = await client.get(f"http://127.0.0.1:{port}{path}", timeout=self.timeout)
+            if response.status_code < 500:
+                return True, f"код {response.status_code}"
+            return False, f"ошибка {response.status_code}"
+        except Exception as e:
+            return False, f"недоступен: {str(e)[:30]}..."
+
+    async def refresh(self) -> Dict[str, ServiceStatus]:
+        """
+        Проверяет все сервисы параллельно и обновляет кэш.
+        Одновременные вызовы ждут одну проверку.
+        """
+        started_at = time.monotonic()
+        async with self._get_lock():
+            if self.checked_at >= started_at:
+                return self.statuses
+            async with httpx.AsyncClient() as client:
+                results = await asyncio.gather(*(self._probe(client, port, path) for _, port, path in self.services))
+            self.statuses = {name: result for (name, _, _), result in zip(self.services, results)}
+            self.checked_at = time.monotonic()
+        unavailable = [name for name, (available, _) in self.statuses.items() if not available]
+        if unavailable:
+            logger.warning(f"Недоступны сервисы: {', '.join(unavailable)}")
+        return self.statuses
+
+    async def check(self) -> Dict[str, ServiceStatus]:
+        """
+        Возвращает доступность сервисов. Актуальный результат, в котором
+        все сервисы доступны, берётся из кэша; иначе сервисы проверяются заново,
+        чтобы не отклонять формы из-за уже восстановившегося сервиса.
+        """
+        if self.is_fresh() and self.all_available():
+            return self.statuses
+        return await self.refresh()
+
+    def start(self, interval: float) -> None:
+        """
+        Запускает фоновое обновление кэша в текущем цикле событий.
+        """
+        self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновое обновление.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой проверки сервисов: {e}")
+            await asyncio.sleep(interval)
+
+
+health_monitor = HealthMonitor(
+    [
+        ("gigachat_init", port_settings.gigachat_init_port, "/token/health"),
+        ("book_parser", port_settings.book_parser_port, "/parser/health"),
+        ("llm_service", port_settings.llm_service_port, "/llm/health"),
+    ],
+    ttl=settings.health_ttl,
+    timeout=settings.health_timeout,
+)
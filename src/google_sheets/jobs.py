@@ -0,0 +1,216 @@
+# src/google_sheets/jobs.py
+
+"""
+Очередь задач обработки форм на SQLite.
+
+Одна задача на форму (row_id - первичный ключ), поэтому повторный запрос
+на обработку той же формы не создаёт второй задачи. Задачи переживают
+перезапуск сервиса: незавершённые задачи возвращаются в очередь при старте.
+
+Статусы задачи:
+  - queued: ждёт обработки (не раньше available_at)
+  - running: обрабатывается воркером
+  - done: форма обработана
+  - failed: попытки исчерпаны
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from src.google_sheets.config import settings
+from src.utils.logger import get_logger
+
+logger = get_logger("google_sheets")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Очередь задач обработки форм с повторными попытками.
+
+    После неудачной попытки задача возвращается в очередь с экспоненциальной
+    задержкой backoff_base * 2^(attempts-1), но не больше backoff_max секунд.
+    После max_attempts неудачных попыток задача помечается как failed.
+    """
+    def __init__(self, path: Path, max_attempts: int = 5, backoff_base: float = 5.0, backoff_max: float = 300.0) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                row_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at);
+            """
+        )
+
+    def enqueue(self, row_id: str, force: bool = True) -> bool:
+        """
+        Ставит форму в очередь.
+
+        Задача, уже ожидающая или выполняемая, не дублируется. Завершённая
+        задача ставится заново; задача с исчерпанными попытками - только при force.
+
+        Returns:
+            bool: True, если задача поставлена в очередь.
+        """
+        now = time.time()
+        restartable = (DONE, FAILED) if force else (DONE,)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE row_id = ?", (row_id,)).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO jobs (row_id, status, attempts, available_at, created_at, updated_at) "
+                        "VALUES (?, ?, 0, ?, ?, ?)",
+                        (row_id, QUEUED, now, now, now),
+                    )
+                elif row[0] in restartable:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, last_error = NULL, updated_at = ? "
+                        "WHERE row_id = ?",
+                        (QUEUED, now, now, row_id),
+                    )
+                else:
+                    self._conn.execute("COMMIT")
+                    return False
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.debug(f"Форма {row_id} поставлена в очередь")
+        return True
+
+    def claim(self) -> Optional[str]:
+        """
+        Забирает из очереди задачу, срок которой наступил, и помечает её как running.
+
+        Returns:
+            Optional[str]: row_id формы или None, если готовых задач нет.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT row_id FROM jobs WHERE status = ? AND available_at <= ? ORDER BY available_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE row_id = ?",
+                        (RUNNING, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def complete(self, row_id: str) -> None:
+        """
+        Помечает задачу как выполненную.
+        """
+        self._set(row_id, "status = ?, last_error = NULL", (DONE,))
+
+    def fail(self, row_id: str, error: str) -> Optional[float]:
+        """
+        Записывает неудачную попытку. Если попытки не исчерпаны, задача
+        возвращается в очередь с задержкой.
+
+        Returns:
+            Optional[float]: Задержка до следующей попытки (секунды) или None, если попытки исчерпаны.
+        """
+        job = self.get(row_id)
+        attempts = job["attempts"] if job else self.max_attempts
+        if attempts >= self.max_attempts:
+            self._set(row_id, "status = ?, last_error = ?", (FAILED, error))
+            logger.error(f"Обработка формы {row_id} не удалась после {attempts} попыток: {error}")
+            return None
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        self._set(row_id, "status = ?, last_error = ?, available_at = ?", (QUEUED, error, time.time() + delay))
+        logger.warning(f"Попытка {attempts} обработки формы {row_id} не удалась, повтор через {delay:.0f} с: {error}")
+        return delay
+
+    def release(self, row_id: str) -> None:
+        """
+        Возвращает прерванную задачу в очередь без учёта попытки
+        (например, при остановке сервиса).
+        """
+        self._set(row_id, "status = ?, attempts = MAX(attempts - 1, 0), available_at = ?", (QUEUED, time.time()))
+
+    def requeue_running(self) -> int:
+        """
+        Возвращает в очередь задачи, оставшиеся в статусе running после
+        аварийной остановки сервиса.
+
+        Returns:
+            int: Количество возвращённых задач.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, now, now, RUNNING),
+            )
+        return cursor.rowcount
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает задачу формы или None, если задачи нет.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_id, status, attempts, available_at, last_error FROM jobs WHERE row_id = ?",
+                (row_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("row_id", "status", "attempts", "available_at", "last_error"), row))
+
+    def _set(self, row_id: str, assignments: str, params: tuple) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE row_id = ?",
+                params + (time.time(), row_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Возвращает очередь задач по путям из настроек.
+    Очередь открывается один раз и пересоздаётся при смене пути.
+    """
+    global _queue
+    path = Path(settings.data_dir) / settings.jobs_db_filename
+    if _queue is None or _queue.path != path:
+        if _queue is not None:
+            _queue.close()
+        _queue = JobQueue(path, settings.job_max_attempts, settings.job_backoff_base, settings.job_backoff_max)
+    return _queue
@@ -1,10 +1,27 @@
 # src/google_sheets/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from src.google_sheets.routes import router as google_sheets_router
+from src.google_sheets.worker import start_worker_pool, stop_worker_pool
+from src.google_sheets.health import health_monitor
+from src.google_sheets.config import settings as sheets_settings
 from src.config import settings
 
-app = FastAPI(title="Google Sheets Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Доступность сервисов проверяется в фоне, а не перед каждой формой
+    health_monitor.start(sheets_settings.health_interval)
+    # Воркеры обрабатывают формы из очереди; при старте в очередь
+    # возвращаются формы, обработка которых не была завершена
+    await start_worker_pool()
+    yield
+    await stop_worker_pool()
+    await health_monitor.stop()
+
+
+app = FastAPI(title="Google Sheets Service", lifespan=lifespan)
 
 # Подключаем роутер
 app.include_router(google_sheets_router)
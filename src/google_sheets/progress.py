@@ -0,0 +1,104 @@
+# src/google_sheets/progress.py
+
+"""
+Прогресс обработки форм в памяти процесса.
+
+Пайплайн обработки формы публикует события (форма в очереди, обработка
+начата, оценена пара, форма обработана, ошибка). ProgressTracker хранит
+последнее состояние каждой формы и рассылает события подписчикам -
+потокам Server-Sent Events эндпоинта /sheets/progress/{row_id}, поэтому
+клиент узнаёт о завершении сразу, а проверка статуса не читает хранилище.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from src.google_sheets.config import settings
+
+# События, после которых поток прогресса формы завершается
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """
+    Форматирует событие для потока Server-Sent Events.
+    """
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class ProgressTracker:
+    """
+    Таблица состояний обработки форм и подписчики на их события.
+
+    Хранится не больше max_entries форм; при переполнении удаляются
+    давно обновлявшиеся формы.
+    """
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.max_entries = max_entries
+        self._states: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает последнее состояние обработки формы или None.
+        """
+        state = self._states.get(row_id)
+        return dict(state) if state else None
+
+    def reset(self, row_id: str) -> None:
+        """
+        Забывает состояние формы, сохранённой заново: до начала новой обработки
+        её статус берётся из хранилища, а не из состояния прошлой обработки.
+        """
+        self._states.pop(row_id, None)
+
+    def subscribe(self, row_id: str) -> asyncio.Queue:
+        """
+        Подписывает на события формы; события приходят в возвращённую очередь.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(row_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, row_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(row_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(row_id, None)
+
+    def publish(self, row_id: str, event: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Обновляет состояние формы и рассылает событие подписчикам.
+        """
+        state = self._states.pop(row_id, {"row_id": row_id, "total": 0, "done": 0, "failed": 0})
+        state.update(fields, event=event, updated_at=time.time())
+        self._states[row_id] = state
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+        for queue in self._subscribers.get(row_id, []):
+            queue.put_nowait(dict(state))
+        return state
+
+    def queued(self, row_id: str) -> None:
+        self.publish(row_id, "queued")
+
+    def started(self, row_id: str, total: int, done: int) -> None:
+        self.publish(row_id, "started", total=total, done=done, failed=0, processed=False, error=None)
+
+    def pair_finished(self, row_id: str, pair_number: int, success: bool) -> None:
+        state = self._states.get(row_id, {})
+        counter = "done" if success else "failed"
+        self.publish(row_id, "pair", pair=pair_number, success=success, **{counter: state.get(counter, 0) + 1})
+
+    def finished(self, row_id: str, processed: bool) -> None:
+        # Частично обработанная форма будет повторена, поток при этом не завершается
+        self.publish(row_id, "completed" if processed else "partial", processed=processed)
+
+    def error(self, row_id: str, message: str, final: bool = False) -> None:
+        self.publish(row_id, "failed" if final else "error", error=message)
+
+
+progress_tracker = ProgressTracker(settings.progress_table_size)
@@ -1,9 +1,16 @@
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import json
-from src.google_sheets.services import process_form_data, save_form_submission
+from datetime import datetime
+from typing import Optional
+from src.google_sheets.services import process_form_data, save_form_submission, save_form_submissions
 from src.google_sheets.services import get_form_submission_by_row_id
-from src.google_sheets.services import process_form_submission_with_llm
+from src.google_sheets.services import list_unprocessed_forms
+from src.google_sheets.worker import enqueue_form, enqueue_forms
+from src.google_sheets.jobs import get_job_queue
+from src.google_sheets.progress import progress_tracker, format_sse, TERMINAL_EVENTS
+from src.google_sheets.config import settings
 from src.utils.logger import get_logger
 
 logger = get_logger("google_sheets")
@@ -28,7 +35,9 @@ async def receive_data(request: Request):
         form_submission = process_form_data(data)
         
         # Сохраняем данные в JSON
-        entry_id = save_form_submission(form_submission)
+        entry_id = await asyncio.to_thread(save_form_submission, form_submission)
+        # Форма сохранена заново - прогресс её прошлой обработки больше не актуален
+        progress_tracker.reset(entry_id)
         logger.info(f"Форма {row_id} сохранена с {len(form_submission.qa_pairs)} парами Q&A")
         
         # Формируем ответ
@@ -67,13 +76,116 @@ async def receive_data(request: Request):
         )
 
 
+@router.post("/receive-data/bulk")
+async def receive_data_bulk(request: Request):
+    """
+    Эндпоинт для пакетного получения строк из Google Sheets.
+    
+    Принимает JSON {"rows": [...], "enqueue": false}, где rows - строки формы
+    в том же формате, что и для /sheets/receive-data. Каждая строка
+    валидируется отдельно, корректные строки сохраняются одной операцией
+    хранилища. При enqueue = true сохранённые формы сразу ставятся
+    в очередь на обработку LLM.
+    
+    Если row_id повторяется в запросе, сохраняется первая строка,
+    а повторы получают статус "duplicate" и не сохраняются.
+    
+    Returns:
+        JSONResponse: Результаты по каждой строке в порядке запроса
+    """
+    try:
+        data = await request.json()
+        rows = data.get("rows") if isinstance(data, dict) else None
+        if not isinstance(rows, list):
+            error_msg = "Ошибка формата данных: ожидается поле rows со списком строк"
+            logger.error(error_msg)
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": error_msg}
+            )
+        if len(rows) > settings.bulk_max_rows:
+            error_msg = f"Слишком много строк в запросе: {len(rows)} (максимум {settings.bulk_max_rows})"
+            logger.error(error_msg)
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": error_msg}
+            )
+        enqueue = bool(data.get("enqueue", False))
+        logger.info(f"Получено строк для пакетного сохранения: {len(rows)}")
+        
+        # Валидируем строки по отдельности: ошибка одной строки не отклоняет остальные
+        results = []
+        submissions = []
+        first_index = {}
+        for index, row in enumerate(rows):
+            row_id = row.get("row_id", "неизвестно") if isinstance(row, dict) else "неизвестно"
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("строка должна быть JSON-объектом")
+                submission = process_form_data(row)
+                if submission.row_id in first_index:
+                    message = f"row_id повторяется в запросе (строка {first_index[submission.row_id]})"
+                    logger.warning(f"Строка {index} ({row_id}) пропущена: {message}")
+                    results.append({"index": index, "row_id": row_id, "status": "duplicate", "message": message})
+                    continue
+                first_index[submission.row_id] = index
+                submissions.append(submission)
+                results.append({"index": index, "row_id": row_id, "status": "success"})
+            except Exception as e:
+                logger.error(f"Строка {index} ({row_id}) отклонена: {str(e)}")
+                results.append({"index": index, "row_id": row_id, "status": "error", "message": str(e)})
+        
+        # Сохраняем корректные строки одной операцией хранилища
+        valid = [result for result in results if result["status"] == "success"]
+        entry_ids = await asyncio.to_thread(save_form_submissions, submissions) if submissions else []
+        for result, submission, entry_id in zip(valid, submissions, entry_ids):
+            progress_tracker.reset(entry_id)
+            result["entry_id"] = entry_id
+            result["qa_pairs_count"] = len(submission.qa_pairs)
+        if enqueue:
+            # Весь пакет ставится в очередь одной операцией вне цикла событий
+            for result, enqueued in zip(valid, await enqueue_forms(entry_ids)):
+                result["enqueued"] = enqueued
+        
+        duplicate_count = sum(1 for result in results if result["status"] == "duplicate")
+        logger.info(f"Пакет сохранён: {len(valid)} из {len(rows)} строк, повторов row_id: {duplicate_count}")
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "message": f"Сохранено {len(valid)} из {len(rows)} строк",
+                "saved_count": len(valid),
+                "error_count": len(rows) - len(valid) - duplicate_count,
+                "duplicate_count": duplicate_count,
+                "results": results
+            }
+        )
+    
+    except json.JSONDecodeError as e:
+        error_msg = "Ошибка формата данных: неверный JSON"
+        logger.error(f"{error_msg}. Детали: {str(e)}")
+        return JSONResponse(
+            status_code=400, 
+            content={"status": "error", "message": error_msg}
+        )
+    
+    except Exception as e:
+        error_msg = f"Ошибка при пакетном сохранении данных: {str(e)}"
+        logger.error(error_msg)
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": error_msg}
+        )
+
+
 @router.get("/process-form/{row_id}")
 async def process_form_with_llm(row_id: str):
     """
     Эндпоинт для обработки формы с помощью LLM сервиса по ID строки.
     
-    Находит форму по указанному ID строки, запускает асинхронную обработку 
-    с помощью LLM и возвращает статус запуска обработки.
+    Находит форму по указанному ID строки и ставит её в очередь на обработку
+    с помощью LLM. Форма, уже стоящая в очереди или обрабатываемая,
+    повторно не ставится.
     
     Args:
         row_id (str): Идентификатор строки из Google Sheets
@@ -89,7 +201,7 @@ async def process_form_with_llm(row_id: str):
     
     try:
         # Проверяем существование формы
-        form_data = get_form_submission_by_row_id(row_id)
+        form_data = await asyncio.to_thread(get_form_submission_by_row_id, row_id)
         
         if form_data is None:
             logger.warning(f"Форма {row_id} не найдена")
@@ -114,20 +226,24 @@ async def process_form_with_llm(row_id: str):
                 }
             )
         
-        # Запускаем обработку формы в фоновом режиме
-        # Используем create_task вместо await для асинхронной обработки
-        from asyncio import create_task
-        create_task(process_form_submission_with_llm(row_id))
-        logger.info(f"Обработка формы {row_id} запущена в фоне")
+        # Ставим форму в очередь; её обработает воркер из пула
+        enqueued = await enqueue_form(row_id)
+        if enqueued:
+            logger.info(f"Форма {row_id} поставлена в очередь на обработку")
+        else:
+            logger.info(f"Форма {row_id} уже в очереди или обрабатывается")
+        
+        job = await asyncio.to_thread(lambda: get_job_queue().get(row_id))
         
-        # Возвращаем статус запуска
+        # Возвращаем статус постановки в очередь
         return JSONResponse(
             status_code=200,
             content={
                 "status": "success",
-                "message": "Обработка формы запущена",
+                "message": "Обработка формы запущена" if enqueued else "Форма уже в очереди на обработку",
                 "processed": False,
-                "form_id": row_id
+                "form_id": row_id,
+                "job_status": job["status"]
             }
         )
     
@@ -193,7 +309,7 @@ async def get_form_data(row_id: str):
     
     try:
         # Получаем данные формы
-        form_data = get_form_submission_by_row_id(row_id)
+        form_data = await asyncio.to_thread(get_form_submission_by_row_id, row_id)
         
         # Если данные не найдены
         if form_data is None:
@@ -231,6 +347,11 @@ async def check_processing(row_id: str):
     """
     Проверяет статус обработки формы LLM-моделью.
     
+    Для форм, обрабатывавшихся после запуска сервиса, статус берётся
+    из таблицы прогресса в памяти без чтения хранилища форм. Очередь задач
+    и хранилище форм читаются в отдельном потоке, чтобы не блокировать
+    цикл событий частыми опросами.
+    
     Args:
         row_id (str): Идентификатор строки из Google Sheets
         
@@ -238,8 +359,31 @@ async def check_processing(row_id: str):
         JSONResponse: Статус обработки формы
     """
     try:
+        # Состояние задачи обработки в очереди, если она есть
+        job = await asyncio.to_thread(lambda: get_job_queue().get(row_id))
+        job_fields = {
+            "job_status": job["status"] if job else None,
+            "attempts": job["attempts"] if job else 0,
+            "last_error": job["last_error"] if job else None
+        }
+        
+        # Прогресс из памяти, если форма обрабатывалась после запуска сервиса
+        state = progress_tracker.get(row_id)
+        if state is not None:
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "status": "success",
+                    "row_id": row_id,
+                    "processed": state.get("processed", False),
+                    "last_updated": datetime.fromtimestamp(state["updated_at"]).isoformat(),
+                    "progress": {"done": state["done"], "failed": state["failed"], "total": state["total"]},
+                    **job_fields
+                }
+            )
+        
         # Получаем данные формы
-        form_data = get_form_submission_by_row_id(row_id)
+        form_data = await asyncio.to_thread(get_form_submission_by_row_id, row_id)
         
         # Если данные не найдены
         if form_data is None:
@@ -263,7 +407,8 @@ async def check_processing(row_id: str):
                 "status": "success",
                 "row_id": row_id,
                 "processed": processed,
-                "last_updated": form_data.get("updated_at", "")
+                "last_updated": form_data.get("updated_at", ""),
+                **job_fields
             }
         )
     
@@ -275,4 +420,94 @@ async def check_processing(row_id: str):
                 "status": "error",
                 "message": f"Внутренняя ошибка сервера: {str(e)}"
             }
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/progress/{row_id}")
+async def stream_progress(row_id: str, request: Request):
+    """
+    Поток Server-Sent Events с прогрессом обработки формы.
+    
+    Первое событие - текущее состояние формы, далее события пайплайна:
+    queued, started, pair (оценена пара), partial, error, completed
+    (форма обработана) и failed (попытки исчерпаны). После completed
+    или failed поток завершается.
+    
+    Args:
+        row_id (str): Идентификатор строки из Google Sheets
+        
+    Returns:
+        StreamingResponse: Поток событий text/event-stream
+    """
+    snapshot = progress_tracker.get(row_id)
+    if snapshot is None:
+        # Форма ещё не обрабатывалась после запуска сервиса - берём статус из хранилища один раз
+        form_data = await asyncio.to_thread(get_form_submission_by_row_id, row_id)
+        if form_data is None:
+            logger.warning(f"Данные формы {row_id} для потока прогресса не найдены")
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "status": "error",
+                    "message": f"Данные для строки {row_id} не найдены"
+                }
+            )
+        processed = form_data.get("processed", False)
+        snapshot = {"row_id": row_id, "event": "completed" if processed else "status", "processed": processed}
+    
+    async def events():
+        queue = progress_tracker.subscribe(row_id)
+        try:
+            # Состояние могло измениться, пока читалось хранилище
+            state = progress_tracker.get(row_id) or snapshot
+            yield format_sse(state)
+            if state["event"] in TERMINAL_EVENTS:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.progress_keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            progress_tracker.unsubscribe(row_id, queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/unprocessed")
+async def get_unprocessed_forms(limit: Optional[int] = None):
+    """
+    Возвращает список ID строк форм, ещё не обработанных LLM.
+    
+    Args:
+        limit (Optional[int]): Максимальное количество форм в ответе
+        
+    Returns:
+        JSONResponse: Идентификаторы строк необработанных форм
+    """
+    try:
+        row_ids = await asyncio.to_thread(list_unprocessed_forms, limit)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "count": len(row_ids),
+                "row_ids": row_ids
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка необработанных форм: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "message": f"Внутренняя ошибка сервера: {str(e)}"
+            }
+        )
@@ -1,13 +1,16 @@
 # src/google_sheets/services.py
 
+import asyncio
 import json
 import os
 from datetime import datetime
-from typing import Dict, Any, Optional
-from pathlib import Path
+from typing import Dict, Any, List, Optional
 import httpx
 from src.google_sheets.models import QAPair, FormSubmission
 from src.google_sheets.config import settings
+from src.google_sheets.storage import get_form_store
+from src.google_sheets.health import health_monitor
+from src.google_sheets.progress import progress_tracker
 from src.config import settings as port_settings
 from src.utils.logger import get_logger, get_pipeline_logger
 
@@ -60,13 +63,22 @@ def process_form_data(form_data: Dict[str, Any]) -> FormSubmission:
     return submission
 
 
+def _submission_to_dict(submission: FormSubmission) -> Dict[str, Any]:
+    """
+    Преобразует FormSubmission в словарь для хранилища (datetime - строками ISO).
+    """
+    submission_dict = submission.model_dump()
+    for field in ['received_at', 'updated_at']:
+        if submission_dict.get(field):
+            submission_dict[field] = submission_dict[field].isoformat()
+    return submission_dict
+
 def save_form_submission(submission: FormSubmission) -> str:
     """
-    Сохраняет объект FormSubmission в JSON-файл.
+    Сохраняет объект FormSubmission в хранилище форм.
     
-    Загружает существующие данные, добавляет новую запись и сохраняет обратно в файл.
-    Обеспечивает сохранение структуры данных с ключом "data" и корректное
-    преобразование объектов datetime.
+    Дописывает новую версию формы в журнал форм (см. src.google_sheets.storage),
+    не перезаписывая остальные формы. Объекты datetime сохраняются строками ISO.
     
     Args:
         submission: Объект FormSubmission для сохранения
@@ -74,47 +86,50 @@ def save_form_submission(submission: FormSubmission) -> str:
     Returns:
         str: ID сохраненной записи
     """
-    # Настройка путей
-    data_dir = Path(settings.data_dir)
-    json_file = data_dir / settings.form_data_filename
-        
-    # Загружаем существующие данные или создаем новую структуру
-    json_data = {"data": {}}
-    
-    if json_file.exists() and json_file.stat().st_size > 0:
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                # Создаем ключ data, если он отсутствует
-                json_data.setdefault("data", {})
-        except json.JSONDecodeError:
-            logger.error(f"Невозможно прочитать JSON из {json_file}. Создаем новую структуру.")
-    
-    # Определяем ID записи (используем row_id или генерируем новый)
-    entry_id = submission.row_id or str(len(json_data["data"]) + 1)
-    
-    # Преобразуем Pydantic-модель в словарь
-    submission_dict = submission.model_dump()
+    return save_form_submissions([submission])[0]
+
+def save_form_submissions(submissions: List[FormSubmission]) -> List[str]:
+    """
+    Сохраняет несколько объектов FormSubmission одной операцией хранилища
+    (одна транзакция SQLite или одна запись в журнал).
     
-    # Преобразуем datetime в строки
-    for field in ['received_at', 'updated_at']:
-        if submission_dict.get(field):
-            submission_dict[field] = submission_dict[field].isoformat()
+    Args:
+        submissions: Объекты FormSubmission для сохранения
+        
+    Returns:
+        List[str]: ID сохраненных записей в порядке submissions
+    """
+    store = get_form_store()
     
-    # Сохраняем запись
-    json_data["data"][entry_id] = submission_dict
+    # Определяем ID записей (используем row_id или генерируем новый)
+    forms: Dict[str, Dict[str, Any]] = {}
+    entry_ids = []
+    next_id = len(store) + 1
+    for submission in submissions:
+        if submission.row_id:
+            entry_id = str(submission.row_id)
+        else:
+            entry_id, next_id = str(next_id), next_id + 1
+        forms[entry_id] = _submission_to_dict(submission)
+        entry_ids.append(entry_id)
     
-    # Записываем в файл
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    # Сохраняем записи
+    store.put_many(forms)
     
-    logger.info(f"Форма {entry_id} сохранена")
-    return entry_id
+    if len(entry_ids) == 1:
+        logger.info(f"Форма {entry_ids[0]} сохранена")
+    else:
+        logger.info(f"Сохранено форм: {len(forms)}")
+    return entry_ids
 
 async def check_services_availability(pipeline_logger) -> bool:
     """
     ЭТАП 1: Проверяет доступность всех необходимых сервисов.
     
+    Результат берётся из кэша монитора доступности (src.google_sheets.health),
+    если он актуален и все сервисы доступны; иначе сервисы проверяются
+    параллельно через их эндпоинты /health.
+    
     Args:
         pipeline_logger: Экземпляр PipelineLogger для логирования
         
@@ -123,43 +138,90 @@ async def check_services_availability(pipeline_logger) -> bool:
     """
     pipeline_logger.stage_start("Проверка доступности сервисов", 1)
     
-    services_status = {}
+    from_cache = health_monitor.is_fresh() and health_monitor.all_available()
+    services_status = await health_monitor.check()
     
-    # Список сервисов для проверки
-    services_to_check = [
-        ("gigachat_init", port_settings.gigachat_init_port, "/token/"),
-        ("book_parser", port_settings.book_parser_port, "/parser/parts"),
-        ("llm_service", port_settings.llm_service_port, "/docs")
-    ]
-    
-    async with httpx.AsyncClient() as client:
-        for service_name, port, endpoint in services_to_check:
-            try:
-                url = f"http://127.0.0.1:{port}{endpoint}"
-                response = await client.get(url, timeout=10.0)
-                
-                if response.status_code < 500:
-                    services_status[service_name] = True
-                    pipeline_logger.service_check(service_name, port, True, f"код {response.status_code}")
-                else:
-                    services_status[service_name] = False
-                    pipeline_logger.service_check(service_name, port, False, f"ошибка {response.status_code}")
-                    
-            except Exception as e:
-                services_status[service_name] = False
-                pipeline_logger.service_check(service_name, port, False, f"недоступен: {str(e)[:30]}...")
+    ports = {name: port for name, port, _ in health_monitor.services}
+    for service_name, (available, details) in services_status.items():
+        pipeline_logger.service_check(service_name, ports[service_name], available, details)
     
     # Проверяем, все ли сервисы доступны
-    all_available = all(services_status.values())
+    all_available = all(available for available, _ in services_status.values())
     
     if all_available:
-        pipeline_logger.stage_finish(1, "Все сервисы доступны")
+        pipeline_logger.stage_finish(1, "Все сервисы доступны" + (" (кэш)" if from_cache else ""))
     else:
-        failed_services = [name for name, status in services_status.items() if not status]
+        failed_services = [name for name, (available, _) in services_status.items() if not available]
         pipeline_logger.stage_finish(1, f"Недоступны: {', '.join(failed_services)}")
     
     return all_available
 
+# Общий для всех форм лимит одновременных запросов к LLM сервису.
+# asyncio.Semaphore привязан к циклу событий, поэтому создаётся для каждого цикла.
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+_llm_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """
+    Возвращает семафор, ограничивающий число одновременных оценок по всем формам.
+    """
+    global _llm_semaphore, _llm_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _llm_semaphore is None or _llm_semaphore_loop is not loop:
+        _llm_semaphore = asyncio.Semaphore(settings.llm_concurrency_global)
+        _llm_semaphore_loop = loop
+    return _llm_semaphore
+
+
+def build_qa_prompt(qa_pair: Dict[str, Any]) -> str:
+    """
+    Формирует запрос к LLM сервису для пары вопрос-ответ.
+    """
+    return f"Вот вопрос пользователя: {qa_pair.get('question', '')}\nВот как ответил пользователь: {qa_pair.get('user_answer', '')}"
+
+
+async def evaluate_qa_pair(
+    client: httpx.AsyncClient,
+    form_semaphore: asyncio.Semaphore,
+    pipeline_logger,
+    index: int,
+    total_pairs: int,
+    qa_pair: Dict[str, Any],
+) -> Optional[str]:
+    """
+    Отправляет одну пару вопрос-ответ на оценку в LLM сервис.
+    
+    Запрос выполняется, когда свободны слоты и формы, и всего сервиса.
+    
+    Args:
+        client: HTTP клиент формы
+        form_semaphore: Лимит одновременных запросов для формы
+        pipeline_logger: Экземпляр PipelineLogger для логирования
+        index (int): Номер пары в форме (с нуля)
+        total_pairs (int): Количество пар в форме
+        qa_pair: Пара вопрос-ответ
+        
+    Returns:
+        Optional[str]: Ответ LLM или None, если оценка не удалась
+    """
+    async with form_semaphore, get_llm_semaphore():
+        pipeline_logger.qa_pair_processed(index+1, total_pairs, qa_pair.get('question', '')[:50])
+        try:
+            # Отправляем запрос к LLM сервису
+            response = await client.post(
+                f"http://127.0.0.1:{port_settings.llm_service_port}/llm/full-reasoning",
+                json={"question": build_qa_prompt(qa_pair)},
+                timeout=settings.llm_request_timeout
+            )
+            response.raise_for_status()
+            pipeline_logger.step(f"LLM ответ получен", f"пара {index+1}/{total_pairs}")
+            return response.json().get("answer", "")
+        except Exception as e:
+            pipeline_logger.step(f"Ошибка обработки пары {index+1}", str(e), "error")
+            return None
+
+
 async def process_form_submission_with_llm(row_id: str) -> Dict[str, Any]:
     """
     Обрабатывает форму с помощью LLM сервиса и сохраняет ответы.
@@ -170,8 +232,11 @@ async def process_form_submission_with_llm(row_id: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: Обновленный объект с ответами LLM
         
+    Ответ LLM для каждой пары сохраняется сразу после получения; при повторном
+    запуске уже оценённые пары пропускаются, и обработка продолжается
+    с первой пары без ответа.
+    
     Raises:
-        FileNotFoundError: Если файл с данными не найден
         ValueError: Если данные для указанного row_id не найдены
     """
     # Создаем pipeline logger
@@ -188,39 +253,40 @@ async def process_form_submission_with_llm(row_id: str) -> Dict[str, Any]:
         # ЭТАП 2: Получение и валидация данных формы
         pipeline_logger.stage_start("Получение данных из Google Sheets", 2)
         
-        # Путь к файлу данных
-        json_file = Path(settings.data_dir) / settings.form_data_filename
-        
-        # Проверяем и загружаем данные
-        if not json_file.exists():
-            raise FileNotFoundError(f"Файл данных не найден: {json_file}")
+        store = await asyncio.to_thread(get_form_store)
+        pipeline_logger.step("Загрузка формы из хранилища", f"файл: {store.path.name}")
         
-        pipeline_logger.step("Загрузка JSON файла", f"файл: {json_file.name}")
-        
-        with open(json_file, "r", encoding="utf-8") as f:
-            all_data = json.load(f)
-        
-        # Проверяем наличие нужной записи
-        if "data" not in all_data or row_id not in all_data["data"]:
+        # Проверяем наличие нужной записи (хранилище читается в потоке, не блокируя цикл событий)
+        form_obj = await asyncio.to_thread(store.get, row_id)
+        if form_obj is None:
             raise ValueError(f"Форма с ID {row_id} не найдена")
         
-        form_obj = all_data["data"][row_id]
         pipeline_logger.step("Валидация данных формы", f"email: {form_obj.get('user_email', 'не указан')}")
         
         # Пропускаем уже обработанные формы
         if form_obj.get("processed", False):
             pipeline_logger.step("Проверка статуса", "форма уже обработана")
             pipeline_logger.stage_finish(2, "Форма уже обработана")
+            progress_tracker.finished(row_id, processed=True)
             return form_obj
         
-        # Проверяем наличие пар вопрос-ответ
-        if not form_obj.get("qa_pairs"):
-            pipeline_logger.step("Проверка Q&A пар", "пары отсутствуют")
+        total_pairs = len(form_obj.get("qa_pairs") or [])
+        expected_pairs = max(0, total_pairs - 1)  # Исключаем первую пару
+        
+        # Форме без пар для оценки (пар нет или только служебная) оценивать нечего:
+        # она отмечается обработанной, чтобы очередь не повторяла её как неудачную
+        # и не ставила заново при каждом старте сервиса
+        if expected_pairs == 0:
+            pipeline_logger.step("Проверка Q&A пар", "нет пар для оценки")
+            form_obj["processed"] = True
+            form_obj["updated_at"] = datetime.now().isoformat()
+            await asyncio.to_thread(
+                store.update, row_id, lambda form: form.update(processed=True, updated_at=form_obj["updated_at"])
+            )
             pipeline_logger.stage_finish(2, "Нет Q&A пар для обработки")
+            progress_tracker.finished(row_id, processed=True)
             return form_obj
         
-        total_pairs = len(form_obj["qa_pairs"])
-        expected_pairs = max(0, total_pairs - 1)  # Исключаем первую пару
         pipeline_logger.step("Подготовка к обработке", f"будет обработано {expected_pairs} пар из {total_pairs}")
         
         pipeline_logger.stage_finish(2, f"{total_pairs} Q&A пар загружено")
@@ -235,44 +301,46 @@ async def process_form_submission_with_llm(row_id: str) -> Dict[str, Any]:
         # ЭТАП 4: Обработка Q&A пар
         pipeline_logger.stage_start("Обработка Q&A пар", 4)
         
+        # Первая пара - служебная информация, пары с ответом LLM уже обработаны
+        # (в том числе при прошлом, прерванном запуске - обработка продолжается с первой пары без ответа)
+        pipeline_logger.step("Пропуск первой пары", "служебная информация")
+        pending = []
         processed_count = 0
-        # Обрабатываем каждую пару вопрос-ответ
-        async with httpx.AsyncClient() as client:
-            for i, qa_pair in enumerate(form_obj["qa_pairs"]):
-                # Пропускаем первую пару вопрос-ответ
-                if i == 0:
-                    pipeline_logger.step("Пропуск первой пары", "служебная информация")
-                    continue
-                    
-                # Пропускаем пары, уже имеющие ответ LLM
-                if qa_pair.get("llm_response"):
-                    processed_count += 1
-                    pipeline_logger.step(f"Пара {i+1} уже обработана", "пропуск")
-                    continue
-                
-                # Формируем запрос для LLM
-                question_preview = qa_pair.get('question', '')[:50]
-                pipeline_logger.qa_pair_processed(i+1, total_pairs, question_preview)
-                
-                prompt = f"Вот вопрос пользователя: {qa_pair.get('question', '')}\nВот как ответил пользователь: {qa_pair.get('user_answer', '')}"
-                
+        for i, qa_pair in enumerate(form_obj["qa_pairs"]):
+            if i == 0:
+                continue
+            if qa_pair.get("llm_response"):
+                processed_count += 1
+                pipeline_logger.step(f"Пара {i+1} уже обработана", "пропуск")
+            else:
+                pending.append(i)
+        if pending and processed_count:
+            pipeline_logger.step("Продолжение обработки", f"с пары {pending[0]+1}, {processed_count} пар уже с ответом")
+        progress_tracker.started(row_id, total=expected_pairs, done=processed_count)
+        
+        # Пары оцениваются параллельно в пределах лимитов на форму и на сервис;
+        # ответы записываются в порядке вопросов, ошибка одной пары не влияет на остальные.
+        # Каждый ответ сохраняется в хранилище сразу после получения.
+        form_semaphore = asyncio.Semaphore(settings.llm_concurrency_per_form)
+        
+        async def evaluate_and_save(i: int) -> Optional[str]:
+            answer = await evaluate_qa_pair(client, form_semaphore, pipeline_logger, i, total_pairs, form_obj["qa_pairs"][i])
+            if answer is not None:
                 try:
-                    # Отправляем запрос к LLM сервису
-                    response = await client.post(
-                        f"http://127.0.0.1:{port_settings.llm_service_port}/llm/full-reasoning",
-                        json={"question": prompt},
-                        timeout=60.0
-                    )
-                    response.raise_for_status()
-                    
-                    # Сохраняем ответ модели
-                    form_obj["qa_pairs"][i]["llm_response"] = response.json().get("answer", "")
-                    processed_count += 1
-                    
-                    pipeline_logger.step(f"LLM ответ получен", f"пара {i+1}/{total_pairs}")
-                    
+                    await asyncio.to_thread(save_llm_response, row_id, i, answer)
                 except Exception as e:
-                    pipeline_logger.step(f"Ошибка обработки пары {i+1}", str(e), "error")
+                    pipeline_logger.step(f"Ошибка сохранения ответа пары {i+1}", str(e), "error")
+                    answer = None
+            progress_tracker.pair_finished(row_id, i + 1, success=answer is not None)
+            return answer
+        
+        async with httpx.AsyncClient() as client:
+            answers = await asyncio.gather(*(evaluate_and_save(i) for i in pending))
+        
+        for i, answer in zip(pending, answers):
+            if answer is not None:
+                form_obj["qa_pairs"][i]["llm_response"] = answer
+                processed_count += 1
         
         pipeline_logger.stage_finish(4, f"Обработано {processed_count}/{expected_pairs} пар")
         
@@ -280,26 +348,51 @@ async def process_form_submission_with_llm(row_id: str) -> Dict[str, Any]:
         pipeline_logger.stage_start("Сохранение результатов", 5)
         
         # Проверяем завершенность обработки (все кроме первой пары должны быть обработаны)
-        if processed_count >= expected_pairs and expected_pairs > 0:
+        if processed_count >= expected_pairs:
             form_obj["processed"] = True
             form_obj["updated_at"] = datetime.now().isoformat()
+            await asyncio.to_thread(
+                store.update, row_id, lambda form: form.update(processed=True, updated_at=form_obj["updated_at"])
+            )
             pipeline_logger.step("Обновление статуса", "processed = True")
         else:
             pipeline_logger.step("Частичная обработка", f"{processed_count}/{expected_pairs} обработано", "warning")
         
-        # Сохраняем результаты
-        all_data["data"][row_id] = form_obj
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(all_data, f, ensure_ascii=False, indent=2)
-        
-        pipeline_logger.step("Запись в файл", f"результаты сохранены в {json_file.name}")
+        # Ответы LLM уже сохранены по мере получения на этапе 4
+        pipeline_logger.step("Запись в хранилище", f"результаты сохранены в {store.path.name}")
         pipeline_logger.stage_finish(5, f"Форма {row_id} обработана")
+        progress_tracker.finished(row_id, processed=form_obj.get("processed", False))
         
         return form_obj
 
+def save_llm_response(row_id: str, pair_index: int, llm_response: str) -> None:
+    """
+    Сохраняет ответ LLM для одной пары вопрос-ответ сразу после его получения.
+    
+    Форма обновляется атомарно, поэтому ответы, полученные параллельно,
+    не затирают друг друга, а после сбоя обработка продолжается
+    без повторной оценки уже сохранённых пар.
+    
+    Args:
+        row_id (str): Идентификатор строки из Google Sheets
+        pair_index (int): Номер пары в форме (с нуля)
+        llm_response (str): Ответ LLM
+        
+    Raises:
+        ValueError: Если форма не найдена
+    """
+    def apply(form: Dict[str, Any]) -> None:
+        form["qa_pairs"][pair_index]["llm_response"] = llm_response
+        form["updated_at"] = datetime.now().isoformat()
+    
+    if get_form_store().update(row_id, apply) is None:
+        raise ValueError(f"Форма с ID {row_id} не найдена")
+    logger.debug(f"Форма {row_id}: сохранён ответ LLM для пары {pair_index + 1}")
+
+
 def get_form_submission_by_row_id(row_id: str) -> Optional[Dict[str, Any]]:
     """
-    Находит форму в JSON-данных по ID строки из Google Sheets.
+    Находит форму в хранилище форм по ID строки из Google Sheets.
     
     Args:
         row_id (str): Идентификатор строки из Google Sheets
@@ -307,21 +400,9 @@ def get_form_submission_by_row_id(row_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: Найденная форма или None, если не найдена
     """
-    # Путь к файлу с данными
-    json_file = Path(settings.data_dir) / settings.form_data_filename
-    
-    # Проверяем существование файла
-    if not json_file.exists():
-        logger.warning(f"Файл данных не существует: {json_file}")
-        return None
-    
     try:
-        # Читаем данные из файла
-        with open(json_file, "r", encoding="utf-8") as f:
-            all_data = json.load(f)
-        
-        # Ищем запись по row_id
-        result = all_data.get("data", {}).get(row_id)
+        # Ищем последнюю версию записи по row_id
+        result = get_form_store().get(row_id)
         if result:
             logger.debug(f"Найдены данные для формы {row_id}")
         else:
@@ -329,8 +410,22 @@ def get_form_submission_by_row_id(row_id: str) -> Optional[Dict[str, Any]]:
         return result
     
     except json.JSONDecodeError:
-        logger.error(f"Ошибка формата JSON в файле {json_file}")
+        logger.error(f"Ошибка формата JSON в записи формы {row_id}")
         return None
     except Exception as e:
         logger.error(f"Ошибка при чтении данных для строки {row_id}: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def list_unprocessed_forms(limit: Optional[int] = None) -> List[str]:
+    """
+    Возвращает ID строк форм, ещё не обработанных LLM, от давно к недавно полученным.
+    
+    Args:
+        limit (Optional[int]): Максимальное количество форм
+        
+    Returns:
+        List[str]: Идентификаторы строк необработанных форм
+    """
+    row_ids = get_form_store().list_unprocessed(limit)
+    logger.debug(f"Необработанных форм: {len(row_ids)}")
+    return row_ids
@@ -0,0 +1,390 @@
+# src/google_sheets/storage.py
+
+"""
+Хранилище форм сервиса Google Sheets.
+
+FormJournal - журнал только на дозапись (JSONL): каждое сохранение формы
+дописывает в конец файла одну строку с актуальной версией формы
+{"row_id": ..., "form": {...}}. В памяти держится индекс
+row_id -> смещение последней версии формы в файле, поэтому чтение формы -
+это один seek и чтение одной строки, а запись не зависит от числа форм.
+
+Старые версии форм остаются в файле до компактизации, которая
+переписывает журнал только с последними версиями.
+
+SQLiteFormStore - хранилище форм в SQLite (режим WAL) с индексами по
+row_id, статусу обработки, email и времени получения: поиск формы и
+выборка необработанных форм идут по индексу, без чтения всех форм.
+
+Хранилище выбирается настройкой storage_backend ("sqlite" или "journal"),
+оба варианта предоставляют одинаковые методы get/put/row_ids/list_unprocessed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from src.google_sheets.config import settings
+from src.utils.logger import get_logger
+
+logger = get_logger("google_sheets")
+
+
+class FormJournal:
+    """
+    Журнал форм на дозапись с индексом row_id -> смещение в файле.
+
+    Args:
+        path (Path): Путь к файлу журнала (JSONL).
+        legacy_path (Optional[Path]): Прежний JSON-файл {"data": {row_id: форма}};
+            если журнала ещё нет, формы из него переносятся в журнал.
+    """
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None) -> None:
+        self.path = path
+        self._offsets: Dict[str, int] = {}
+        self._records = 0
+        # RLock: чтение тоже под блокировкой, чтобы не попасть на подмену файла при компактизации
+        self._lock = threading.RLock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() and legacy_path is not None and legacy_path.exists():
+            self._migrate_legacy(legacy_path)
+        self._load_index()
+        if self._records > max(2 * len(self._offsets), settings.journal_compact_min_records):
+            self.compact()
+
+    def _load_index(self) -> None:
+        """
+        Читает журнал и строит индекс последних версий форм.
+        Недописанная последняя строка (сбой во время записи) отрезается.
+        """
+        self._offsets.clear()
+        self._records = 0
+        if not self.path.exists():
+            return
+        valid_end = 0
+        with self.path.open("rb") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("строка не дописана")
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Повреждённая запись в журнале {self.path.name} на смещении {offset}, хвост отброшен")
+                    break
+                self._offsets[str(record["row_id"])] = offset
+                self._records += 1
+                valid_end = f.tell()
+        if valid_end < self.path.stat().st_size:
+            with self.path.open("r+b") as f:
+                f.truncate(valid_end)
+        logger.debug(f"Журнал форм {self.path.name}: {len(self._offsets)} форм, {self._records} записей")
+
+    def _migrate_legacy(self, legacy_path: Path) -> None:
+        """
+        Переносит формы из прежнего JSON-файла в новый журнал.
+        """
+        legacy_data = load_legacy_forms(legacy_path)
+        if legacy_data is None:
+            return
+        self._write_records(self.path, legacy_data)
+        logger.info(f"Перенесено {len(legacy_data)} форм из {legacy_path.name} в журнал {self.path.name}")
+
+    @staticmethod
+    def _encode(row_id: str, form: Dict[str, Any]) -> bytes:
+        return (json.dumps({"row_id": row_id, "form": form}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _write_records(self, path: Path, forms: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Записывает формы в новый файл журнала через временный файл.
+        """
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            for row_id, form in forms.items():
+                f.write(self._encode(str(row_id), form))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает последнюю версию формы или None, если формы нет.
+        """
+        with self._lock:
+            offset = self._offsets.get(row_id)
+            if offset is None:
+                return None
+            with self.path.open("rb") as f:
+                f.seek(offset)
+                return json.loads(f.readline())["form"]
+
+    def put(self, row_id: str, form: Dict[str, Any]) -> None:
+        """
+        Дописывает новую версию формы в конец журнала.
+        """
+        data = self._encode(row_id, form)
+        with self._lock:
+            with self.path.open("ab") as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._offsets[row_id] = offset
+            self._records += 1
+
+    def put_many(self, forms: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Дописывает несколько форм одной записью в журнал с одним fsync.
+        """
+        records = [(str(row_id), self._encode(str(row_id), form)) for row_id, form in forms.items()]
+        with self._lock:
+            with self.path.open("ab") as f:
+                offset = f.tell()
+                offsets = []
+                for row_id, data in records:
+                    offsets.append((row_id, offset))
+                    offset += len(data)
+                f.write(b"".join(data for _, data in records))
+                f.flush()
+                os.fsync(f.fileno())
+            self._offsets.update(offsets)
+            self._records += len(records)
+
+    def update(self, row_id: str, apply: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно изменяет форму: читает последнюю версию, применяет к ней apply
+        и дописывает результат. Возвращает новую версию или None, если формы нет.
+        """
+        with self._lock:
+            form = self.get(row_id)
+            if form is None:
+                return None
+            apply(form)
+            self.put(row_id, form)
+            return form
+
+    def row_ids(self) -> List[str]:
+        """
+        Возвращает идентификаторы всех форм в порядке первого сохранения.
+        """
+        return list(self._offsets)
+
+    def list_unprocessed(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Возвращает row_id необработанных форм в порядке первого сохранения.
+        Журнал не индексирует статус, поэтому читаются все формы.
+        """
+        row_ids = [row_id for row_id in self.row_ids() if not (self.get(row_id) or {}).get("processed", False)]
+        return row_ids[:limit] if limit is not None else row_ids
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def close(self) -> None:
+        """
+        Журнал не держит открытых файлов между операциями.
+        """
+
+    def compact(self) -> None:
+        """
+        Переписывает журнал, оставляя только последние версии форм.
+        """
+        with self._lock:
+            forms = {row_id: self.get(row_id) for row_id in self._offsets}
+            self._write_records(self.path, forms)
+            self._load_index()
+        logger.info(f"Журнал форм {self.path.name} компактизирован: {len(forms)} форм")
+
+
+def load_legacy_forms(legacy_path: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Читает формы из прежнего JSON-файла {"data": {row_id: форма}}.
+    Возвращает None, если файл не читается.
+    """
+    try:
+        with legacy_path.open("r", encoding="utf-8") as f:
+            return json.load(f).get("data", {})
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось прочитать {legacy_path.name} для переноса форм: {e}")
+        return None
+
+
+class SQLiteFormStore:
+    """
+    Хранилище форм в SQLite.
+
+    Форма целиком хранится в колонке data (JSON), а поля для выборок -
+    row_id, processed, user_email, received_at - вынесены в отдельные
+    индексированные колонки. База работает в режиме WAL: чтение не
+    блокируется записью. Соединение разделяется между потоками под блокировкой.
+
+    Args:
+        path (Path): Путь к файлу базы.
+        import_from (List[Path]): Журнал или прежний JSON-файл форм; если база пуста,
+            формы из первого существующего файла переносятся в неё.
+    """
+    def __init__(self, path: Path, import_from: Optional[List[Path]] = None) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS forms (
+                row_id TEXT NOT NULL UNIQUE,
+                processed INTEGER NOT NULL DEFAULT 0,
+                user_email TEXT NOT NULL DEFAULT '',
+                received_at TEXT,
+                updated_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_forms_processed ON forms (processed, received_at);
+            CREATE INDEX IF NOT EXISTS idx_forms_user_email ON forms (user_email);
+            CREATE INDEX IF NOT EXISTS idx_forms_received_at ON forms (received_at);
+            """
+        )
+        if len(self) == 0:
+            self._import_existing(import_from or [])
+
+    def _import_existing(self, paths: List[Path]) -> None:
+        """
+        Переносит формы из журнала или прежнего JSON-файла в пустую базу.
+        """
+        for path in paths:
+            if not path.exists():
+                continue
+            if path.suffix == ".jsonl":
+                journal = FormJournal(path)
+                forms = {row_id: journal.get(row_id) for row_id in journal.row_ids()}
+            else:
+                forms = load_legacy_forms(path)
+            if forms:
+                self.put_many(forms)
+                logger.info(f"Перенесено {len(forms)} форм из {path.name} в {self.path.name}")
+            return
+
+    @staticmethod
+    def _row(row_id: str, form: Dict[str, Any]) -> tuple:
+        return (
+            row_id,
+            1 if form.get("processed") else 0,
+            form.get("user_email") or "",
+            form.get("received_at"),
+            form.get("updated_at"),
+            json.dumps(form, ensure_ascii=False),
+        )
+
+    _UPSERT = (
+        "INSERT INTO forms (row_id, processed, user_email, received_at, updated_at, data) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(row_id) DO UPDATE SET processed = excluded.processed, user_email = excluded.user_email, "
+        "received_at = excluded.received_at, updated_at = excluded.updated_at, data = excluded.data"
+    )
+
+    def get(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает форму или None, если формы нет.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM forms WHERE row_id = ?", (row_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, row_id: str, form: Dict[str, Any]) -> None:
+        """
+        Сохраняет форму, заменяя предыдущую версию.
+        """
+        self.put_many({row_id: form})
+
+    def put_many(self, forms: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Сохраняет несколько форм одной транзакцией.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(self._UPSERT, [self._row(str(row_id), form) for row_id, form in forms.items()])
+
+    def update(self, row_id: str, apply: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно изменяет форму в одной транзакции (BEGIN IMMEDIATE):
+        читает форму, применяет к ней apply и сохраняет.
+        Возвращает новую версию или None, если формы нет.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM forms WHERE row_id = ?", (row_id,)).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return None
+                form = json.loads(row[0])
+                apply(form)
+                self._conn.execute(self._UPSERT, self._row(row_id, form))
+                self._conn.commit()
+                return form
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def row_ids(self) -> List[str]:
+        """
+        Возвращает идентификаторы всех форм в порядке первого сохранения.
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT row_id FROM forms ORDER BY rowid")]
+
+    def list_unprocessed(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Возвращает row_id необработанных форм от давно к недавно полученным.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_id FROM forms WHERE processed = 0 ORDER BY received_at LIMIT ?",
+                (limit if limit is not None else -1,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM forms").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+FormStore = Union[SQLiteFormStore, FormJournal]
+
+_store: Optional[FormStore] = None
+
+
+def get_form_store() -> FormStore:
+    """
+    Возвращает хранилище форм по настройкам (storage_backend и пути к файлам).
+    Хранилище открывается один раз и пересоздаётся при смене настроек.
+    """
+    global _store
+    data_dir = Path(settings.data_dir)
+    legacy_path = data_dir / settings.form_data_filename
+    journal_path = data_dir / settings.form_journal_filename
+    if settings.storage_backend == "sqlite":
+        store_cls, path = SQLiteFormStore, data_dir / settings.form_db_filename
+    elif settings.storage_backend == "journal":
+        store_cls, path = FormJournal, journal_path
+    else:
+        raise ValueError(f"Неизвестное хранилище форм: {settings.storage_backend}")
+
+    if not isinstance(_store, store_cls) or _store.path != path:
+        if _store is not None:
+            _store.close()
+        if store_cls is SQLiteFormStore:
+            _store = SQLiteFormStore(path, import_from=[journal_path, legacy_path])
+        else:
+            _store = FormJournal(path, legacy_path=legacy_path)
+    return _store
@@ -0,0 +1,171 @@
+# src/google_sheets/worker.py
+
+"""
+Пул воркеров, обрабатывающих формы из очереди задач (src.google_sheets.jobs).
+
+Число воркеров (worker_count) ограничивает число форм, обрабатываемых
+одновременно, поэтому всплеск запросов на обработку не перегружает GigaChat:
+лишние формы ждут в очереди. При старте пул возвращает в очередь задачи,
+прерванные остановкой сервиса, и ставит в очередь необработанные формы.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from src.google_sheets.config import settings
+from src.google_sheets.jobs import JobQueue, get_job_queue
+from src.google_sheets.progress import progress_tracker
+from src.google_sheets.services import list_unprocessed_forms, process_form_submission_with_llm
+from src.utils.logger import get_logger
+
+logger = get_logger("google_sheets")
+
+
+class FormWorkerPool:
+    """
+    Асинхронные воркеры, забирающие задачи из очереди.
+
+    Форма, оставшаяся после обработки необработанной (processed = False),
+    считается неудачной попыткой и повторяется с задержкой.
+    """
+    def __init__(
+        self,
+        queue: JobQueue,
+        process: Callable[[str], Awaitable[Dict]],
+        workers: int = 2,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.queue = queue
+        self.process = process
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """
+        Запускает воркеры в текущем цикле событий.
+        """
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.workers)]
+        logger.info(f"Запущено воркеров обработки форм: {self.workers}")
+
+    async def stop(self) -> None:
+        """
+        Останавливает воркеры. Прерванные задачи возвращаются в очередь.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Воркеры обработки форм остановлены")
+
+    def notify(self) -> None:
+        """
+        Будит ожидающие воркеры после постановки новой задачи.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self, worker_number: int) -> None:
+        while True:
+            row_id = await asyncio.to_thread(self.queue.claim)
+            if row_id is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            await self._process_job(worker_number, row_id)
+
+    async def _process_job(self, worker_number: int, row_id: str) -> None:
+        logger.info(f"Воркер {worker_number} взял форму {row_id}")
+        try:
+            result = await self.process(row_id)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.release, row_id)
+            raise
+        except Exception as e:
+            await self._fail(row_id, str(e))
+            return
+        if result.get("processed", False):
+            await asyncio.to_thread(self.queue.complete, row_id)
+        else:
+            await self._fail(row_id, "форма обработана частично")
+
+    async def _fail(self, row_id: str, error: str) -> None:
+        # Подписчики прогресса узнают об ошибке; событие failed - только когда попытки исчерпаны
+        delay = await asyncio.to_thread(self.queue.fail, row_id, error)
+        progress_tracker.error(row_id, error, final=delay is None)
+
+
+_pool: Optional[FormWorkerPool] = None
+
+
+def sweep_unprocessed_forms(queue: JobQueue) -> int:
+    """
+    Возвращает в очередь прерванные задачи и ставит в очередь
+    необработанные формы без задачи. Формы с исчерпанными попытками
+    не трогаются - их можно запустить заново через /sheets/process-form.
+
+    Returns:
+        int: Количество задач, поставленных в очередь.
+    """
+    requeued = queue.requeue_running()
+    enqueued = sum(queue.enqueue(row_id, force=False) for row_id in list_unprocessed_forms())
+    logger.info(f"Очередь форм при старте: возвращено {requeued} прерванных задач, добавлено {enqueued} форм")
+    return requeued + enqueued
+
+
+async def start_worker_pool() -> None:
+    """
+    Запускает пул воркеров обработки форм. Вызывается при старте сервиса.
+    """
+    global _pool
+    queue = get_job_queue()
+    await asyncio.to_thread(sweep_unprocessed_forms, queue)
+    _pool = FormWorkerPool(queue, process_form_submission_with_llm, settings.worker_count, settings.job_poll_interval)
+    _pool.start()
+
+
+async def stop_worker_pool() -> None:
+    """
+    Останавливает пул воркеров. Вызывается при остановке сервиса.
+    """
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
+
+
+async def enqueue_forms(row_ids: List[str]) -> List[bool]:
+    """
+    Ставит формы в очередь одной операцией в отдельном потоке и будит воркеры.
+    Событие queued публикуется уже в цикле событий: подписчики прогресса
+    и пробуждение воркеров не потокобезопасны.
+
+    Returns:
+        List[bool]: Для каждой формы True, если задача поставлена;
+            False, если форма уже в очереди или обрабатывается.
+    """
+    def enqueue_all() -> List[bool]:
+        queue = get_job_queue()
+        return [queue.enqueue(row_id) for row_id in row_ids]
+
+    enqueued = await asyncio.to_thread(enqueue_all) if row_ids else []
+    for row_id, is_enqueued in zip(row_ids, enqueued):
+        if is_enqueued:
+            progress_tracker.queued(row_id)
+    if any(enqueued) and _pool is not None:
+        _pool.notify()
+    return enqueued
+
+
+async def enqueue_form(row_id: str) -> bool:
+    """
+    Ставит форму в очередь на обработку и будит воркеры.
+
+    Returns:
+        bool: True, если задача поставлена; False, если форма уже в очереди или обрабатывается.
+    """
+    return (await enqueue_forms([row_id]))[0]
@@ -0,0 +1,326 @@
+# src/llm_search_and_answer/cache.py
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from src.utils.logger import get_logger
+
+logger = get_logger("llm_service")
+
+T = TypeVar("T")
+
+class ContextCache:
+    """
+    LRU-кэш собранного контекста книги для LLM.
+
+    Ключ - набор подглав, значение - готовый блок <content_subchapter>.
+    Кэш привязан к версии книги: при смене версии все записи сбрасываются.
+    """
+    def __init__(self, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: str) -> Optional[str]:
+        """
+        Возвращает контекст из кэша, если он собран для той же версии книги.
+        """
+        with self._lock:
+            if version != self.version:
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, version: str, value: str) -> None:
+        """
+        Сохраняет контекст; при смене версии книги старые записи удаляются.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+
+class TokenCache:
+    """
+    Кэш токена доступа GigaChat в памяти процесса.
+
+    Токен берётся из gigachat_init один раз и переиспользуется до истечения
+    expires_at. За refresh_margin секунд до истечения запросы продолжают
+    получать текущий токен, а новый запрашивается в фоне. Обновление идёт
+    под asyncio.Lock: одновременные запросы ждут одно обращение к
+    gigachat_init, а не запрашивают токен каждый сам.
+
+    fetch - корутина, возвращающая ответ /token/token:
+    {"access_token": "...", "expires_at": <мс>}.
+    """
+    def __init__(self, fetch: Callable[[], Awaitable[Dict[str, Any]]], refresh_margin: float = 60.0) -> None:
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.token: Optional[str] = None
+        self.expires_at: float = 0.0  # секунды (unix time)
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _is_valid(self, now: float) -> bool:
+        return self.token is not None and now < self.expires_at
+
+    def _needs_refresh(self, now: float) -> bool:
+        return now >= self.expires_at - self.refresh_margin
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio.Lock привязан к циклу событий, поэтому при смене цикла создаём новый
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    def current(self) -> Optional[str]:
+        """
+        Возвращает токен, если он ещё не истёк, иначе None.
+        """
+        return self.token if self._is_valid(time.time()) else None
+
+    def set(self, token: str, expires_at_ms: Optional[Any]) -> None:
+        """
+        Сохраняет токен и время его истечения (миллисекунды, как в gigachat_init).
+        Токен без expires_at не кэшируется.
+        """
+        self.token = token
+        self.expires_at = int(expires_at_ms) / 1000 if expires_at_ms is not None else 0.0
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Сбрасывает токен. Если передан token, сбрасывает только его,
+        чтобы не выбросить уже обновлённый другим запросом токен.
+        """
+        if token is None or token == self.token:
+            self.token, self.expires_at = None, 0.0
+
+    async def get(self) -> str:
+        """
+        Возвращает действующий токен, при необходимости обновляя его.
+        """
+        now = time.time()
+        if self._is_valid(now):
+            if self._needs_refresh(now):
+                self._schedule_refresh()
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """
+        Запрашивает новый токен. Если пока ждали блокировку, токен уже обновил
+        другой запрос, повторного обращения к gigachat_init не происходит.
+        """
+        async with self._get_lock():
+            now = time.time()
+            if self._is_valid(now) and not self._needs_refresh(now):
+                return self.token
+            data = await self._fetch()
+            self.set(data["access_token"], data.get("expires_at"))
+            logger.debug("Токен GigaChat обновлён")
+            return data["access_token"]
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Текущий токен ещё действует, следующий запрос попробует снова
+            logger.warning(f"Не удалось заранее обновить токен GigaChat: {e}")
+
+
+# Формат запроса оценки, который присылает google_sheets (build_qa_prompt)
+_QA_PROMPT_RE = re.compile(r"^Вот вопрос пользователя:(.*)\nВот как ответил пользователь:(.*)$", re.DOTALL)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кэша: регистр, ё/е и пробелы не влияют на ключ.
+    """
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+def split_question(question_user: str) -> Tuple[str, str]:
+    """
+    Разделяет запрос оценки на вопрос и ответ пользователя.
+    Запрос в другом формате целиком считается вопросом.
+    """
+    match = _QA_PROMPT_RE.match(question_user)
+    if match is None:
+        return question_user, ""
+    return match.group(1), match.group(2)
+
+
+def evaluation_key(question_user: str, prompt: str, model: str, context: str) -> str:
+    """
+    Ключ кэша оценок: хэш нормализованных вопроса и ответа пользователя,
+    версии промпта, модели и версии контекста. Версии промпта и контекста -
+    хэши их текста, поэтому изменение промпта или книги даёт новые ключи.
+    """
+    question, answer = split_question(question_user)
+    parts = (
+        normalize_text(question),
+        normalize_text(answer),
+        hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        model,
+        hashlib.sha256(context.encode("utf-8")).hexdigest(),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """
+    Двухуровневый кэш оценок LLM: LRU в памяти и таблица SQLite на диске.
+
+    Оценка из SQLite поднимается в память при первом обращении, поэтому
+    повторные одинаковые ответы не обращаются ни к GigaChat, ни к диску.
+    Без path кэш работает только в памяти.
+    """
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 1024) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS evaluations ("
+                    "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    def _remember(self, key: str, answer: str) -> None:
+        self._entries[key] = answer
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_from_memory(self, key: str) -> Optional[str]:
+        """
+        Возвращает оценку из памяти без обращения к диску, либо None.
+        Промах не учитывается: после него оценку ищут через get.
+        """
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return answer
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает оценку из памяти или с диска, либо None.
+        """
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return answer
+            if self._conn is not None:
+                row = self._conn.execute("SELECT answer FROM evaluations WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, answer: str) -> None:
+        """
+        Сохраняет оценку в памяти и на диске.
+        """
+        with self._lock:
+            self._remember(key, answer)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO evaluations (key, answer, created_at) VALUES (?, ?, ?)",
+                        (key, answer, time.time()),
+                    )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счётчики попаданий и промахов.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._entries),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов.
+
+    Пока выполняется вызов с ключом key, другие вызовы с тем же ключом
+    не запускают свою работу, а ждут результат (или исключение) первого.
+    Вызов выполняется отдельной задачей: отмена одного из ожидающих
+    не прерывает работу для остальных.
+    """
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.coalesced += 1
+            logger.debug("Запрос объединён с уже выполняющимся")
+        else:
+            task = loop.create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Ошибку получают ожидающие; если все они отменены, не оставляем её неполученной
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,92 @@
+# src/llm_search_and_answer/clients.py
+
+"""
+Долгоживущие асинхронные клиенты LLM-сервиса.
+
+Один пул соединений httpx.AsyncClient для запросов к book_parser и
+gigachat_init и один AsyncOpenAI/instructor клиент на процесс: соединения
+переиспользуются (keep-alive) между запросами, а не создаются на каждый вызов.
+Токен GigaChat подставляется в заголовок Authorization каждого запроса,
+поэтому клиент не нужно пересоздавать при обновлении токена.
+
+Клиенты создаются лениво при первом обращении и закрываются в lifespan сервиса.
+"""
+
+from typing import Optional
+
+import httpx
+import instructor
+from openai import AsyncOpenAI
+from langsmith.wrappers import wrap_openai
+
+from src.gigachat_init.config import settings
+from src.llm_search_and_answer.config import settings as llm_settings
+from src.utils.logger import get_logger
+
+logger = get_logger("llm_service")
+
+_http_client: Optional[httpx.AsyncClient] = None
+_llm_http_client: Optional[httpx.AsyncClient] = None
+_llm_client: Optional[instructor.AsyncInstructor] = None
+
+
+def _create_http_client(timeout: Optional[float] = None) -> httpx.AsyncClient:
+    """
+    Создаёт асинхронный HTTP клиент с пулом соединений и отключенной проверкой SSL.
+    """
+    limits = httpx.Limits(
+        max_connections=llm_settings.http_max_connections,
+        max_keepalive_connections=llm_settings.http_max_keepalive_connections,
+    )
+    if timeout is None:
+        return httpx.AsyncClient(verify=False, limits=limits)
+    return httpx.AsyncClient(verify=False, limits=limits, timeout=timeout)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий HTTP клиент для запросов к внутренним сервисам.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+
+def get_async_llm_client() -> instructor.AsyncInstructor:
+    """
+    Возвращает общий асинхронный instructor клиент с LangSmith трейсингом.
+
+    api_key клиента - заглушка: актуальный токен передаётся в каждом запросе
+    через заголовок Authorization (см. auth_headers).
+    """
+    global _llm_client, _llm_http_client
+    if _llm_client is None or _llm_http_client is None or _llm_http_client.is_closed:
+        _llm_http_client = _create_http_client(timeout=llm_settings.llm_timeout)
+        base_client = AsyncOpenAI(
+            api_key="gigachat",
+            base_url=settings.gigachat_base_url,
+            http_client=_llm_http_client,
+        )
+        _llm_client = instructor.from_openai(wrap_openai(base_client), mode=instructor.Mode.JSON_SCHEMA)
+        logger.debug("Создан асинхронный LLM клиент")
+    return _llm_client
+
+
+def auth_headers(token: str) -> dict:
+    """
+    Заголовки запроса к GigaChat с токеном доступа.
+    """
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def close_clients() -> None:
+    """
+    Закрывает пулы соединений. Вызывается при остановке сервиса.
+    """
+    global _http_client, _llm_http_client, _llm_client
+    for client in (_http_client, _llm_http_client):
+        if client is not None and not client.is_closed:
+            await client.aclose()
+    _http_client, _llm_http_client, _llm_client = None, None, None
+    logger.debug("Асинхронные клиенты закрыты")
@@ -9,6 +9,53 @@ class LLMServiceSettings(BaseAppSettings):
     base_url: str
     model_name: str
 
+    # Как часто (секунды) сверять версию книги для кэша контекста подглав
+    context_cache_ttl: float = 30.0
+    # Сколько разных наборов подглав держать в кэше контекста
+    context_cache_size: int = 32
+
+    # Пул соединений асинхронных клиентов (book_parser, gigachat_init, GigaChat)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    # Таймаут запроса к GigaChat (секунды)
+    llm_timeout: float = 120.0
+    # За сколько секунд до истечения токена GigaChat запрашивать новый
+    token_refresh_margin: float = 60.0
+
+    # Пакетная оценка: сколько запросов к GigaChat выполнять одновременно
+    # и сколько вопросов принимать в одном пакете
+    batch_concurrency: int = 4
+    batch_max_questions: int = 50
+
+    # Сколько подглав выбирать для вопроса поиском BM25 (/parser/search);
+    # 0 - всегда использовать фиксированный список available_subchapters
+    retrieval_top_k: int = 5
+
+    # Маршрутизация к основной подглаве по TF-IDF: маршрут уверенный, если
+    # близость лучшей подглавы не ниже router_min_score и она опережает вторую
+    # на router_min_margin (или вторая подглава из той же главы); иначе подглаву
+    # выбирает LLM (часть -> глава -> подглава), если включён router_llm_fallback.
+    # Пороги подобраны по таблице подглав книги goldsmith: у верно найденных
+    # подглав близость от 0.15, у вопросов, которые TF-IDF не распознаёт, - ниже 0.1;
+    # отрыв меньше 0.02 между подглавами разных глав - признак неоднозначного вопроса
+    router_min_score: float = 0.1
+    router_min_margin: float = 0.02
+    router_llm_fallback: bool = True
+
+    # Бюджет токенов контекста подглав для финальной оценки (оценка локальная,
+    # без токенизатора модели); менее релевантные подглавы сверх бюджета
+    # обрезаются или отбрасываются. 0 - без ограничения
+    context_token_budget: int = 4000
+    # Подробный контекст (summary страниц или текст страниц) для самой
+    # релевантной подглавы, если вопрос о деталях и подробный текст помещается
+    # в бюджет; false - всегда summary подглав
+    context_detail_escalation: bool = True
+
+    # Кэш оценок: сколько оценок держать в памяти и файл SQLite для оценок
+    # на диске (пустая строка - только память); 0 записей отключает кэш
+    evaluation_cache_size: int = 1024
+    evaluation_cache_db: str = "data/llm_search_and_answer/evaluation_cache.sqlite3"
+
     model_config = ConfigDict(
         env_file='.env',
         env_prefix='LLM_SERVICE_'
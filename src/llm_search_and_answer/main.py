@@ -1,10 +1,24 @@
 # src/llm_search_and_answer/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from src.llm_search_and_answer.routes import router as llm_router
+from src.llm_search_and_answer.clients import close_clients
+from src.llm_search_and_answer.services import close_evaluation_cache, get_evaluation_cache
 from src.config import settings
 
-app = FastAPI(title="LLM Search & Answer Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Кэш оценок (SQLite) открывается до первого запроса, а не в цикле событий
+    get_evaluation_cache()
+    yield
+    # Закрываем общие пулы соединений к book_parser, gigachat_init и GigaChat
+    await close_clients()
+    close_evaluation_cache()
+
+
+app = FastAPI(title="LLM Search & Answer Service", lifespan=lifespan)
 
 # Подключаем роутер
 app.include_router(llm_router)
@@ -1,7 +1,7 @@
 # src/llm_search_and_answer/models.py
 
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import List, Literal
 
 
 # Определяем допустимые номера частей, глав, подглав
@@ -30,6 +30,22 @@ class AnswerResponse(BaseModel):
         description="Текст ответа, сгенерированного моделью LLM."
     )
 
+class BatchQuestionRequest(BaseModel):
+    """
+    Модель пакетного запроса: несколько вопросов (с ответами пользователя) за один вызов.
+    """
+    questions: List[QuestionRequest] = Field(
+        ...,
+        min_length=1,
+        description="Вопросы в том же формате, что и для /llm/full-reasoning."
+    )
+
+class BatchAnswerResponse(BaseModel):
+    """
+    Модель ответа на пакетный запрос: ответы в порядке вопросов.
+    """
+    answers: List[AnswerResponse]
+
 # ------------------------------------------------------------------------------
 # Модель шага 1 (выбор части книги)
 # ------------------------------------------------------------------------------
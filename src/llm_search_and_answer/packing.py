@@ -0,0 +1,184 @@
+# src/llm_search_and_answer/packing.py
+
+"""
+Упаковка контекста для финальной оценки в бюджет токенов.
+
+Токены считаются локально, без токенизатора модели: текст делится на
+кириллические слова, латинские слова, числа и отдельные символы, а длина
+каждого куска переводится в токены по средней длине токена. Для кириллицы
+средний токен короче, чем для латиницы, поэтому оценка для русского текста
+не занижается.
+
+Блоки контекста (подглавы) передаются в порядке убывания релевантности.
+Блоки добавляются по порядку, пока помещаются в бюджет; блок, который
+помещается частично, обрезается по границе строки или предложения, а
+остальные отбрасываются.
+
+Детализация контекста подглавы выбирается по вопросу: по умолчанию -
+summary подглавы, для вопросов о деталях (перечисления, числа, примеры) -
+summary страниц, для вопросов о точных формулировках - текст страниц.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Средняя длина токена (символов) для разных видов текста
+CYRILLIC_CHARS_PER_TOKEN = 3.2
+LATIN_CHARS_PER_TOKEN = 4.0
+DIGITS_PER_TOKEN = 3.0
+
+# Оставшийся бюджет, меньше которого блок не обрезается, а отбрасывается
+MIN_TRUNCATED_TOKENS = 50
+
+TRUNCATION_MARK = " […]"
+
+_PIECE_RE = re.compile(r"[а-яё]+|[a-z]+|\d+|\S", re.IGNORECASE)
+_TAG_RE = re.compile(r"<(/?)([a-z_]+)[^>]*>", re.IGNORECASE)
+_BOUNDARY_RE = re.compile(r"\n|[.!?;](?=\s)")
+
+# Уровни детализации контекста подглавы от самого дешёвого к самому подробному:
+# summary подглавы, summary страниц, текст страниц
+DETAIL_LEVELS = ("summary", "page_summaries", "pages")
+
+# Вопрос о точных формулировках автора
+_VERBATIM_RE = re.compile(r"цитат|дословн|точн\w* (?:формулиров|слов)", re.IGNORECASE)
+# Вопрос о деталях: перечисления, числа, примеры, шаги
+_DETAILED_RE = re.compile(
+    r"\d|перечисл|назов|назва|пример|сколько|какие именно|этап|шаг|по пунктам|подробн",
+    re.IGNORECASE,
+)
+
+
+def _piece_tokens(piece: str) -> int:
+    first = piece[0].lower()
+    if "а" <= first <= "я" or first == "ё":
+        return math.ceil(len(piece) / CYRILLIC_CHARS_PER_TOKEN)
+    if "a" <= first <= "z":
+        return math.ceil(len(piece) / LATIN_CHARS_PER_TOKEN)
+    if first.isdigit():
+        return math.ceil(len(piece) / DIGITS_PER_TOKEN)
+    return 1
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительное число токенов текста.
+    """
+    return sum(_piece_tokens(match.group()) for match in _PIECE_RE.finditer(text))
+
+
+def _close_tags(text: str) -> str:
+    # Закрывает теги (<summary>, <title>), оставшиеся открытыми после обрезки
+    stack: List[str] = []
+    for closing, name in _TAG_RE.findall(text):
+        if not closing:
+            stack.append(name)
+        elif name in stack:
+            del stack[len(stack) - 1 - stack[::-1].index(name):]
+    return text + "".join(f"</{name}>" for name in reversed(stack))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Обрезает текст до max_tokens токенов (с учётом закрывающих тегов и метки обрезки).
+    Обрезка идёт по последней границе строки или предложения, если она
+    сохраняет хотя бы половину текста, иначе - по границе слова.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Запас на метку обрезки; если не хватило запаса на закрывающие теги, режем короче
+    limit = max_tokens - estimate_tokens(TRUNCATION_MARK)
+    while True:
+        truncated = _cut(text, limit)
+        excess = estimate_tokens(truncated) - max_tokens
+        if excess <= 0 or limit <= 0:
+            return truncated
+        limit -= excess
+
+
+def _cut(text: str, limit: int) -> str:
+    used, end = 0, 0
+    for match in _PIECE_RE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > limit:
+            break
+        end = match.end()
+    prefix = text[:end]
+    boundaries = [match.end() for match in _BOUNDARY_RE.finditer(prefix)]
+    if boundaries and boundaries[-1] >= end // 2:
+        prefix = prefix[:boundaries[-1]]
+    return _close_tags(prefix.rstrip() + TRUNCATION_MARK)
+
+
+@dataclass
+class PackedContext:
+    """
+    Результат упаковки: блоки, попавшие в контекст, и учёт токенов.
+
+    Attributes:
+        blocks: Блоки (идентификатор, текст) в исходном порядке, последний может быть обрезан.
+        packed_tokens: Токены блоков, попавших в контекст.
+        dropped_tokens: Токены отброшенных блоков и отрезанных частей.
+        truncated: Идентификаторы обрезанных блоков.
+        dropped: Идентификаторы отброшенных блоков.
+    """
+    blocks: List[Tuple[str, str]] = field(default_factory=list)
+    packed_tokens: int = 0
+    dropped_tokens: int = 0
+    truncated: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+
+def pack_blocks(blocks: List[Tuple[str, str]], budget: int, block_overhead: int = 0) -> PackedContext:
+    """
+    Заполняет бюджет токенов блоками в порядке убывания релевантности.
+
+    Args:
+        blocks: Блоки (идентификатор, текст), самый релевантный первым.
+        budget (int): Бюджет токенов; 0 или меньше - без ограничения.
+        block_overhead (int): Токены обрамления каждого блока в итоговом контексте.
+    """
+    packed = PackedContext()
+    for block_id, text in blocks:
+        tokens = estimate_tokens(text) + block_overhead
+        remaining = budget - packed.packed_tokens
+        if budget <= 0 or tokens <= remaining:
+            packed.blocks.append((block_id, text))
+            packed.packed_tokens += tokens
+        elif remaining - block_overhead >= MIN_TRUNCATED_TOKENS:
+            truncated = truncate_to_tokens(text, remaining - block_overhead)
+            truncated_tokens = estimate_tokens(truncated) + block_overhead
+            packed.blocks.append((block_id, truncated))
+            packed.truncated.append(block_id)
+            packed.packed_tokens += truncated_tokens
+            packed.dropped_tokens += max(tokens - truncated_tokens, 0)
+        else:
+            packed.dropped.append(block_id)
+            packed.dropped_tokens += tokens
+    return packed
+
+
+def required_detail(question: str) -> str:
+    """
+    Уровень детализации контекста, нужный для ответа на вопрос.
+    """
+    if _VERBATIM_RE.search(question):
+        return "pages"
+    if _DETAILED_RE.search(question):
+        return "page_summaries"
+    return "summary"
+
+
+def choose_detail(variants: Dict[str, Optional[str]], required: str, max_tokens: Optional[int]) -> str:
+    """
+    Выбирает самый дешёвый уровень детализации не ниже required, для которого
+    есть текст и он помещается в max_tokens (None - без ограничения).
+    Если такого уровня нет, возвращает "summary".
+    """
+    for level in DETAIL_LEVELS[DETAIL_LEVELS.index(required):]:
+        text = variants.get(level)
+        if text and (max_tokens is None or estimate_tokens(text) <= max_tokens):
+            return level
+    return DETAIL_LEVELS[0]
@@ -2,16 +2,44 @@
 
 from fastapi import APIRouter, HTTPException
 from typing import Union
-from src.llm_search_and_answer.services import run_full_reasoning_pipeline
-from src.llm_search_and_answer.models import QuestionRequest, FullReasoningResponse, AnswerResponse
+from src.llm_search_and_answer.services import arun_full_reasoning_pipeline, arun_batch_reasoning_pipeline
+from src.llm_search_and_answer.services import get_evaluation_cache, evaluation_flights
+from src.llm_search_and_answer.models import (
+    QuestionRequest,
+    FullReasoningResponse,
+    AnswerResponse,
+    BatchQuestionRequest,
+    BatchAnswerResponse,
+)
+from src.llm_search_and_answer.config import settings as llm_settings
 from src.utils.logger import get_logger
 
 logger = get_logger("llm_service")
 
 router = APIRouter(prefix="/llm", tags=["LLM Search & Answer"])
 
+@router.get("/health")
+async def health():
+    """
+    Лёгкая проверка работоспособности сервиса без обращения к LLM и другим сервисам.
+    """
+    return {"status": "ok"}
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Счётчики попаданий и промахов кэша оценок и объединённых одинаковых запросов.
+    """
+    cache = get_evaluation_cache()
+    return {
+        "enabled": cache is not None,
+        **(cache.stats() if cache is not None else {}),
+        "coalesced": evaluation_flights.coalesced,
+        "in_flight": evaluation_flights.in_flight(),
+    }
+
 @router.post("/full-reasoning", response_model=AnswerResponse)
-def full_reasoning(payload: QuestionRequest):
+async def full_reasoning(payload: QuestionRequest):
     """
     Запускает полный пайплайн рассуждения и возвращает только итоговый ответ.
     
@@ -23,9 +51,38 @@ def full_reasoning(payload: QuestionRequest):
     """
     try:
         logger.info(f"Получен запрос на обработку: {len(payload.question)} символов")
-        result = run_full_reasoning_pipeline(payload.question)
+        result = await arun_full_reasoning_pipeline(payload.question)
         logger.info("Запрос обработан успешно")
         return AnswerResponse(answer=result["final_answer"])
     except Exception as e:
         logger.error(f"Ошибка при обработке запроса: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/full-reasoning/batch", response_model=BatchAnswerResponse)
+async def full_reasoning_batch(payload: BatchQuestionRequest):
+    """
+    Оценивает несколько вопросов за один запрос.
+    
+    Контекст книги, токен и LLM-клиент общие для всех вопросов пакета,
+    запросы к модели выполняются параллельно с ограничением.
+    
+    Принимает:
+      - payload (BatchQuestionRequest): список вопросов.
+    
+    Возвращает:
+      - BatchAnswerResponse: ответы в порядке вопросов.
+    """
+    if len(payload.questions) > llm_settings.batch_max_questions:
+        raise HTTPException(
+            status_code=422,
+            detail=f"В пакете не больше {llm_settings.batch_max_questions} вопросов"
+        )
+    try:
+        logger.info(f"Получен пакетный запрос: {len(payload.questions)} вопросов")
+        answers = await arun_batch_reasoning_pipeline([item.question for item in payload.questions])
+        logger.info("Пакетный запрос обработан успешно")
+        return BatchAnswerResponse(answers=[AnswerResponse(answer=answer) for answer in answers])
+    except Exception as e:
+        logger.error(f"Ошибка при обработке пакетного запроса: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,114 @@
+# src/llm_search_and_answer/routing.py
+
+"""
+Маршрутизация вопроса к подглаве по TF-IDF без обращения к LLM.
+
+По таблице подглав (/parser/subchapters) строится матрица TF-IDF: строка -
+подглава (заголовок, summary, key_points), столбцы - слова и символьные
+n-граммы слов. Символьные n-граммы сглаживают склонения и опечатки без
+стеммера. Строки нормированы по L2, поэтому оценка подглавы - косинусная
+близость, а маршрутизация - одно умножение матрицы на вектор вопроса.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+
+def extract_features(text: str, ngram_range: Tuple[int, int] = (3, 5)) -> Counter:
+    """
+    Признаки текста: слова ("w:") и символьные n-граммы слов с границами ("c:").
+    """
+    features: Counter = Counter()
+    low, high = ngram_range
+    for word in _WORD_RE.findall(text.lower().replace("ё", "е")):
+        features["w:" + word] += 1
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                features["c:" + padded[i:i + n]] += 1
+    return features
+
+
+class SubchapterRouter:
+    """
+    Матрица TF-IDF подглав и поиск ближайших подглав к вопросу.
+
+    Вес признака - (1 + log tf) * idf, idf = log((1 + N) / (1 + df)) + 1.
+
+    Args:
+        table: Таблица подглав: номер -> {"title", "summary", "key_points", ...}.
+    """
+    def __init__(self, table: Dict[str, Dict]) -> None:
+        self.numbers: List[str] = list(table)
+        documents = [
+            extract_features(" ".join(str(sub.get(field, "")) for field in ("title", "summary", "key_points")))
+            for sub in table.values()
+        ]
+        document_frequency: Counter = Counter()
+        for features in documents:
+            document_frequency.update(features.keys())
+        self.vocabulary: Dict[str, int] = {feature: i for i, feature in enumerate(document_frequency)}
+        total = len(documents)
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + document_frequency[feature])) + 1 for feature in self.vocabulary],
+            dtype=np.float32,
+        )
+        self.matrix = np.zeros((total, len(self.vocabulary)), dtype=np.float32)
+        for row, features in enumerate(documents):
+            columns = [self.vocabulary[feature] for feature in features]
+            self.matrix[row, columns] = 1 + np.log(np.fromiter(features.values(), dtype=np.float32, count=len(features)))
+        self.matrix *= self.idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms > 0, norms, 1)
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Косинусная близость вопроса к каждой подглаве (в порядке self.numbers).
+        Признаки вопроса, которых нет ни в одной подглаве, не учитываются.
+        """
+        features = extract_features(query)
+        known = [(self.vocabulary[feature], tf) for feature, tf in features.items() if feature in self.vocabulary]
+        if not known:
+            return np.zeros(len(self.numbers), dtype=np.float32)
+        columns = np.array([column for column, _ in known])
+        weights = (1 + np.log(np.array([tf for _, tf in known], dtype=np.float32))) * self.idf[columns]
+        norm = np.linalg.norm(weights)
+        return self.matrix[:, columns] @ (weights / norm)
+
+    def route(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Возвращает до k подглав с наибольшей близостью по убыванию.
+        """
+        scores = self.scores(query)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.numbers[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def chapter_of(subchapter_number: str) -> str:
+    """
+    Номер главы подглавы: "3.9.2" -> "3.9".
+    """
+    return subchapter_number.rsplit(".", 1)[0]
+
+
+def is_confident(ranked: List[Tuple[str, float]], min_score: float, min_margin: float) -> bool:
+    """
+    Маршрут уверенный, если лучшая подглава достаточно близка к вопросу
+    и заметно опережает вторую. Если две лучшие подглавы из одной главы,
+    отрыв не нужен: соседние подглавы одной темы близки по TF-IDF, а поиск
+    BM25 всё равно добавляет их в контекст рядом с основной.
+    """
+    if not ranked:
+        return False
+    top_number, top_score = ranked[0]
+    if top_score < min_score:
+        return False
+    if len(ranked) < 2:
+        return True
+    second_number, second_score = ranked[1]
+    return chapter_of(top_number) == chapter_of(second_number) or top_score - second_score >= min_margin
@@ -1,19 +1,41 @@
 # src/llm_search_and_answer/services.py
 
+import asyncio
 import re
+import time
 import httpx
 import json
 import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
-from openai import OpenAI
+from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel
 import instructor
 from langsmith.wrappers import wrap_openai
 from langsmith import traceable, Client
 
 from src.llm_search_and_answer.models import LLMEvaluation
-from src.llm_search_and_answer.prompts import SYSTEM_PROMPT_MENTOR_ASSESSMENT
+from src.llm_search_and_answer.prompts import (
+    SYSTEM_PROMPT_MENTOR_ASSESSMENT,
+    SYSTEM_PROMPT_PART,
+    SYSTEM_PROMPT_CHAPTER,
+    SYSTEM_PROMPT_SUBCHAPTER,
+)
 from src.gigachat_init.config import settings
+from src.llm_search_and_answer.config import settings as llm_settings
+from src.llm_search_and_answer.cache import (
+    ContextCache,
+    TokenCache,
+    EvaluationCache,
+    SingleFlight,
+    evaluation_key,
+    normalize_text,
+    split_question,
+)
+from src.llm_search_and_answer.clients import get_http_client, get_async_llm_client, auth_headers, close_clients
+from src.llm_search_and_answer.routing import SubchapterRouter, is_confident
+from src.llm_search_and_answer.packing import choose_detail, estimate_tokens, pack_blocks, required_detail
 from src.config import settings as port_settings # Общие настройки (для портов из других сервисов)
 from src.llm_search_and_answer.models import (
     BookPartReasoning,
@@ -24,16 +46,52 @@ from src.utils.logger import get_logger
 
 logger = get_logger("llm_service")
 
+async def fetch_token_data() -> Dict:
+    """
+    Запрашивает у gigachat_init токен и время его истечения.
+    """
+    url = f"http://127.0.0.1:{port_settings.gigachat_init_port}/token/token"
+    response = await get_http_client().get(url)
+    response.raise_for_status()
+    return response.json()
+
+
+# Токен GigaChat кэшируется до истечения и обновляется заранее в фоне
+token_cache = TokenCache(fetch_token_data, llm_settings.token_refresh_margin)
+
+T = TypeVar("T")
+
+
+def run_sync(coroutine: Awaitable[T]) -> T:
+    """
+    Выполняет корутину асинхронного пайплайна из синхронного кода (скрипты).
+    Общие клиенты привязаны к циклу событий, поэтому закрываются вместе с ним.
+    Нельзя вызывать из работающего цикла событий.
+    """
+    async def run() -> T:
+        try:
+            return await coroutine
+        finally:
+            await close_clients()
+
+    return asyncio.run(run())
+
+
 def get_access_token() -> str:
     """
     Делает запрос к локальному эндпоинту, чтобы получить access_token.
     Возвращает строку access_token.
+    Пока закэшированный токен не истёк, запрос не выполняется.
     """
+    cached_token = token_cache.current()
+    if cached_token is not None:
+        return cached_token
     try:
         url = f"http://127.0.0.1:{port_settings.gigachat_init_port}/token/token"
         response = httpx.get(url, verify=False)
         response.raise_for_status()
         data = response.json()
+        token_cache.set(data["access_token"], data.get("expires_at"))
         logger.debug("Токен получен успешно")
         return data["access_token"]
     except Exception as e:
@@ -226,6 +284,93 @@ def fetch_subchapter_text_original(subchapter_number: str) -> str:
         raise
 
 
+def format_subchapter_text(subchapter_number: str, data: dict, subchapter_summary: Optional[str] = None) -> str:
+    """
+    ВРЕМЕННАЯ РЕАЛИЗАЦИЯ: формирует контекст подглавы для LLM из ответа парсера,
+    используя summary подглавы вместо summary страниц.
+    Если subchapter_summary не передан, он берётся из таблицы подглав.
+    """
+    subchapter_title = data.get("subchapter_title", "Неизвестный заголовок")
+    pages = data.get("pages", [])
+
+    # Извлекаем номера страниц
+    page_numbers = [str(page.get("page_number", "")) for page in pages if page.get("page_number") is not None]
+
+    # ВРЕМЕННОЕ РЕШЕНИЕ: используем summary подглавы
+    if subchapter_summary is None:
+        subchapter_summary = get_subchapter_summary_from_knowmap(subchapter_number)
+
+    # Формируем текст в том же формате что ожидает LLM
+    formatted_text = (
+        f"Контекст: вот имя подглавы <title>{subchapter_title}</title>,\n\n"
+        f"Вот номера страницы этой подглавы <number_pages>{', '.join(page_numbers)}</number_pages>,\n\n"
+        f"Вот выжимка текста каждой страницы: \n<summary>{subchapter_summary}</summary>"
+    )
+
+    logger.debug(f"Получен контент подглавы {subchapter_number}: {len(pages)} страниц, используется summary подглавы")
+    return formatted_text
+
+
+def format_pages_text(subchapter_number: str, data: dict, field: str) -> Optional[str]:
+    """
+    Формирует контекст подглавы из страниц: field="summary" - summary каждой
+    страницы, field="content" - полный текст страниц.
+    Возвращает None, если ни у одной страницы нет этого поля.
+    """
+    pages = [page for page in data.get("pages", []) if page.get("page_number") is not None]
+    texts = [(page["page_number"], str(page.get(field) or "").strip()) for page in pages]
+    if not any(text for _, text in texts):
+        return None
+    label = "выжимка текста" if field == "summary" else "полный текст"
+    separator = "\n" if field == "summary" else "\n\n"
+    joined = separator.join(f"{number}: {text}" for number, text in texts)
+    logger.debug(f"Контекст подглавы {subchapter_number} из {len(pages)} страниц ({field})")
+    return (
+        f"Контекст: вот имя подглавы <title>{data.get('subchapter_title', 'Неизвестный заголовок')}</title>,\n\n"
+        f"Вот номера страницы этой подглавы <number_pages>{', '.join(str(number) for number, _ in texts)}</number_pages>,\n\n"
+        f"Вот {label} каждой страницы: \n<summary>{joined}</summary>"
+    )
+
+
+def context_detail(user_question: str) -> str:
+    """
+    Уровень детализации контекста для вопроса (см. packing.required_detail).
+    Без context_detail_escalation - всегда summary подглав.
+    """
+    if not llm_settings.context_detail_escalation:
+        return "summary"
+    question, _ = split_question(user_question)
+    return required_detail(question)
+
+
+def escalate_top_subchapter(
+    subchapter_numbers: List[str],
+    contents: Dict[str, dict],
+    subchapter_texts: Dict[str, str],
+    detail: str
+) -> Dict[str, str]:
+    """
+    Заменяет summary самой релевантной подглавы (первой в subchapter_numbers)
+    на summary страниц или текст страниц, если этого требует вопрос и подробный
+    текст помещается в context_token_budget вместе с остальными подглавами.
+    Остальные подглавы всегда остаются на уровне summary.
+    """
+    top = next((number for number in subchapter_numbers if number in subchapter_texts), None)
+    if top is None or detail == "summary":
+        return subchapter_texts
+    variants = {
+        "summary": subchapter_texts[top],
+        "page_summaries": format_pages_text(top, contents.get(top, {}), "summary"),
+        "pages": format_pages_text(top, contents.get(top, {}), "content"),
+    }
+    budget = llm_settings.context_token_budget
+    overhead = estimate_tokens(wrap_subchapter_block("", ""))
+    others = sum(estimate_tokens(text) + overhead for number, text in subchapter_texts.items() if number != top)
+    level = choose_detail(variants, detail, budget - others - overhead if budget > 0 else None)
+    logger.info(f"Детализация подглавы {top}: {level} (для вопроса нужна {detail})")
+    return {**subchapter_texts, top: variants[level]}
+
+
 def fetch_subchapter_text(subchapter_number: str) -> str:
     """
     ВРЕМЕННАЯ РЕАЛИЗАЦИЯ: использует summary подглавы вместо summary страниц.
@@ -234,7 +379,7 @@ def fetch_subchapter_text(subchapter_number: str) -> str:
     после реализации summary для каждой страницы.
     """
     try:
-        # 1. Получаем данные о страницах от API
+        # Получаем данные о страницах от API
         url = f"http://127.0.0.1:{port_settings.book_parser_port}/parser/subchapters/{subchapter_number}/content"
         r = httpx.get(url, verify=False)
         r.raise_for_status()
@@ -244,71 +389,122 @@ def fetch_subchapter_text(subchapter_number: str) -> str:
         if "content" in data and isinstance(data["content"], dict):
             data = data["content"]
 
-        subchapter_title = data.get("subchapter_title", "Неизвестный заголовок")
-        pages = data.get("pages", [])
-
-        # 2. Извлекаем номера страниц
-        page_numbers = [str(page.get("page_number", "")) for page in pages if page.get("page_number") is not None]
-
-        # 3. ВРЕМЕННОЕ РЕШЕНИЕ: используем summary подглавы
-        subchapter_summary = get_subchapter_summary_from_knowmap(subchapter_number)
-
-        # 4. Формируем текст в том же формате что ожидает LLM
-        formatted_text = (
-            f"Контекст: вот имя подглавы <title>{subchapter_title}</title>,\n\n"
-            f"Вот номера страницы этой подглавы <number_pages>{', '.join(page_numbers)}</number_pages>,\n\n"
-            f"Вот выжимка текста каждой страницы: \n<summary>{subchapter_summary}</summary>"
-        )
-
-        logger.debug(f"Получен контент подглавы {subchapter_number}: {len(pages)} страниц, используется summary подглавы")
-        return formatted_text
+        return format_subchapter_text(subchapter_number, data)
         
     except Exception as e:
         logger.error(f"fetch_subchapter_text: {e}")
         raise
 
 
+# Кэш собранного контекста подглав: контекст одинаков для всех вопросов,
+# пока не изменились набор подглав или версия книги
+context_cache = ContextCache(llm_settings.context_cache_size)
+_book_version: Optional[str] = None
+_book_version_checked_at: float = 0.0
+
+
+def retrieval_query(user_question: str) -> str:
+    """
+    Текст для поиска подглав: вопрос и ответ пользователя без служебных фраз запроса.
+    """
+    question, answer = split_question(user_question)
+    return f"{question.strip()} {answer.strip()}".strip()
+
+
+def merge_selection(primary: Optional[str], results: List[Dict]) -> List[str]:
+    """
+    Подглавы для контекста: основная подглава маршрутизации, затем подглавы
+    из ответа /parser/search, всего не больше retrieval_top_k. Если ничего
+    не выбрано, используется фиксированный список available_subchapters.
+    """
+    numbers = [item["subchapter_number"] for item in results]
+    if primary is not None:
+        numbers = [primary] + [number for number in numbers if number != primary]
+    return numbers[:llm_settings.retrieval_top_k] or list(port_settings.available_subchapters)
+
+
+def wrap_subchapter_block(subchapter_number: str, content: str) -> str:
+    """
+    Обрамляет текст подглавы идентификатором для удобства в финальном контенте.
+    """
+    return f"<content_subchapter id='{subchapter_number}'>\n{content}\n</content_subchapter>"
+
+
+def assemble_subchapters_context(subchapter_numbers: List[str], subchapter_texts: Dict[str, str]) -> Tuple[str, bool]:
+    """
+    Объединяет тексты подглав в блок <content_subchapter> в порядке subchapter_numbers.
+
+    Порядок подглав - порядок релевантности (основная подглава, затем результаты
+    поиска), поэтому при превышении бюджета context_token_budget обрезаются
+    и отбрасываются последние подглавы.
+
+    Returns:
+        Tuple[str, bool]: Собранный контекст и признак того, что есть тексты всех подглав.
+    """
+    blocks = []
+    for subchapter in subchapter_numbers:
+        content = subchapter_texts.get(subchapter)
+        if content is None:
+            logger.error(f"Нет текста для подглавы {subchapter}")
+            continue
+        blocks.append((subchapter, content))
+
+    overhead = estimate_tokens(wrap_subchapter_block("", ""))
+    packed = pack_blocks(blocks, llm_settings.context_token_budget, overhead)
+    logger.info(
+        f"Контекст: {packed.packed_tokens} токенов из бюджета {llm_settings.context_token_budget}, "
+        f"отброшено {packed.dropped_tokens} токенов "
+        f"(обрезаны подглавы: {packed.truncated}, отброшены: {packed.dropped})"
+    )
+
+    # Объединяем все тексты в один итоговый контент
+    combined_content = "\n".join(wrap_subchapter_block(number, content) for number, content in packed.blocks)
+    logger.debug(f"Собран контент из {len(packed.blocks)} подглав")
+    return combined_content, len(blocks) == len(subchapter_numbers)
+
+
+# Таблица подглав книги: номер подглавы -> заголовок, summary, номера страниц.
+# Загружается из /parser/subchapters и заменяется целиком при смене версии книги,
+# поэтому поиск summary - обращение к словарю без чтения файлов.
+_subchapter_table: Dict[str, Dict] = {}
+_subchapter_table_version: Optional[str] = None
+
+
+def fetch_subchapter_table() -> Dict[str, Dict]:
+    """
+    Возвращает таблицу подглав книги из /parser/subchapters
+    (синхронная обёртка afetch_subchapter_table для скриптов).
+
+    Таблица перезагружается, только если изменилась версия книги
+    (см. afetch_book_version). При недоступности парсера возвращается
+    последняя загруженная таблица.
+    """
+    async def load() -> Dict[str, Dict]:
+        return await afetch_subchapter_table(await afetch_book_version())
+
+    return run_sync(load())
+
+
+def summary_from_table(table: Dict[str, Dict], subchapter_number: str) -> str:
+    """
+    Возвращает summary подглавы из таблицы подглав или текст-заглушку, если его нет.
+    """
+    subchapter = table.get(str(subchapter_number))
+    summary = subchapter.get("summary") if subchapter else None
+    if summary:
+        return summary
+    logger.warning(f"Summary для подглавы {subchapter_number} не найден")
+    return f"Краткое описание для подглавы {subchapter_number} недоступно"
+
+
 def get_subchapter_summary_from_knowmap(subchapter_number: str) -> str:
     """
-    ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: получает summary подглавы из know_map_data.
+    ВСПОМОГАТЕЛЬНАЯ ФУНКЦИЯ: получает summary подглавы из таблицы подглав книги.
     
     Будет удалена после реализации summary для страниц.
     """
     try:
-        from src.book_parser.services import load_json
-        from src.book_parser.config import settings as book_settings
-        from pathlib import Path
-        
-        know_map_path = Path(book_settings.know_map_path)
-        know_map_data = load_json(know_map_path)
-        
-        def find_subchapter_summary(obj):
-            """Рекурсивно ищет подглаву по номеру и возвращает её summary."""
-            if isinstance(obj, dict):
-                if str(obj.get("subchapter_number")) == str(subchapter_number):
-                    summary = obj.get("summary", "")
-                    return summary
-                
-                for value in obj.values():
-                    result = find_subchapter_summary(value)
-                    if result:
-                        return result
-                        
-            elif isinstance(obj, list):
-                for item in obj:
-                    result = find_subchapter_summary(item)
-                    if result:
-                        return result
-            
-            return None
-        
-        summary = find_subchapter_summary(know_map_data)
-        if summary:
-            return summary
-        else:
-            logger.warning(f"Summary для подглавы {subchapter_number} не найден")
-            return f"Краткое описание для подглавы {subchapter_number} недоступно"
-            
+        return summary_from_table(fetch_subchapter_table(), subchapter_number)
     except Exception as e:
         logger.error(f"Ошибка получения summary для подглавы {subchapter_number}: {e}")
         return f"Ошибка получения краткого описания: {str(e)}"
@@ -384,6 +580,68 @@ def robust_json_parse(model: BaseModel, text: str) -> BaseModel:
 # --------------------------------------------------------------------
 # 5. Функции для взаимодействия с LLM на каждом шаге
 # --------------------------------------------------------------------
+def book_part_messages(system_prompt: str, content_parts: str, question_user: str) -> List[Dict[str, str]]:
+    """
+    Сообщения запроса к LLM для шага 1 (выбор части книги).
+    """
+    return [
+        {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
+        {"role": "user", "content": (
+            f"Описания частей книги: {content_parts}\n"
+            f"Вопрос пользователя: {question_user}"
+            """
+                    \nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
+                    {
+                        "initial_analysis": "...",
+                        "chapter_comparison": "...",
+                        "final_answer": "...",
+                        "selected_part": 2
+                    }
+                    """
+        )}
+    ]
+
+
+def chapter_messages(system_prompt: str, chapters_content: str, question_user: str) -> List[Dict[str, str]]:
+    """
+    Сообщения запроса к LLM для шага 2 (выбор главы).
+    """
+    return [
+        {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
+        {"role": "user", "content": (
+            f"Описания глав (part): {chapters_content}\n"
+            f"Вопрос пользователя: {question_user}"
+            """\nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
+                {
+                    "preliminary_analysis": "...",
+                    "chapter_analysis": "...",
+                    "final_reasoning": "...",
+                    "selected_chapter": 4
+                }"""
+        )}
+    ]
+
+
+def subchapter_messages(system_prompt: str, subchapters_content: str, question_user: str) -> List[Dict[str, str]]:
+    """
+    Сообщения запроса к LLM для шага 3 (выбор подглавы).
+    """
+    return [
+        {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
+        {"role": "user", "content": (
+            f"Описания подглав (chapter): {subchapters_content}\n"
+            f"Вопрос пользователя: {question_user}"
+            """\nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
+                {
+                    "preliminary_analysis": "...",
+                    "subchapter_analysis": "...",
+                    "final_reasoning": "...",
+                    "selected_subchapter": "3.2"
+                }"""
+        )}
+    ]
+
+
 def get_book_part_reasoning(
     client,
     system_prompt: str,
@@ -399,22 +657,7 @@ def get_book_part_reasoning(
             model="GigaChat-Max",
             response_model=BookPartReasoning,
             temperature=0,
-            messages=[
-                {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
-                {"role": "user", "content": (
-                    f"Описания частей книги: {content_parts}\n"
-                    f"Вопрос пользователя: {question_user}"
-                    """
-                    \nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
-                    {
-                        "initial_analysis": "...",
-                        "chapter_comparison": "...",
-                        "final_answer": "...",
-                        "selected_part": 2
-                    }
-                    """
-                )}
-            ],
+            messages=book_part_messages(system_prompt, content_parts, question_user),
         )
         return response
     except Exception as e:
@@ -434,20 +677,7 @@ def get_chapter_reasoning(
         model="GigaChat-Max",
         response_model=ChapterReasoning,
         temperature=0,
-        messages=[
-            {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
-            {"role": "user", "content": (
-                f"Описания глав (part): {chapters_content}\n"
-                f"Вопрос пользователя: {question_user}"
-                """\nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
-                {
-                    "preliminary_analysis": "...",
-                    "chapter_analysis": "...",
-                    "final_reasoning": "...",
-                    "selected_chapter": 4
-                }"""
-            )}
-        ],
+        messages=chapter_messages(system_prompt, chapters_content, question_user),
     )
     return response
 
@@ -464,23 +694,54 @@ def get_subchapter_reasoning(
         model="GigaChat-Max",
         response_model=SubchapterReasoning,
         temperature=0,
-        messages=[
-            {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
-            {"role": "user", "content": (
-                f"Описания подглав (chapter): {subchapters_content}\n"
-                f"Вопрос пользователя: {question_user}"
-                """\nНАПОМИНАЮ pydantic СХЕМУ ОТВЕТА:
-                {
-                    "preliminary_analysis": "...",
-                    "subchapter_analysis": "...",
-                    "final_reasoning": "...",
-                    "selected_subchapter": "3.2"
-                }"""
-            )}
-        ],
+        messages=subchapter_messages(system_prompt, subchapters_content, question_user),
     )
     return response
 
+# --------------------------------------------------------------------
+# Маршрутизация вопроса к основной подглаве
+# --------------------------------------------------------------------
+# Основная подглава выбирается по матрице TF-IDF подглав (src.llm_search_and_answer.routing)
+# без обращения к LLM. Только если маршрут неуверенный, подглаву выбирает LLM
+# за три запроса (шаги 1-3, aroute_subchapter_with_llm); выбор LLM кэшируется по вопросу и версии книги.
+
+_router: Optional[SubchapterRouter] = None
+_router_table: Optional[Dict[str, Dict]] = None
+llm_route_cache = ContextCache(llm_settings.context_cache_size)
+
+
+def get_subchapter_router(table: Dict[str, Dict]) -> Optional[SubchapterRouter]:
+    """
+    Возвращает маршрутизатор для таблицы подглав. Матрица строится заново,
+    только когда таблица подглав перезагружена (сменилась версия книги).
+    """
+    global _router, _router_table
+    if not table:
+        return None
+    if _router is None or _router_table is not table:
+        _router, _router_table = SubchapterRouter(table), table
+        logger.info(f"Построена матрица TF-IDF: {_router.matrix.shape[0]} подглав, {_router.matrix.shape[1]} признаков")
+    return _router
+
+
+def decide_route(router: Optional[SubchapterRouter], user_question: str) -> Tuple[Optional[str], bool]:
+    """
+    Маршрут по TF-IDF.
+
+    Returns:
+        Tuple[Optional[str], bool]: Лучшая подглава (None, если совпадений нет)
+        и признак, что маршрут уверенный.
+    """
+    if router is None:
+        return None, False
+    ranked = router.route(retrieval_query(user_question), 2)
+    confident = is_confident(ranked, llm_settings.router_min_score, llm_settings.router_min_margin)
+    best = ranked[0][0] if ranked else None
+    scores = ", ".join(f"{number}: {score:.3f}" for number, score in ranked)
+    logger.info(f"Маршрут TF-IDF ({'уверенный' if confident else 'неуверенный'}): {scores or 'нет совпадений'}")
+    return best, confident
+
+
 @traceable(client=ls_client, project_name="llamaindex_test", run_type = "retriever")
 def get_final_answer(
     client,
@@ -493,64 +754,421 @@ def get_final_answer(
     """
     try:
         response = client.chat.completions.create(
-            model="GigaChat-2-Max",
+            model=FINAL_ANSWER_MODEL,
             response_model=LLMEvaluation,  # ← Используем новую модель
             temperature=0.2,
-            messages=[
-                {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
-                {"role": "user", "content": (
-                    f"Финальный контент (извлечённый из страниц): <content_book>{final_content}</content_book>\n"
-                    f"Вопрос к пользователю: {question_user}\n"
-                    "Ответь согласно ИНСТРУКЦИИ в формате JSON:"
-                )}
-            ],
+            messages=final_answer_messages(system_prompt, final_content, question_user),
         )
-        
-        # Форматируем ответ: оценка в начале, потом обоснование
-        formatted_response = f"ИТОГОВАЯ ОЦЕНКА: {response.evaluation}\n\n{response.analysis_text}"
-        logger.info(f"Получен финальный ответ: {response.evaluation}")
-        return formatted_response
+        return format_evaluation(response)
         
     except Exception as e:
         logger.error(f"Ошибка при получении финального ответа: {e}")
         # Возвращаем базовый ответ в случае ошибки
-        return f"ИТОГОВАЯ ОЦЕНКА: НЕВЕРНО\n\nПроизошла ошибка при анализе ответа. Обратитесь к куратору."
+        return FALLBACK_FINAL_ANSWER
+
+
+# Модель, которая оценивает ответ на шаге 4
+FINAL_ANSWER_MODEL = "GigaChat-2-Max"
+
+# Ответ, который возвращается, если LLM не смогла оценить ответ
+FALLBACK_FINAL_ANSWER = "ИТОГОВАЯ ОЦЕНКА: НЕВЕРНО\n\nПроизошла ошибка при анализе ответа. Обратитесь к куратору."
+
+
+def final_answer_messages(system_prompt: str, final_content: str, question_user: str) -> List[Dict[str, str]]:
+    """
+    Сообщения запроса к LLM для шага 4 (оценка ответа по контенту книги).
+    """
+    return [
+        {"role": "system", "content": f"ИНСТРУКЦИИ: {system_prompt}"},
+        {"role": "user", "content": (
+            f"Финальный контент (извлечённый из страниц): <content_book>{final_content}</content_book>\n"
+            f"Вопрос к пользователю: {question_user}\n"
+            "Ответь согласно ИНСТРУКЦИИ в формате JSON:"
+        )}
+    ]
+
+
+def format_evaluation(response: LLMEvaluation) -> str:
+    """
+    Форматирует оценку LLM: оценка в начале, потом обоснование.
+    """
+    logger.info(f"Получен финальный ответ: {response.evaluation}")
+    return f"ИТОГОВАЯ ОЦЕНКА: {response.evaluation}\n\n{response.analysis_text}"
+
+
+_evaluation_cache: Optional[EvaluationCache] = None
+
+
+def get_evaluation_cache() -> Optional[EvaluationCache]:
+    """
+    Возвращает кэш оценок по настройкам или None, если кэш отключён.
+    Кэш открывается один раз и пересоздаётся при смене файла.
+    """
+    global _evaluation_cache
+    if llm_settings.evaluation_cache_size <= 0:
+        return None
+    path = Path(llm_settings.evaluation_cache_db) if llm_settings.evaluation_cache_db else None
+    if _evaluation_cache is None or _evaluation_cache.path != path:
+        if _evaluation_cache is not None:
+            _evaluation_cache.close()
+        _evaluation_cache = EvaluationCache(path, llm_settings.evaluation_cache_size)
+    return _evaluation_cache
+
+
+def close_evaluation_cache() -> None:
+    global _evaluation_cache
+    if _evaluation_cache is not None:
+        _evaluation_cache.close()
+        _evaluation_cache = None
+
+
+async def alookup_evaluation(system_prompt: str, final_content: str, question_user: str) -> Tuple[str, Optional[str]]:
+    """
+    Ищет готовую оценку ответа в кэше оценок. Оценка из памяти возвращается
+    сразу, чтение SQLite выполняется в потоке, не блокируя цикл событий.
+
+    Returns:
+        Tuple[str, Optional[str]]: Ключ оценки и оценка из кэша
+        (None при промахе или отключённом кэше).
+    """
+    key = evaluation_key(question_user, system_prompt, FINAL_ANSWER_MODEL, final_content)
+    cache = get_evaluation_cache()
+    if cache is None:
+        return key, None
+    answer = cache.get_from_memory(key)
+    if answer is None:
+        answer = await asyncio.to_thread(cache.get, key)
+    if answer is not None:
+        logger.info("Оценка взята из кэша оценок")
+    return key, answer
+
+
+async def astore_evaluation(key: Optional[str], answer: str) -> None:
+    """
+    Сохраняет оценку в кэш оценок (запись в SQLite - в потоке).
+    Ответ-заглушка после ошибки LLM не кэшируется.
+    """
+    cache = get_evaluation_cache()
+    if cache is None or key is None or answer == FALLBACK_FINAL_ANSWER:
+        return
+    await asyncio.to_thread(cache.put, key, answer)
 
 # --------------------------------------------------------------------
 # 6. Пример комплексной функции (все 4 шага) — опционально
 # --------------------------------------------------------------------
 def run_full_reasoning_pipeline(user_question: str) -> dict:
-    logger.info("Запуск LLM пайплайна")
+    """
+    Синхронная обёртка arun_full_reasoning_pipeline для скриптов.
+    """
+    return run_sync(arun_full_reasoning_pipeline(user_question))
 
-    # Получаем список подглав из конфигурации
-    available_subchapters = port_settings.available_subchapters
-    logger.info(f"Используем подглавы из конфига: {available_subchapters}")
 
-    # Создаем LLM-клиент для финального ответа
-    client_openai = create_llm_client()
+# --------------------------------------------------------------------
+# 7. Асинхронный пайплайн
+# --------------------------------------------------------------------
+# Используется эндпоинтом /llm/full-reasoning: запросы к book_parser,
+# gigachat_init и GigaChat идут через общие долгоживущие клиенты
+# (src.llm_search_and_answer.clients), поэтому один воркер обслуживает
+# много одновременных оценок, не занимая потоки threadpool.
+# Скрипты вызывают этот же пайплайн через run_sync (run_full_reasoning_pipeline).
 
-    # Получаем тексты для всех подглав и объединяем их
-    final_contents = []
-    for subchapter in available_subchapters:
-        try:
-            content = fetch_subchapter_text(subchapter)
-            # Обрамляем текст подглавы идентификатором для удобства в финальном контенте
-            final_contents.append(f"<content_subchapter id='{subchapter}'>\n{content}\n</content_subchapter>")
-            logger.debug(f"Обработана подглава {subchapter}")
-        except Exception as e:
-            logger.error(f"Ошибка получения текста для подглавы {subchapter}: {e}")
+async def aget_access_token() -> str:
+    """
+    Асинхронно получает access_token: из кэша или, если он истёк, от gigachat_init.
+    """
+    try:
+        return await token_cache.get()
+    except Exception as e:
+        logger.error(f"Ошибка при получении access_token: {e}")
+        raise
 
-    # Объединяем все тексты в один итоговый контент
-    combined_final_content = "\n".join(final_contents)
-    logger.debug(f"Собран контент из {len(final_contents)} подглав")
-    
-    # Формируем финальный ответ, используя объединенный контент и вопрос пользователя
-    final_answer_text = get_final_answer(
-        client_openai,
-        SYSTEM_PROMPT_MENTOR_ASSESSMENT,
-        combined_final_content,
-        user_question
-    )
+
+async def acall_with_token(call: Callable[[str], Awaitable[T]]) -> T:
+    """
+    Выполняет запрос к GigaChat с токеном из кэша.
+    Если GigaChat отклонил токен (401), токен сбрасывается и запрос
+    повторяется один раз с новым токеном.
+    """
+    token = await aget_access_token()
+    try:
+        return await call(token)
+    except AuthenticationError:
+        logger.warning("GigaChat отклонил токен (401), запрашиваем новый и повторяем запрос")
+        token_cache.invalidate(token)
+        return await call(await aget_access_token())
+
+
+async def afetch_book_version() -> Optional[str]:
+    """
+    Возвращает версию индекса книги из /parser/version.
+    Версия перепроверяется не чаще раза в context_cache_ttl секунд.
+    При недоступности парсера возвращает None.
+    """
+    global _book_version, _book_version_checked_at
+    now = time.monotonic()
+    if _book_version is not None and now - _book_version_checked_at < llm_settings.context_cache_ttl:
+        return _book_version
+    try:
+        url = f"http://127.0.0.1:{port_settings.book_parser_port}/parser/version"
+        r = await get_http_client().get(url)
+        r.raise_for_status()
+        _book_version, _book_version_checked_at = r.json()["version"], now
+        return _book_version
+    except Exception as e:
+        logger.warning(f"Не удалось получить версию книги: {e}")
+        return None
+
+
+async def afetch_subchapter_table(version: Optional[str]) -> Dict[str, Dict]:
+    """
+    Возвращает таблицу подглав книги из /parser/subchapters для версии книги version.
+
+    Таблица перезагружается, только если изменилась версия книги.
+    При недоступности парсера возвращается последняя загруженная таблица.
+    """
+    global _subchapter_table, _subchapter_table_version
+    if _subchapter_table and (version is None or version == _subchapter_table_version):
+        return _subchapter_table
+    try:
+        url = f"http://127.0.0.1:{port_settings.book_parser_port}/parser/subchapters"
+        r = await get_http_client().get(url)
+        r.raise_for_status()
+        _subchapter_table = r.json().get("subchapters", {})
+        _subchapter_table_version = version
+        logger.info(f"Загружена таблица из {len(_subchapter_table)} подглав (версия книги {version})")
+    except Exception as e:
+        logger.error(f"Не удалось загрузить таблицу подглав: {e}")
+    return _subchapter_table
+
+
+async def afetch_parser_text(path: str) -> str:
+    """
+    Асинхронно запрашивает у book_parser описания частей, глав или подглав
+    (тот же ответ, что у fetch_content_parts и соседних функций).
+    """
+    r = await get_http_client().get(f"http://127.0.0.1:{port_settings.book_parser_port}/parser/{path}")
+    r.raise_for_status()
+    return r.text
+
+
+async def areason(client, response_model: Type[BaseModel], messages: List[Dict[str, str]]) -> BaseModel:
+    """
+    Запрос рассуждения (шаги 1-3) к GigaChat-Max через общий асинхронный клиент.
+    """
+    return await acall_with_token(lambda token: client.chat.completions.create(
+        model="GigaChat-Max",
+        response_model=response_model,
+        temperature=0,
+        messages=messages,
+        extra_headers=auth_headers(token),
+    ))
+
+
+async def aroute_subchapter_with_llm(user_question: str) -> Optional[str]:
+    """
+    Выбирает подглаву с помощью LLM: часть книги, глава, подглава.
+    Запросы идут через общий клиент GigaChat, токен - из кэша с повтором при 401.
+    Возвращает None, если выбор не удался.
+    """
+    try:
+        client = get_async_llm_client()
+        part = (await areason(
+            client, BookPartReasoning,
+            book_part_messages(SYSTEM_PROMPT_PART, await afetch_parser_text("parts"), user_question),
+        )).selected_part
+        chapter = (await areason(
+            client, ChapterReasoning,
+            chapter_messages(SYSTEM_PROMPT_CHAPTER, await afetch_parser_text(f"parts/{part}/chapters"), user_question),
+        )).selected_chapter
+        subchapters_content = await afetch_parser_text(f"parts/{part}/chapters/{chapter}/subchapters")
+        return (await areason(
+            client, SubchapterReasoning,
+            subchapter_messages(SYSTEM_PROMPT_SUBCHAPTER, subchapters_content, user_question),
+        )).selected_subchapter
+    except Exception as e:
+        logger.error(f"Ошибка выбора подглавы с помощью LLM: {e}")
+        return None
+
+
+async def aroute_subchapter(user_question: str) -> Optional[str]:
+    """
+    Выбирает основную подглаву для вопроса: по TF-IDF, а при неуверенном
+    маршруте - с помощью LLM (aroute_subchapter_with_llm, если включён
+    router_llm_fallback). Матрица строится в потоке, не блокируя цикл событий.
+    """
+    version = await afetch_book_version()
+    table = await afetch_subchapter_table(version)
+    router = _router if table and _router_table is table else await asyncio.to_thread(get_subchapter_router, table)
+    best, confident = decide_route(router, user_question)
+    if confident or router is None or not llm_settings.router_llm_fallback:
+        return best
+    key = normalize_text(retrieval_query(user_question))
+    routed = llm_route_cache.get(key, version or "")
+    if routed is None:
+        routed = await aroute_subchapter_with_llm(user_question)
+        if routed is not None:
+            llm_route_cache.put(key, version or "", routed)
+    return routed or best
+
+
+async def aselect_subchapters(user_question: str) -> List[str]:
+    """
+    Выбирает подглавы для вопроса: основную - маршрутизацией (aroute_subchapter),
+    остальные - поиском BM25 в book_parser (/parser/search).
+    Если поиск отключён (retrieval_top_k = 0), ничего не нашёл или недоступен,
+    используется фиксированный список available_subchapters.
+    """
+    if llm_settings.retrieval_top_k <= 0:
+        return list(port_settings.available_subchapters)
+    primary = await aroute_subchapter(user_question)
+    try:
+        url = f"http://127.0.0.1:{port_settings.book_parser_port}/parser/search"
+        r = await get_http_client().get(url, params={"query": retrieval_query(user_question), "k": llm_settings.retrieval_top_k})
+        r.raise_for_status()
+        results = r.json().get("results", [])
+    except Exception as e:
+        logger.warning(f"Поиск подглав недоступен: {e}")
+        results = []
+    return merge_selection(primary, results)
+
+
+async def afetch_subchapters_texts(
+    subchapter_numbers: List[str],
+    version: Optional[str] = None,
+    detail: str = "summary"
+) -> Dict[str, str]:
+    """
+    Получает контекст сразу для нескольких подглав одним запросом
+    к /parser/subchapters/content. Самая релевантная подглава может быть
+    подробнее summary, если этого требует detail (см. escalate_top_subchapter).
+
+    Returns:
+        Dict[str, str]: Текст подглавы для LLM по номеру подглавы, в порядке запроса.
+    """
+    try:
+        url = f"http://127.0.0.1:{port_settings.book_parser_port}/parser/subchapters/content"
+        r = await get_http_client().post(url, json={"subchapter_numbers": list(subchapter_numbers)})
+        r.raise_for_status()
+        contents = r.json().get("contents", {})
+        table = await afetch_subchapter_table(version)
+        logger.debug(f"Получен контент {len(contents)} подглав одним запросом")
+        texts = {
+            number: format_subchapter_text(number, data, summary_from_table(table, number))
+            for number, data in contents.items()
+        }
+        return escalate_top_subchapter(subchapter_numbers, contents, texts, detail)
+    except Exception as e:
+        logger.error(f"afetch_subchapters_texts: {e}")
+        raise
+
+
+async def abuild_subchapters_context(subchapter_numbers: List[str], detail: str = "summary") -> str:
+    """
+    Собирает общий блок контекста <content_subchapter> для набора подглав.
+
+    detail - нужный вопросу уровень детализации самой релевантной подглавы
+    (см. context_detail), остальные подглавы берутся на уровне summary.
+
+    Готовый блок кэшируется по набору подглав, детализации и версии книги,
+    поэтому повторные вопросы по тем же подглавам не обращаются к парсеру.
+    В кэш попадает только контекст, собранный по всем подглавам без ошибок.
+    """
+    key = (tuple(subchapter_numbers), detail)
+    version = await afetch_book_version()
+    if version is not None:
+        cached = context_cache.get(key, version)
+        if cached is not None:
+            logger.debug(f"Контекст {len(subchapter_numbers)} подглав взят из кэша (версия книги {version})")
+            return cached
+
+    try:
+        subchapter_texts = await afetch_subchapters_texts(subchapter_numbers, version, detail)
+    except Exception as e:
+        logger.error(f"Ошибка получения текстов подглав {subchapter_numbers}: {e}")
+        subchapter_texts = {}
+    combined_content, complete = assemble_subchapters_context(subchapter_numbers, subchapter_texts)
+
+    if version is not None and complete:
+        context_cache.put(key, version, combined_content)
+    return combined_content
+
+
+@traceable(client=ls_client, project_name="llamaindex_test", run_type = "retriever")
+async def aget_final_answer(
+    client,
+    system_prompt: str,
+    final_content: str,
+    question_user: str
+) -> str:
+    """
+    Шаг 4 (асинхронно): оценка ответа по финальному контенту.
+    Токен передаётся в заголовке запроса, клиент общий для всех запросов.
+    """
+    messages = final_answer_messages(system_prompt, final_content, question_user)
+    try:
+        response = await acall_with_token(lambda token: client.chat.completions.create(
+            model=FINAL_ANSWER_MODEL,
+            response_model=LLMEvaluation,
+            temperature=0.2,
+            messages=messages,
+            extra_headers=auth_headers(token),
+        ))
+        return format_evaluation(response)
+    except Exception as e:
+        logger.error(f"Ошибка при получении финального ответа: {e}")
+        return FALLBACK_FINAL_ANSWER
+
+
+# Одинаковые одновременные оценки (повтор вебхука, гонка /sheets/process-form)
+# ждут один запрос к GigaChat
+evaluation_flights = SingleFlight()
+
+
+async def acoalesced_final_answer(
+    key: str,
+    client,
+    system_prompt: str,
+    final_content: str,
+    question_user: str,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> str:
+    """
+    Оценивает ответ через aget_final_answer и сохраняет оценку в кэш оценок.
+    Одновременные запросы с тем же ключом оценки ждут один запрос к модели.
+    """
+    async def evaluate() -> str:
+        if semaphore is None:
+            answer = await aget_final_answer(client, system_prompt, final_content, question_user)
+        else:
+            async with semaphore:
+                answer = await aget_final_answer(client, system_prompt, final_content, question_user)
+        await astore_evaluation(key, answer)
+        return answer
+
+    return await evaluation_flights.do(key, evaluate)
+
+
+async def arun_full_reasoning_pipeline(user_question: str) -> dict:
+    """
+    Выбирает подглавы, собирает контекст и оценивает ответ пользователя.
+    Оценка берётся из кэша оценок, если такой же ответ уже оценивался с тем же контекстом.
+    """
+    logger.info("Запуск LLM пайплайна")
+
+    available_subchapters = await aselect_subchapters(user_question)
+    logger.info(f"Выбраны подглавы: {available_subchapters}")
+
+    combined_final_content = await abuild_subchapters_context(available_subchapters, context_detail(user_question))
+
+    cache_key, final_answer_text = await alookup_evaluation(SYSTEM_PROMPT_MENTOR_ASSESSMENT, combined_final_content, user_question)
+    if final_answer_text is None:
+        final_answer_text = await acoalesced_final_answer(
+            cache_key,
+            get_async_llm_client(),
+            SYSTEM_PROMPT_MENTOR_ASSESSMENT,
+            combined_final_content,
+            user_question
+        )
 
     logger.info("LLM пайплайн завершен")
     return {
@@ -559,5 +1177,66 @@ def run_full_reasoning_pipeline(user_question: str) -> dict:
         "final_answer": final_answer_text
     }
     
+
+async def arun_batch_reasoning_pipeline(user_questions: List[str]) -> List[str]:
+    """
+    Оценивает несколько вопросов за один вызов.
+
+    Подглавы выбираются для каждого вопроса, контекст собирается один раз
+    на каждый различный набор подглав и детализации, токен и LLM-клиент общие для всех
+    вопросов. Вопросы с оценкой в кэше оценок к модели не отправляются.
+    Одновременно выполняется не больше batch_concurrency запросов - как
+    выборов подглав (маршрутизация может обращаться к LLM) и сборок
+    контекста, так и оценок.
+
+    Returns:
+        List[str]: Итоговые ответы в порядке вопросов.
+    """
+    logger.info(f"Запуск пакетного LLM пайплайна: {len(user_questions)} вопросов")
+
+    semaphore = asyncio.Semaphore(llm_settings.batch_concurrency)
+
+    async def select(question: str) -> List[str]:
+        async with semaphore:
+            return await aselect_subchapters(question)
+
+    selections = await asyncio.gather(*(select(question) for question in user_questions))
+    context_keys = [
+        (tuple(subchapters), context_detail(question))
+        for question, subchapters in zip(user_questions, selections)
+    ]
+    distinct_keys = list(dict.fromkeys(context_keys))
+
+    async def build(subchapters: Tuple[str, ...], detail: str) -> str:
+        async with semaphore:
+            return await abuild_subchapters_context(list(subchapters), detail)
+
+    # Контексты различных наборов подглав собираются параллельно
+    built = await asyncio.gather(*(build(subchapters, detail) for subchapters, detail in distinct_keys))
+    contexts = dict(zip(distinct_keys, built))
+    final_contents = [contexts[key] for key in context_keys]
+    lookups = await asyncio.gather(*(
+        alookup_evaluation(SYSTEM_PROMPT_MENTOR_ASSESSMENT, final_content, question)
+        for question, final_content in zip(user_questions, final_contents)
+    ))
+    misses = [i for i, (_, cached) in enumerate(lookups) if cached is None]
+    logger.info(f"Оценки из кэша: {len(user_questions) - len(misses)}, к модели: {len(misses)}")
+    if misses:
+        # Получаем токен заранее, чтобы параллельные запросы взяли его из кэша
+        await aget_access_token()
+    client = get_async_llm_client()
+
+    async def answer(i: int) -> str:
+        # Одинаковые вопросы пакета (и других запросов) оцениваются одним запросом к модели
+        return await acoalesced_final_answer(
+            lookups[i][0], client, SYSTEM_PROMPT_MENTOR_ASSESSMENT, final_contents[i], user_questions[i], semaphore
+        )
+
+    answers = [cached for _, cached in lookups]
+    for i, result in zip(misses, await asyncio.gather(*(answer(i) for i in misses))):
+        answers[i] = result
+    logger.info("Пакетный LLM пайплайн завершен")
+    return answers
+
 if __name__ == "__main__":
     run_full_reasoning_pipeline("вопрос: Почему отслеживание работает - назовите 4 урока о которых говорит автор. Ответ: Урок первый : не каждый реагирует на процесс обучения или не так как хотелось бы организации. Урок 2; между пониманием и действием дистанция огромного размера. Урок 3: люди не становятся лучше без отслеживания")
\ No newline at end of file
@@ -26,4 +26,60 @@ def test_get_content():
     """Проверка доступности эндпоинта получения содержимого"""
     response = client.get("/parser/subchapters/1.1.1/content")
     assert response.status_code == 200
-    assert "content" in response.json()
\ No newline at end of file
+    assert "content" in response.json()
+
+def test_admin_reload():
+    """Проверка принудительной перезагрузки индекса книги"""
+    response = client.post("/parser/admin/reload")
+    assert response.status_code == 200
+    assert response.json()["reloaded"] is True
+
+
+def test_book_routes():
+    """Проверка маршрутов с идентификатором книги"""
+    response = client.get("/parser/goldsmith/parts")
+    assert response.status_code == 200
+    assert "parts" in response.json()
+
+    response = client.get("/parser/unknown-book/parts")
+    assert response.status_code == 404
+
+
+def test_get_contents_batch():
+    """Проверка пакетного получения содержимого подглав"""
+    response = client.post("/parser/subchapters/content", json={"subchapter_numbers": ["1.1.1", "1.2.1"]})
+    assert response.status_code == 200
+    assert list(response.json()["contents"]) == ["1.1.1", "1.2.1"]
+
+
+def test_get_version():
+    """Проверка получения версии индекса книги"""
+    response = client.get("/parser/version")
+    assert response.status_code == 200
+    assert response.json()["version"]
+
+
+def test_get_subchapter_table():
+    """Проверка таблицы подглав книги"""
+    response = client.get("/parser/subchapters")
+    assert response.status_code == 200
+    subchapter = response.json()["subchapters"]["1.1.1"]
+    assert subchapter["summary"]
+    assert subchapter["pages"]
+
+
+def test_health():
+    """Проверка лёгкого эндпоинта работоспособности"""
+    response = client.get("/parser/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+
+def test_search_subchapters():
+    """Поиск подглав по тексту вопроса"""
+    response = client.get("/parser/search", params={"query": "Почему отслеживание работает", "k": 3})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 3
+    assert results[0]["subchapter_number"] == "3.11.2"
+    assert results[0]["score"] >= results[1]["score"]
@@ -0,0 +1,64 @@
+import pytest
+from src.book_parser.index import BookIndex, normalize_page_number, normalize_page_numbers
+from src.book_parser.parsers.page_content_parser import PageContentParser
+
+
+@pytest.fixture
+def book_index():
+    """Индекс с номерами страниц в разных форматах, как в реальных файлах"""
+    know_map_data = {
+        "content": {
+            "parts": [
+                {
+                    "part_number": 1,
+                    "chapters": [
+                        {
+                            "chapter_number": 1,
+                            "subchapters": [
+                                {"subchapter_number": "1.1.1", "title": "Строка", "pages": "[30, 31]"},
+                                {"subchapter_number": "1.1.2", "title": "Список", "pages": [3, "4"]},
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+    kniga_data = {
+        "book": {
+            "pages": [
+                {"pageNumber": str(number), "content": f"Страница {number}"}
+                for number in (1, 3, 4, 30, 31)
+            ]
+        }
+    }
+    return BookIndex(know_map_data, kniga_data)
+
+
+def test_normalize_page_number():
+    assert normalize_page_number("17") == 17
+    assert normalize_page_number(17) == 17
+    assert normalize_page_number(" 17 ") == 17
+    assert normalize_page_number("abc") is None
+    assert normalize_page_number(None) is None
+
+
+def test_normalize_page_numbers():
+    assert normalize_page_numbers("[30, 31]") == [30, 31]
+    assert normalize_page_numbers("30, 31") == [30, 31]
+    assert normalize_page_numbers([30, "31", 30]) == [30, 31]
+    assert normalize_page_numbers(5) == [5]
+    assert normalize_page_numbers(None) == []
+
+
+def test_string_pages_do_not_match_substrings(book_index):
+    """Строка "[30, 31]" не должна захватывать страницы 1 и 3"""
+    content = PageContentParser(book_index).parse_final_content("1.1.1")
+    assert [page.page_number for page in content.pages] == [30, 31]
+
+
+def test_mixed_page_number_types(book_index):
+    """Строковые номера страниц kniga совпадают с числовыми номерами know_map"""
+    content = PageContentParser(book_index).parse_final_content("1.1.2")
+    assert [page.page_number for page in content.pages] == [3, 4]
+    assert book_index.subchapter_pages["1.1.2"] == [3, 4]
@@ -0,0 +1,32 @@
+from src.book_parser.index import BookIndex
+from src.book_parser.search import SubchapterSearchIndex, stem_russian, tokenize
+
+
+def test_stem_russian():
+    assert stem_russian("обратной") == stem_russian("обратная") == "обратн"
+    assert stem_russian("связи") == stem_russian("связь") == "связ"
+    assert stem_russian("отслеживание") == stem_russian("отслеживания")
+    assert stem_russian("новейший") == "нов"
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("Что такое обратная связь?") == ["обратн", "связ"]
+
+
+def test_search_ranks_descriptions_and_pages():
+    know_map_data = {"content": {"parts": [{"part_number": 1, "chapters": [{"chapter_number": 1, "subchapters": [
+        {"subchapter_number": "1.1.1", "title": "Обратная связь", "summary": "Как просить обратную связь", "pages": [1]},
+        {"subchapter_number": "1.1.2", "title": "Извинения", "summary": "Искусство извинений", "pages": [2]},
+        {"subchapter_number": "1.1.3", "title": "Благодарность", "summary": "", "pages": [3]},
+    ]}]}]}}
+    kniga_data = {"book": {"pages": [
+        {"pageNumber": "1", "content": "Руководители редко получают честную обратную связь."},
+        {"pageNumber": "2", "content": "Извинение - самый сильный ход."},
+        {"pageNumber": "3", "content": "Благодарите тех, кто дал вам обратную связь."},
+    ]}}
+    search_index = SubchapterSearchIndex(BookIndex(know_map_data, kniga_data))
+
+    results = search_index.search("Как руководителю получить обратную связь?", k=5)
+    assert [number for number, _ in results] == ["1.1.1", "1.1.3"]
+    assert search_index.search("извинения", k=1)[0][0] == "1.1.2"
+    assert search_index.search("квантовая физика") == []
@@ -1,6 +1,8 @@
 import pytest
 from pathlib import Path
-from src.book_parser.services import load_json, get_parts, get_chapters_by_part
+from src.book_parser import services
+from src.book_parser.catalog import BookCatalog, BookNotFoundError
+from src.book_parser.services import load_json, get_parts, get_chapters_by_part, get_page_content
 from src.book_parser.config import settings
 
 @pytest.fixture
@@ -19,7 +21,16 @@ def test_json_data():
                             "chapter_number": 1,
                             "title": "Тестовая глава",
                             "summary": "Описание главы",
-                            "key_points": ["point1", "point2"]
+                            "key_points": ["point1", "point2"],
+                            "subchapters": [
+                                {
+                                    "subchapter_number": "1.1.1",
+                                    "title": "Тестовая подглава",
+                                    "summary": "Описание подглавы",
+                                    "key_points": ["point1"],
+                                    "pages": [2, 3]
+                                }
+                            ]
                         }
                     ]
                 }
@@ -27,6 +38,39 @@ def test_json_data():
         }
     }
 
+@pytest.fixture
+def test_kniga_data():
+    """Фикстура с тестовыми страницами книги"""
+    return {
+        "book": {
+            "pages": [
+                {"pageNumber": number, "content": f"Страница {number}"}
+                for number in range(1, 5)
+            ]
+        }
+    }
+
+@pytest.fixture
+def book_files(monkeypatch, tmp_path, test_json_data, test_kniga_data):
+    """Фикстура с временными файлами книги по умолчанию и чистым каталогом книг"""
+    import json
+    know_map_file = tmp_path / "know_map_full.json"
+    kniga_file = tmp_path / "kniga_full_content.json"
+    know_map_file.write_text(json.dumps(test_json_data), encoding="utf-8")
+    kniga_file.write_text(json.dumps(test_kniga_data), encoding="utf-8")
+    monkeypatch.setattr(settings, "know_map_path", str(know_map_file))
+    monkeypatch.setattr(settings, "kniga_path", str(kniga_file))
+    monkeypatch.setattr(settings, "store_path", None)
+    monkeypatch.setattr(settings, "knowledge_maps_dir", str(tmp_path / "knowledge_maps"))
+    monkeypatch.setattr(settings, "books_dir", str(tmp_path / "row"))
+    monkeypatch.setattr(services, "catalog", BookCatalog(services.resolve_book_paths, 512 * 1024 * 1024))
+    return know_map_file, kniga_file
+
+@pytest.fixture
+def test_book_index(book_files):
+    """Фикстура с индексом книги по умолчанию, построенным из временных файлов"""
+    return services.get_book_index()
+
 @pytest.fixture
 def test_json_file(tmp_path, test_json_data):
     """Фикстура для создания временного JSON файла"""
@@ -48,26 +92,155 @@ def test_load_json_file_not_found():
     with pytest.raises(Exception):
         load_json(Path("non_existent.json"))
 
-def test_get_parts(monkeypatch, test_json_data):
+def test_book_index_lookups(test_book_index):
+    """Проверка словарей индекса книги"""
+    assert test_book_index.parts[1]["title"] == "Тестовая часть"
+    assert test_book_index.chapters[(1, 1)]["title"] == "Тестовая глава"
+    assert test_book_index.subchapters["1.1.1"]["title"] == "Тестовая подглава"
+    assert test_book_index.pages[3]["content"] == "Страница 3"
+
+def test_get_parts(test_book_index):
     """Проверка получения списка частей"""
-    def mock_load_json(file_path):
-        return test_json_data
-    
-    monkeypatch.setattr("src.book_parser.services.load_json", mock_load_json)
-    
     parts = get_parts()
     assert len(parts) > 0
     assert parts[0].title == "Тестовая часть"
     assert parts[0].part_number == "1"
 
-def test_get_chapters(monkeypatch, test_json_data):
+def test_get_chapters(test_book_index):
     """Проверка получения списка глав"""
-    def mock_load_json(file_path):
-        return test_json_data
-    
-    monkeypatch.setattr("src.book_parser.services.load_json", mock_load_json)
-    
     chapters = get_chapters_by_part(1)
     assert len(chapters) > 0
     assert chapters[0].title == "Тестовая глава"
-    assert chapters[0].chapter_number == "1"
\ No newline at end of file
+    assert chapters[0].chapter_number == "1"
+
+def test_get_page_content(test_book_index):
+    """Проверка получения страниц подглавы из индекса"""
+    content = get_page_content("1.1.1")
+    assert content.subchapter_title == "Тестовая подглава"
+    assert [page.page_number for page in content.pages] == [2, 3]
+
+def test_book_index_built_once(monkeypatch, book_files):
+    """Проверка, что JSON читается один раз, а не на каждый запрос"""
+    calls = []
+    def counting_load_json(file_path):
+        calls.append(file_path)
+        return load_json(file_path)
+
+    monkeypatch.setattr("src.book_parser.catalog.load_json", counting_load_json)
+
+    get_parts()
+    get_chapters_by_part(1)
+    get_page_content("1.1.1")
+    assert len(calls) == 2
+
+def test_reload_book_index_on_file_change(book_files, test_json_data):
+    """Проверка перезагрузки индекса при изменении файла и сохранения старого снимка"""
+    import json
+    know_map_file, _ = book_files
+    old_index = services.get_book_index()
+    assert services.reload_book_index() is False
+
+    test_json_data["content"]["parts"][0]["title"] = "Новая часть"
+    know_map_file.write_text(json.dumps(test_json_data), encoding="utf-8")
+
+    assert services.reload_book_index() is True
+    assert get_parts()[0].title == "Новая часть"
+    assert old_index.parts[1]["title"] == "Тестовая часть"
+    assert services.get_book_index().version != old_index.version
+
+def test_reload_book_index_keeps_old_on_error(book_files):
+    """Проверка, что битый файл не заменяет рабочий индекс"""
+    know_map_file, _ = book_files
+    old_index = services.get_book_index()
+    know_map_file.write_text("{broken", encoding="utf-8")
+
+    with pytest.raises(Exception):
+        services.reload_book_index()
+    assert services.get_book_index() is old_index
+
+def test_book_index_from_store(monkeypatch, book_files, tmp_path):
+    """Проверка работы индекса поверх скомпилированного хранилища"""
+    from src.book_parser.store import PageStore
+    store_file = tmp_path / "book.sqlite"
+    monkeypatch.setattr(settings, "store_path", str(store_file))
+
+    index = services.get_book_index()
+    assert store_file.exists()
+    assert isinstance(index.pages, PageStore)
+    assert len(index.pages) == 4
+    assert get_parts()[0].title == "Тестовая часть"
+
+    content = get_page_content("1.1.1")
+    assert [page.page_number for page in content.pages] == [2, 3]
+    assert content.pages[0].content == "Страница 2"
+
+def test_store_recompiled_when_sources_change(monkeypatch, book_files, tmp_path, test_kniga_data):
+    """Проверка перекомпиляции хранилища после изменения исходного JSON"""
+    import json
+    _, kniga_file = book_files
+    monkeypatch.setattr(settings, "store_path", str(tmp_path / "book.sqlite"))
+    services.get_book_index()
+
+    test_kniga_data["book"]["pages"][1]["content"] = "Обновлённая страница 2"
+    kniga_file.write_text(json.dumps(test_kniga_data), encoding="utf-8")
+
+    assert services.reload_book_index() is True
+    assert get_page_content("1.1.1").pages[0].content == "Обновлённая страница 2"
+    assert services.reload_book_index() is False
+
+def test_reload_releases_replaced_store(monkeypatch, book_files, tmp_path, test_kniga_data):
+    """Перезагрузка без изменений переиспользует хранилище, после изменений закрывает старое"""
+    import json
+    import sqlite3
+    _, kniga_file = book_files
+    monkeypatch.setattr(settings, "store_path", str(tmp_path / "book.sqlite"))
+    store = services.get_book_index().pages
+
+    assert services.reload_book_index(force=True) is True
+    assert services.get_book_index().pages is store
+
+    test_kniga_data["book"]["pages"][1]["content"] = "Обновлённая страница 2"
+    kniga_file.write_text(json.dumps(test_kniga_data), encoding="utf-8")
+    assert services.reload_book_index() is True
+    assert services.get_book_index().pages is not store
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.get_many([2])
+
+def write_book(tmp_path, slug, know_map_data, kniga_data):
+    """Создаёт файлы книги каталога в раскладке data/knowledge_maps/<slug>, data/row/<slug>"""
+    import json
+    know_map_dir = tmp_path / "knowledge_maps" / slug
+    kniga_dir = tmp_path / "row" / slug
+    know_map_dir.mkdir(parents=True)
+    kniga_dir.mkdir(parents=True)
+    (know_map_dir / "know_map_full.json").write_text(json.dumps(know_map_data), encoding="utf-8")
+    (kniga_dir / "kniga_full_content.json").write_text(json.dumps(kniga_data), encoding="utf-8")
+
+def test_catalog_serves_books_by_slug(book_files, tmp_path, test_json_data, test_kniga_data):
+    """Проверка выбора книги каталога по идентификатору"""
+    import copy
+    other = copy.deepcopy(test_json_data)
+    other["content"]["parts"][0]["title"] = "Часть другой книги"
+    write_book(tmp_path, "other", other, test_kniga_data)
+
+    assert get_parts("other")[0].title == "Часть другой книги"
+    assert get_parts()[0].title == "Тестовая часть"
+    assert "other" in services.list_books()
+    with pytest.raises(BookNotFoundError):
+        get_parts("missing")
+    with pytest.raises(BookNotFoundError):
+        get_parts("../row")
+
+def test_catalog_evicts_least_recently_used(monkeypatch, book_files, tmp_path, test_json_data, test_kniga_data):
+    """Проверка выгрузки давно не использованных книг сверх бюджета памяти"""
+    for slug in ("first", "second", "third"):
+        write_book(tmp_path, slug, test_json_data, test_kniga_data)
+    book_size = services.catalog.get_entry("first").estimated_size()
+    catalog = BookCatalog(services.resolve_book_paths, book_size * 2)
+    monkeypatch.setattr(services, "catalog", catalog)
+
+    get_parts("first")
+    get_parts("second")
+    get_parts("first")
+    get_parts("third")
+    assert catalog.loaded_books() == ["first", "third"]
@@ -0,0 +1,51 @@
+# tests/google_sheets/test_health.py
+
+import asyncio
+import time
+import unittest
+import httpx
+import respx
+from src.google_sheets.health import HealthMonitor
+
+SERVICES = [
+    ("gigachat_init", 8000, "/token/health"),
+    ("book_parser", 8001, "/parser/health"),
+    ("llm_service", 8110, "/llm/health"),
+]
+
+class TestHealthMonitor(unittest.TestCase):
+    @respx.mock
+    def test_probes_run_in_parallel_and_are_cached(self):
+        async def slow_ok(request):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={"status": "ok"})
+        routes = [respx.get(f"http://127.0.0.1:{port}{path}").mock(side_effect=slow_ok) for _, port, path in SERVICES]
+        monitor = HealthMonitor(SERVICES, ttl=60)
+
+        async def run():
+            started = time.monotonic()
+            first = await monitor.check()
+            elapsed = time.monotonic() - started
+            second = await monitor.check()
+            return first, second, elapsed
+
+        first, second, elapsed = asyncio.run(run())
+        self.assertTrue(all(available for available, _ in first.values()))
+        self.assertIs(first, second)
+        self.assertLess(elapsed, 0.25)
+        self.assertTrue(all(route.call_count == 1 for route in routes))
+
+    @respx.mock
+    def test_unavailable_service_is_rechecked(self):
+        llm_route = respx.get("http://127.0.0.1:8110/llm/health").respond(status_code=503)
+        for _, port, path in SERVICES[:2]:
+            respx.get(f"http://127.0.0.1:{port}{path}").respond(json={"status": "ok"})
+        monitor = HealthMonitor(SERVICES, ttl=60)
+
+        self.assertFalse(asyncio.run(monitor.check())["llm_service"][0])
+        llm_route.respond(json={"status": "ok"})
+        self.assertTrue(asyncio.run(monitor.check())["llm_service"][0])
+        self.assertEqual(llm_route.call_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
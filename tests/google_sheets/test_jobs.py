@@ -0,0 +1,124 @@
+# tests/google_sheets/test_jobs.py
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from src.google_sheets import services
+from src.google_sheets.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from src.google_sheets.worker import FormWorkerPool, sweep_unprocessed_forms
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "form_jobs.sqlite3"
+        self.queue = JobQueue(self.path, max_attempts=2, backoff_base=0.0)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp_dir.cleanup()
+
+    def test_enqueue_is_deduplicated_per_row(self):
+        self.assertTrue(self.queue.enqueue("1"))
+        self.assertFalse(self.queue.enqueue("1"))
+        self.assertEqual(self.queue.claim(), "1")
+        self.assertFalse(self.queue.enqueue("1"))  # форма уже обрабатывается
+        self.assertIsNone(self.queue.claim())
+
+        self.queue.complete("1")
+        self.assertTrue(self.queue.enqueue("1"))
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        self.queue.enqueue("1")
+        self.assertEqual(self.queue.claim(), "1")
+        self.assertEqual(self.queue.fail("1", "ошибка"), 0.0)
+        self.assertEqual(self.queue.get("1")["status"], QUEUED)
+
+        self.assertEqual(self.queue.claim(), "1")
+        self.assertIsNone(self.queue.fail("1", "ошибка"))
+        self.assertEqual(self.queue.get("1")["status"], FAILED)
+
+        # Исчерпанные попытки не сбрасываются при обходе, только при явном запросе
+        self.assertFalse(self.queue.enqueue("1", force=False))
+        self.assertTrue(self.queue.enqueue("1"))
+
+    def test_backoff_grows_exponentially(self):
+        queue = JobQueue(Path(self.tmp_dir.name) / "backoff.sqlite3", max_attempts=5, backoff_base=2.0, backoff_max=5.0)
+        queue.enqueue("1")
+        delays = []
+        for _ in range(3):
+            queue._set("1", "available_at = ?", (0,))
+            queue.claim()
+            delays.append(queue.fail("1", "ошибка"))
+        self.assertEqual(delays, [2.0, 4.0, 5.0])
+        queue.close()
+
+    def test_running_jobs_survive_restart(self):
+        self.queue.enqueue("1")
+        self.queue.claim()
+        self.queue.close()
+
+        self.queue = JobQueue(self.path)
+        self.assertEqual(self.queue.get("1")["status"], RUNNING)
+        self.assertEqual(self.queue.requeue_running(), 1)
+        self.assertEqual(self.queue.claim(), "1")
+
+
+class TestFormWorkerPool(unittest.TestCase):
+    def test_workers_process_and_retry_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue = JobQueue(Path(tmp_dir) / "form_jobs.sqlite3", max_attempts=3, backoff_base=0.0)
+            calls = []
+
+            async def process(row_id):
+                calls.append(row_id)
+                # Первая попытка формы 2 завершается частично
+                return {"processed": not (row_id == "2" and calls.count("2") == 1)}
+
+            async def run():
+                pool = FormWorkerPool(queue, process, workers=2, poll_interval=0.01)
+                pool.start()
+                for row_id in ("1", "2"):
+                    queue.enqueue(row_id)
+                pool.notify()
+                for _ in range(200):
+                    if all(queue.get(row_id)["status"] == DONE for row_id in ("1", "2")):
+                        break
+                    await asyncio.sleep(0.01)
+                await pool.stop()
+
+            asyncio.run(run())
+            self.assertEqual(sorted(calls), ["1", "2", "2"])
+            self.assertEqual(queue.get("2")["attempts"], 2)
+            queue.close()
+
+    def test_form_without_pairs_completes_on_first_attempt(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(services.settings, "data_dir", tmp_dir), \
+                mock.patch.object(services, "check_services_availability", mock.AsyncMock(return_value=True)):
+            queue = JobQueue(Path(tmp_dir) / "form_jobs.sqlite3", max_attempts=3, backoff_base=0.0)
+            # Только служебная пара - оценивать нечего
+            services.save_form_submission(services.process_form_data({"row_id": "1", "ФИО": "Иванов И.И."}))
+
+            async def run():
+                pool = FormWorkerPool(queue, services.process_form_submission_with_llm, workers=1, poll_interval=0.01)
+                pool.start()
+                queue.enqueue("1")
+                pool.notify()
+                for _ in range(200):
+                    if queue.get("1")["status"] != QUEUED and queue.get("1")["status"] != RUNNING:
+                        break
+                    await asyncio.sleep(0.01)
+                await pool.stop()
+
+            asyncio.run(run())
+            self.assertEqual(queue.get("1")["status"], DONE)
+            self.assertEqual(queue.get("1")["attempts"], 1)
+            self.assertTrue(services.get_form_submission_by_row_id("1")["processed"])
+            # При старте сервиса форма не ставится в очередь заново
+            self.assertEqual(sweep_unprocessed_forms(queue), 0)
+            queue.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/google_sheets/test_progress.py
+
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.google_sheets import routes
+from src.google_sheets.progress import ProgressTracker
+
+class TestProgressTracker(unittest.TestCase):
+    def test_subscribers_receive_pipeline_events(self):
+        tracker = ProgressTracker()
+
+        async def run():
+            queue = tracker.subscribe("1")
+            tracker.started("1", total=3, done=1)
+            tracker.pair_finished("1", 2, success=True)
+            tracker.pair_finished("1", 3, success=False)
+            tracker.finished("1", processed=False)
+            tracker.unsubscribe("1", queue)
+            tracker.error("1", "ошибка", final=True)
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        events = asyncio.run(run())
+        self.assertEqual([event["event"] for event in events], ["started", "pair", "pair", "partial"])
+        self.assertEqual((events[-1]["done"], events[-1]["failed"], events[-1]["total"]), (2, 1, 3))
+        self.assertEqual(tracker.get("1")["event"], "failed")
+
+    def test_table_is_bounded(self):
+        tracker = ProgressTracker(max_entries=2)
+        for row_id in ("1", "2", "3"):
+            tracker.queued(row_id)
+        self.assertIsNone(tracker.get("1"))
+        self.assertIsNotNone(tracker.get("3"))
+
+
+class TestProgressEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.tracker = ProgressTracker()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patchers = [
+            mock.patch.object(routes, "progress_tracker", self.tracker),
+            mock.patch.object(routes.settings, "data_dir", self.tmp_dir.name),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        app = FastAPI()
+        app.include_router(routes.router)
+        self.client = TestClient(app)
+
+    def test_stream_ends_on_completion(self):
+        self.tracker.started("1", total=2, done=0)
+        self.tracker.finished("1", processed=True)
+        response = self.client.get("/sheets/progress/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertTrue(response.text.startswith("event: completed\n"))
+
+    def test_check_processing_uses_memory_state(self):
+        self.tracker.started("1", total=2, done=1)
+        with mock.patch.object(routes, "get_form_submission_by_row_id") as get_form:
+            response = self.client.get("/sheets/check-processing/1")
+        get_form.assert_not_called()
+        self.assertEqual(response.json()["progress"], {"done": 1, "failed": 0, "total": 2})
+
+    def test_resaved_form_drops_stale_progress(self):
+        # Форма уже обрабатывалась, затем строка с тем же row_id пришла заново
+        self.tracker.started("1", total=1, done=1)
+        self.tracker.finished("1", processed=True)
+        response = self.client.post("/sheets/receive-data", json={"row_id": "1", "Вопрос": "новый ответ"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.tracker.get("1"))
+
+        status = self.client.get("/sheets/check-processing/1").json()
+        self.assertFalse(status["processed"])
+        self.assertNotIn("progress", status)
+
+    def test_unknown_form_returns_404(self):
+        self.assertEqual(self.client.get("/sheets/progress/404").status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# tests/google_sheets/test_routes.py
+
+import asyncio
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.google_sheets import routes, services
+from src.google_sheets.jobs import JobQueue
+from src.google_sheets.storage import SQLiteFormStore
+
+class TestBulkReceiveData(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patchers = [
+            mock.patch.object(services.settings, "data_dir", self.tmp_dir.name),
+            mock.patch.object(services.settings, "bulk_max_rows", 3),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        app = FastAPI()
+        app.include_router(routes.router)
+        self.client = TestClient(app)
+
+    def test_rows_are_saved_with_per_row_results(self):
+        rows = [{"row_id": "1", "Вопрос": "ответ"}, "не объект", {"row_id": "2", "Вопрос": "ответ"}]
+        put_many = SQLiteFormStore.put_many
+        with mock.patch.object(SQLiteFormStore, "put_many", autospec=True, side_effect=put_many) as spy:
+            response = self.client.post("/sheets/receive-data/bulk", json={"rows": rows})
+
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body["saved_count"], body["error_count"]), (2, 1))
+        self.assertEqual([result["status"] for result in body["results"]], ["success", "error", "success"])
+        self.assertEqual(spy.call_count, 1)  # одна операция хранилища на пакет
+        self.assertIsNotNone(services.get_form_submission_by_row_id("2"))
+
+    def test_rows_are_enqueued_on_request(self):
+        rows = [{"row_id": "5"}, {"row_id": "6"}]
+        with mock.patch.object(routes, "enqueue_forms", return_value=[True, False]) as enqueue_forms:
+            response = self.client.post("/sheets/receive-data/bulk", json={"rows": rows, "enqueue": True})
+        enqueue_forms.assert_awaited_once_with(["5", "6"])  # весь пакет одной операцией
+        self.assertEqual([result["enqueued"] for result in response.json()["results"]], [True, False])
+
+    def test_process_form_accesses_store_and_queue_off_event_loop(self):
+        services.save_form_submission(services.process_form_data({"row_id": "1", "Вопрос": "ответ"}))
+        loop_threads, io_threads = [], []
+
+        def record(method):
+            def wrapper(obj, *args, **kwargs):
+                io_threads.append(threading.get_ident())
+                return method(obj, *args, **kwargs)
+            return wrapper
+
+        async def run():
+            loop_threads.append(threading.get_ident())
+            return await routes.process_form_with_llm("1")
+
+        with mock.patch.object(SQLiteFormStore, "get", record(SQLiteFormStore.get)), \
+                mock.patch.object(JobQueue, "enqueue", record(JobQueue.enqueue)), \
+                mock.patch.object(JobQueue, "get", record(JobQueue.get)):
+            response = asyncio.run(run())
+
+        self.assertEqual(json.loads(response.body)["job_status"], "queued")
+        # Чтение формы, постановка в очередь и статус задачи
+        self.assertEqual(len(io_threads), 3)
+        self.assertNotIn(loop_threads[0], io_threads)
+
+    def test_duplicate_row_ids_are_reported(self):
+        rows = [{"row_id": "1", "Вопрос": "первый"}, {"row_id": "1", "Вопрос": "второй"}]
+        response = self.client.post("/sheets/receive-data/bulk", json={"rows": rows})
+
+        body = response.json()
+        self.assertEqual((body["saved_count"], body["error_count"], body["duplicate_count"]), (1, 0, 1))
+        self.assertEqual([result["status"] for result in body["results"]], ["success", "duplicate"])
+        stored = services.get_form_submission_by_row_id("1")
+        self.assertEqual(stored["qa_pairs"][0]["user_answer"], "первый")
+
+    def test_too_many_rows_are_rejected(self):
+        response = self.client.post("/sheets/receive-data/bulk", json={"rows": [{}] * 4})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()
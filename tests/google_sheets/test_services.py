@@ -1,7 +1,13 @@
 # tests/google_sheets/test_services.py
 
+import asyncio
+import tempfile
 import unittest
 from datetime import datetime
+from unittest import mock
+import httpx
+import respx
+from src.google_sheets import services
 from src.google_sheets.services import process_form_data
 from src.google_sheets.models import QAPair, FormSubmission
 
@@ -35,5 +41,109 @@ class TestGoogleSheetsServices(unittest.TestCase):
         self.assertEqual(first_pair.user_answer, "Иванов И.И.")
         self.assertEqual(first_pair.llm_response, "")  # Значение по умолчанию
 
+class TestProcessFormWithLLM(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patchers = [
+            mock.patch.object(services.settings, "data_dir", self.tmp_dir.name),
+            mock.patch.object(services.settings, "llm_concurrency_per_form", 3),
+            mock.patch.object(services, "check_services_availability", mock.AsyncMock(return_value=True)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def save_form(self, row_id, answers):
+        form_data = {"row_id": row_id, "ФИО": "Иванов И.И."}
+        form_data.update({f"Вопрос {i}": answer for i, answer in enumerate(answers, start=1)})
+        services.save_form_submission(process_form_data(form_data))
+
+    @respx.mock
+    def test_pairs_are_evaluated_concurrently_in_order(self):
+        self.save_form("1", ["ответ 1", "ответ 2", "ошибка", "ответ 4", "ответ 5"])
+        active, peak = 0, 0
+
+        async def fake_llm(request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            question = request.read().decode("utf-8")
+            if "ошибка" in question:
+                return httpx.Response(500)
+            return httpx.Response(200, json={"answer": f"оценка {question.count('ответ')}"})
+
+        respx.post(url__regex=r".*/llm/full-reasoning").mock(side_effect=fake_llm)
+        result = asyncio.run(services.process_form_submission_with_llm("1"))
+
+        responses = [pair["llm_response"] for pair in result["qa_pairs"]]
+        self.assertEqual(responses[0], "")
+        self.assertEqual(responses[3], "")  # ошибка одной пары не мешает остальным
+        self.assertTrue(all(responses[i] for i in (1, 2, 4, 5)))
+        self.assertEqual(peak, 3)
+        self.assertFalse(result["processed"])
+
+    @respx.mock
+    def test_answers_are_checkpointed_and_processing_resumes(self):
+        self.save_form("2", ["ответ 1", "ответ 2", "ответ 3"])
+        failing = {"ответ 2"}
+        requested = []
+
+        def fake_llm(request):
+            question = request.read().decode("utf-8")
+            answer = next(a for a in ("ответ 1", "ответ 2", "ответ 3") if a in question)
+            requested.append(answer)
+            if answer in failing:
+                return httpx.Response(500)
+            return httpx.Response(200, json={"answer": f"оценка: {answer}"})
+
+        respx.post(url__regex=r".*/llm/full-reasoning").mock(side_effect=fake_llm)
+
+        # Первый запуск: одна пара не оценена, остальные ответы уже сохранены
+        asyncio.run(services.process_form_submission_with_llm("2"))
+        stored = services.get_form_submission_by_row_id("2")
+        self.assertEqual([pair["llm_response"] for pair in stored["qa_pairs"]][1:], ["оценка: ответ 1", "", "оценка: ответ 3"])
+        self.assertFalse(stored["processed"])
+        state = services.progress_tracker.get("2")
+        self.assertEqual((state["event"], state["done"], state["failed"]), ("partial", 2, 1))
+
+        # Повторный запуск оценивает только пару без ответа
+        failing.clear()
+        requested.clear()
+        result = asyncio.run(services.process_form_submission_with_llm("2"))
+        self.assertEqual(requested, ["ответ 2"])
+        self.assertTrue(result["processed"])
+        self.assertTrue(services.get_form_submission_by_row_id("2")["processed"])
+        self.assertEqual(services.progress_tracker.get("2")["event"], "completed")
+
+    @respx.mock
+    def test_store_is_accessed_off_event_loop(self):
+        import threading
+        from src.google_sheets.storage import SQLiteFormStore
+        self.save_form("3", ["ответ 1"])
+        respx.post(url__regex=r".*/llm/full-reasoning").respond(json={"answer": "оценка"})
+        loop_threads, store_threads = [], []
+
+        def record(method):
+            def wrapper(store, *args, **kwargs):
+                store_threads.append(threading.get_ident())
+                return method(store, *args, **kwargs)
+            return wrapper
+
+        async def run():
+            loop_threads.append(threading.get_ident())
+            return await services.process_form_submission_with_llm("3")
+
+        with mock.patch.object(SQLiteFormStore, "get", record(SQLiteFormStore.get)), \
+                mock.patch.object(SQLiteFormStore, "update", record(SQLiteFormStore.update)):
+            result = asyncio.run(run())
+
+        self.assertTrue(result["processed"])
+        # Чтение формы, сохранение ответа и отметка processed
+        self.assertEqual(len(store_threads), 3)
+        self.assertNotIn(loop_threads[0], store_threads)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+# tests/google_sheets/test_storage.py
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from src.google_sheets.storage import FormJournal, SQLiteFormStore
+
+class TestFormJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "form_data.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_appends_and_get_returns_latest_version(self):
+        journal = FormJournal(self.path)
+        journal.put("1", {"processed": False})
+        journal.put("2", {"processed": False})
+        journal.put("1", {"processed": True})
+
+        self.assertEqual(journal.get("1"), {"processed": True})
+        self.assertIsNone(journal.get("3"))
+        # Каждое сохранение - одна дописанная строка
+        self.assertEqual(len(self.path.read_text(encoding="utf-8").splitlines()), 3)
+
+        # Индекс восстанавливается при повторном открытии журнала
+        reopened = FormJournal(self.path)
+        self.assertEqual(reopened.row_ids(), ["1", "2"])
+        self.assertEqual(reopened.get("1"), {"processed": True})
+
+    def test_truncated_tail_is_dropped(self):
+        journal = FormJournal(self.path)
+        journal.put("1", {"processed": False})
+        with self.path.open("ab") as f:
+            f.write(b'{"row_id": "2", "form": {"proc')
+
+        reopened = FormJournal(self.path)
+        self.assertEqual(reopened.row_ids(), ["1"])
+        reopened.put("2", {"processed": False})
+        self.assertEqual(FormJournal(self.path).get("2"), {"processed": False})
+
+    def test_put_many_appends_batch(self):
+        journal = FormJournal(self.path)
+        journal.put("1", {"version": 0})
+        journal.put_many({"1": {"version": 1}, "2": {"version": 1}})
+        self.assertEqual(journal.get("1"), {"version": 1})
+        self.assertEqual(journal.get("2"), {"version": 1})
+
+        reopened = FormJournal(self.path)
+        self.assertEqual(reopened.row_ids(), ["1", "2"])
+        self.assertEqual(reopened.get("2"), {"version": 1})
+
+    def test_compact_keeps_latest_versions(self):
+        journal = FormJournal(self.path)
+        for version in range(5):
+            journal.put("1", {"version": version})
+        journal.compact()
+
+        self.assertEqual(len(self.path.read_text(encoding="utf-8").splitlines()), 1)
+        self.assertEqual(journal.get("1"), {"version": 4})
+
+    def test_legacy_json_is_migrated(self):
+        legacy_path = Path(self.tmp_dir.name) / "form_data.json"
+        legacy_path.write_text(json.dumps({"data": {"7": {"row_id": "7", "processed": True}}}), encoding="utf-8")
+
+        journal = FormJournal(self.path, legacy_path=legacy_path)
+        self.assertEqual(journal.get("7"), {"row_id": "7", "processed": True})
+
+class TestSQLiteFormStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "form_data.sqlite3"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_get_and_list_unprocessed(self):
+        store = SQLiteFormStore(self.path)
+        store.put("1", {"processed": False, "received_at": "2025-01-02T00:00:00"})
+        store.put("2", {"processed": False, "received_at": "2025-01-01T00:00:00"})
+        store.put("1", {"processed": True, "received_at": "2025-01-02T00:00:00"})
+
+        self.assertEqual(store.get("1")["processed"], True)
+        self.assertIsNone(store.get("3"))
+        self.assertEqual(store.row_ids(), ["1", "2"])
+        self.assertEqual(store.list_unprocessed(), ["2"])
+        journal_mode = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+        store.close()
+
+    def test_journal_is_imported_into_empty_database(self):
+        journal_path = Path(self.tmp_dir.name) / "form_data.jsonl"
+        journal = FormJournal(journal_path)
+        journal.put("1", {"processed": False, "user_email": "a@example.com"})
+        journal.put("1", {"processed": True, "user_email": "a@example.com"})
+
+        store = SQLiteFormStore(self.path, import_from=[journal_path])
+        self.assertEqual(store.get("1"), {"processed": True, "user_email": "a@example.com"})
+        self.assertEqual(store.list_unprocessed(), [])
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
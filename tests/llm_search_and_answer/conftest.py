@@ -0,0 +1,13 @@
+# tests/llm_search_and_answer/conftest.py
+
+import pytest
+from src.llm_search_and_answer import services
+
+
+@pytest.fixture(autouse=True)
+def memory_evaluation_cache(monkeypatch):
+    """
+    Кэш оценок в тестах - свежий и только в памяти, без файла в data/.
+    """
+    monkeypatch.setattr(services.llm_settings, "evaluation_cache_db", "")
+    monkeypatch.setattr(services, "_evaluation_cache", None)
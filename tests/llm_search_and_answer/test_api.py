@@ -54,3 +54,24 @@ def test_full_reasoning_invalid_payload(client):
     payload = {}
     response = client.post("/llm/full-reasoning", json=payload)
     assert response.status_code == 422
+
+def test_full_reasoning_batch(monkeypatch):
+    from src.llm_search_and_answer import routes
+
+    async def fake_batch(questions):
+        return [f"ответ на {question}" for question in questions]
+    monkeypatch.setattr(routes, "arun_batch_reasoning_pipeline", fake_batch)
+    client = TestClient(main.app)
+
+    payload = {"questions": [{"question": "первый"}, {"question": "второй"}]}
+    response = client.post("/llm/full-reasoning/batch", json=payload)
+    assert response.status_code == 200, response.text
+    assert [item["answer"] for item in response.json()["answers"]] == ["ответ на первый", "ответ на второй"]
+
+    response = client.post("/llm/full-reasoning/batch", json={"questions": []})
+    assert response.status_code == 422
+
+def test_health():
+    response = TestClient(main.app).get("/llm/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
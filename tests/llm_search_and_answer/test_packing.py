@@ -0,0 +1,91 @@
+# tests/llm_search_and_answer/test_packing.py
+
+from src.llm_search_and_answer.packing import (
+    TRUNCATION_MARK,
+    estimate_tokens,
+    pack_blocks,
+    required_detail,
+    truncate_to_tokens,
+)
+from src.llm_search_and_answer import services
+
+
+def test_estimate_tokens_cyrillic_denser_than_latin():
+    # Кириллический текст той же длины оценивается в большее число токенов
+    assert estimate_tokens("обучение" * 4) > estimate_tokens("learning" * 4)
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Урок 2: люди") == estimate_tokens("Урок") + 1 + 1 + estimate_tokens("люди")
+
+
+def test_truncate_closes_tags_and_fits_budget():
+    text = "<summary>" + " ".join(f"Предложение номер {i}." for i in range(100)) + "</summary>"
+    truncated = truncate_to_tokens(text, 60)
+    assert estimate_tokens(truncated) <= 60
+    assert truncated.endswith(TRUNCATION_MARK + "</summary>")
+    # Обрезка по границе предложения
+    assert truncated.startswith("<summary>Предложение номер 0.")
+    assert truncated[:-len(TRUNCATION_MARK + "</summary>")].endswith(".")
+
+
+def test_pack_blocks_keeps_most_relevant_blocks():
+    blocks = [("1", "первый " * 100), ("2", "второй " * 100), ("3", "третий " * 10)]
+    first = estimate_tokens(blocks[0][1])
+
+    packed = pack_blocks(blocks, budget=first + 60)
+    assert [block_id for block_id, _ in packed.blocks] == ["1", "2"]
+    assert packed.truncated == ["2"]
+    assert packed.dropped == ["3"]
+    assert packed.packed_tokens <= first + 60
+    total = sum(estimate_tokens(text) for _, text in blocks)
+    assert packed.packed_tokens + packed.dropped_tokens == total
+
+    unlimited = pack_blocks(blocks, budget=0)
+    assert unlimited.blocks == blocks
+    assert unlimited.dropped_tokens == 0
+
+
+def test_assemble_subchapters_context_respects_budget(monkeypatch):
+    monkeypatch.setattr(services.llm_settings, "context_token_budget", 200)
+    texts = {"1": "<summary>" + "важный текст " * 40 + "</summary>", "2": "лишний текст " * 40}
+
+    combined, complete = services.assemble_subchapters_context(["1", "2"], texts)
+
+    assert complete
+    assert combined.startswith("<content_subchapter id='1'>")
+    assert "<content_subchapter id='2'>" not in combined
+    assert estimate_tokens(combined) <= 200
+
+
+def test_required_detail_by_question():
+    assert required_detail("Почему отслеживание работает?") == "summary"
+    assert required_detail("Назовите 4 урока, о которых говорит автор") == "page_summaries"
+    assert required_detail("Приведите цитату автора об отслеживании") == "pages"
+
+
+def test_escalate_top_subchapter_picks_cheapest_fitting_detail(monkeypatch):
+    contents = {
+        "1": {"subchapter_title": "Основная", "pages": [
+            {"page_number": 10, "summary": "", "content": "полный текст страницы " * 20},
+        ]},
+        "2": {"subchapter_title": "Вторая", "pages": [{"page_number": 20, "content": "другой текст"}]},
+    }
+    texts = {"1": "<summary>кратко</summary>", "2": "<summary>вторая кратко</summary>"}
+    monkeypatch.setattr(services.llm_settings, "context_token_budget", 1000)
+
+    # Вопрос без деталей - summary подглавы
+    assert services.escalate_top_subchapter(["1", "2"], contents, texts, "summary") == texts
+
+    # Summary страниц нет, поэтому берётся текст страниц; вторая подглава не меняется
+    escalated = services.escalate_top_subchapter(["1", "2"], contents, texts, "page_summaries")
+    assert "Вот полный текст каждой страницы" in escalated["1"]
+    assert "10: полный текст страницы" in escalated["1"]
+    assert escalated["2"] == texts["2"]
+
+    # Есть summary страниц - это самый дешёвый подходящий уровень
+    contents["1"]["pages"][0]["summary"] = "о чём страница"
+    escalated = services.escalate_top_subchapter(["1", "2"], contents, texts, "page_summaries")
+    assert "<summary>10: о чём страница</summary>" in escalated["1"]
+
+    # Подробный текст не помещается в бюджет - остаётся summary подглавы
+    monkeypatch.setattr(services.llm_settings, "context_token_budget", 40)
+    assert services.escalate_top_subchapter(["1", "2"], contents, texts, "pages") == texts
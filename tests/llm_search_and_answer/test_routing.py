@@ -0,0 +1,179 @@
+import asyncio
+import httpx
+import pytest
+import respx
+from src.llm_search_and_answer import services
+from src.llm_search_and_answer.routing import SubchapterRouter, is_confident
+
+TABLE = {
+    "3.6.4": {"title": "Основы обратной связи", "summary": "Как просить обратную связь у коллег", "key_points": ""},
+    "3.7.2": {"title": "Искусство приносить извинения", "summary": "Извинение закрывает прошлое", "key_points": ""},
+    "3.11.2": {"title": "Почему отслеживание работает", "summary": "Отслеживание прогресса и уроки", "key_points": ""},
+}
+
+
+def test_router_ranks_by_cosine_similarity():
+    router = SubchapterRouter(TABLE)
+    assert router.matrix.shape[0] == 3
+    assert router.route("Зачем извиняться перед коллегами?", 1)[0][0] == "3.7.2"
+    ranked = router.route("Почему работает отслеживание?")
+    assert ranked[0][0] == "3.11.2"
+    assert all(0 < score <= 1.0001 for _, score in ranked)
+    assert router.route("zzz qqq") == []
+
+
+def test_is_confident():
+    assert is_confident([("a", 0.4), ("b", 0.1)], min_score=0.1, min_margin=0.05)
+    assert not is_confident([("a", 0.4), ("b", 0.38)], min_score=0.1, min_margin=0.05)
+    assert not is_confident([("a", 0.05)], min_score=0.1, min_margin=0.0)
+    assert not is_confident([], min_score=0.1, min_margin=0.0)
+    # Две лучшие подглавы из одной главы - маршрут уверенный без отрыва
+    assert is_confident([("3.9.2", 0.2), ("3.9.1", 0.192)], min_score=0.1, min_margin=0.02)
+    assert not is_confident([("3.9.2", 0.2), ("2.4.1", 0.192)], min_score=0.1, min_margin=0.02)
+    assert not is_confident([("3.9.2", 0.08), ("3.9.1", 0.02)], min_score=0.1, min_margin=0.02)
+
+
+# Типичные вопросы формы: вопрос курса и ответ пользователя
+BOOK_QUESTIONS = [
+    ("Почему отслеживание работает?", "Не знаю"),
+    ("Почему отслеживание работает - назовите 4 урока о которых говорит автор",
+     "Урок первый: не каждый реагирует на процесс обучения. Урок 2: между пониманием и действием дистанция огромного размера"),
+    ("Какой главный вред гнева для руководителя по мнению автора?", "Человек теряет способность меняться"),
+    ("Что такое фидфорвард?", "Не помню"),
+    ("Как правильно извиняться?", "Искренне"),
+    ("Какие слова нужно сказать, извиняясь?", "Мне жаль, я постараюсь исправиться"),
+    ("Зачем благодарить?", "Чтобы люди помогали"),
+    ("Как автор предлагает реагировать на любую обратную связь?", "Просто сказать спасибо"),
+    ("Почему руководители часто не слышат собеседника?", "Думают о своем ответе, надо слушать с уважением"),
+    ("Почему нельзя использовать обратную связь для спора?", "Потому что люди перестанут ее давать"),
+    ("Чем опасна привычка всегда побеждать?", "Портит отношения"),
+    ("Что такое фаза покоя?", "Период когда ничего не меняется"),
+    ("Зачем сообщать окружающим о своих изменениях?", "Люди не замечают изменений, надо рекламировать свои усилия"),
+    ("Почему успешные люди сопротивляются изменениям?", "Они уверены, что добились успеха благодаря своему поведению"),
+    ("Какие вопросы автор задает себе каждый вечер?", "Проверяет по списку свои поступки за день"),
+    ("Когда лучше всего начинать меняться?", "Прямо сейчас"),
+    ("Почему нельзя наказывать того, кто приносит плохие новости?", "Тогда никто не будет сообщать о проблемах"),
+    ("В чем опасность фразы я такой, какой есть?", "Человек оправдывает свои недостатки характером"),
+    ("Почему нельзя наставлять всех подряд?", "Некоторые люди не хотят меняться"),
+    ("Какие четыре обязательства берут на себя коллеги?", "Забыть прошлое, говорить правду, поддерживать"),
+]
+
+
+def test_bundled_book_routes_most_questions_without_llm():
+    import json
+    from pathlib import Path
+    from src.book_parser.index import BookIndex
+    from src.book_parser.parsers.subchapter_parser import SubchapterParser
+
+    know_map = json.loads(Path("data/knowledge_maps/goldsmith/know_map_full.json").read_text(encoding="utf-8"))
+    index = BookIndex(know_map)
+    parser = SubchapterParser(index)
+    router = SubchapterRouter({number: parser.to_model(sub).model_dump() for number, sub in index.subchapters.items()})
+
+    fallbacks = [
+        question for question, answer in BOOK_QUESTIONS
+        if not services.decide_route(router, f"Вот вопрос пользователя: {question}\nВот как ответил пользователь: {answer}")[1]
+    ]
+    # С порогами по умолчанию к LLM уходит не больше пятой части типичных вопросов
+    assert len(fallbacks) <= len(BOOK_QUESTIONS) // 5, fallbacks
+
+
+@pytest.fixture
+def router_env(monkeypatch):
+    monkeypatch.setattr(services, "_router", None)
+    monkeypatch.setattr(services, "_router_table", None)
+    monkeypatch.setattr(services, "llm_route_cache", services.ContextCache())
+
+    async def fake_version():
+        return "v1"
+
+    async def fake_table(version):
+        return TABLE
+
+    llm_calls = []
+
+    async def fake_llm_route(question):
+        llm_calls.append(question)
+        return "3.6.4"
+
+    monkeypatch.setattr(services, "afetch_book_version", fake_version)
+    monkeypatch.setattr(services, "afetch_subchapter_table", fake_table)
+    monkeypatch.setattr(services, "aroute_subchapter_with_llm", fake_llm_route)
+    return llm_calls
+
+
+def test_confident_route_skips_llm(router_env, monkeypatch):
+    monkeypatch.setattr(services.llm_settings, "router_min_score", 0.1)
+    monkeypatch.setattr(services.llm_settings, "router_min_margin", 0.02)
+    assert asyncio.run(services.aroute_subchapter("Почему работает отслеживание?")) == "3.11.2"
+    assert router_env == []
+
+
+def test_ambiguous_route_falls_back_to_llm_once(router_env, monkeypatch):
+    monkeypatch.setattr(services.llm_settings, "router_min_score", 0.99)
+    monkeypatch.setattr(services.llm_settings, "router_llm_fallback", True)
+    for _ in range(2):
+        assert asyncio.run(services.aroute_subchapter("Почему работает отслеживание?")) == "3.6.4"
+    assert len(router_env) == 1  # выбор LLM взят из кэша
+
+    monkeypatch.setattr(services.llm_settings, "router_llm_fallback", False)
+    assert asyncio.run(services.aroute_subchapter("Почему работает отслеживание?")) == "3.11.2"
+
+
+@respx.mock
+def test_ambiguous_route_uses_async_llm_client(monkeypatch):
+    from types import SimpleNamespace
+    from openai import AuthenticationError
+    from src.llm_search_and_answer.models import BookPartReasoning, ChapterReasoning, SubchapterReasoning
+
+    monkeypatch.setattr(services, "_router", None)
+    monkeypatch.setattr(services, "_router_table", None)
+    monkeypatch.setattr(services, "_book_version", None)
+    monkeypatch.setattr(services, "_subchapter_table", {})
+    monkeypatch.setattr(services, "llm_route_cache", services.ContextCache())
+    monkeypatch.setattr(services, "token_cache", services.TokenCache(services.fetch_token_data))
+    monkeypatch.setattr(services.llm_settings, "router_min_score", 0.99)
+    monkeypatch.setattr(services.llm_settings, "router_llm_fallback", True)
+    tokens = iter(["expired-token", "fresh-token"])
+    respx.get("http://127.0.0.1:8000/token/token").mock(
+        side_effect=lambda request: httpx.Response(200, json={"access_token": next(tokens), "expires_at": 4102444800000})
+    )
+    respx.get("http://127.0.0.1:8001/parser/version").respond(json={"version": "v1"})
+    respx.get("http://127.0.0.1:8001/parser/subchapters").respond(json={"subchapters": TABLE})
+    respx.get("http://127.0.0.1:8001/parser/parts").respond(text="части")
+    respx.get("http://127.0.0.1:8001/parser/parts/3/chapters").respond(text="главы")
+    respx.get("http://127.0.0.1:8001/parser/parts/3/chapters/6/subchapters").respond(text="подглавы")
+
+    responses = {
+        BookPartReasoning: {"initial_analysis": "", "chapter_comparison": "", "final_answer": "", "selected_part": 3},
+        ChapterReasoning: {"preliminary_analysis": "", "chapter_analysis": "", "final_reasoning": "", "selected_chapter": 6},
+        SubchapterReasoning: {
+            "preliminary_analysis": "", "subchapter_analysis": "", "final_reasoning": "", "selected_subchapter": "3.6.4",
+        },
+    }
+    calls = []
+    async def fake_create(**kwargs):
+        calls.append(kwargs)
+        if kwargs["extra_headers"]["Authorization"] == "Bearer expired-token":
+            response = httpx.Response(401, request=httpx.Request("POST", "https://gigachat/chat/completions"))
+            raise AuthenticationError("Unauthorized", response=response, body=None)
+        return kwargs["response_model"](**responses[kwargs["response_model"]])
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(services, "get_async_llm_client", lambda: fake_client)
+    # Синхронный клиент для маршрутизации больше не создаётся
+    monkeypatch.setattr(services, "create_llm_client", lambda: pytest.fail("создан синхронный клиент"))
+
+    assert asyncio.run(services.aroute_subchapter("Почему работает отслеживание?")) == "3.6.4"
+    # Первый запрос получил 401 и повторён с новым токеном, затем шаги 2 и 3
+    assert [call["response_model"] for call in calls] == [
+        BookPartReasoning, BookPartReasoning, ChapterReasoning, SubchapterReasoning,
+    ]
+    assert "подглавы" in calls[-1]["messages"][-1]["content"]
+
+
+def test_merge_selection_puts_primary_first(monkeypatch):
+    monkeypatch.setattr(services.llm_settings, "retrieval_top_k", 2)
+    results = [{"subchapter_number": "3.11.1"}, {"subchapter_number": "3.11.2"}]
+    assert services.merge_selection("3.11.2", results) == ["3.11.2", "3.11.1"]
+    assert services.merge_selection(None, results) == ["3.11.1", "3.11.2"]
+    assert services.merge_selection(None, []) == list(services.port_settings.available_subchapters)
@@ -66,6 +66,66 @@ def test_fetch_subchapter_text():
     text = services.fetch_subchapter_text(subchapter_number)
     assert text == expected_text
 
+@respx.mock
+def test_afetch_subchapters_texts(monkeypatch):
+    import asyncio
+    url = "http://127.0.0.1:8001/parser/subchapters/content"
+    route = respx.post(url).respond(json={"contents": {
+        "2.4.12": {"subchapter_title": "Первая", "pages": [{"page_number": 47}, {"page_number": 48}]},
+        "3.9.1": {"subchapter_title": "Вторая", "pages": [{"page_number": 98}]},
+    }})
+    monkeypatch.setattr(services, "_subchapter_table", {"3.9.1": {"summary": "summary 3.9.1"}})
+
+    texts = asyncio.run(services.afetch_subchapters_texts(["2.4.12", "3.9.1"]))
+    assert route.call_count == 1
+    assert json.loads(route.calls[0].request.content) == {"subchapter_numbers": ["2.4.12", "3.9.1"]}
+    assert list(texts) == ["2.4.12", "3.9.1"]
+    assert "<title>Первая</title>" in texts["2.4.12"]
+    assert "<number_pages>47, 48</number_pages>" in texts["2.4.12"]
+    assert "<summary>summary 3.9.1</summary>" in texts["3.9.1"]
+
+@respx.mock
+def test_abuild_subchapters_context_cached(monkeypatch):
+    import asyncio
+    from src.llm_search_and_answer.cache import ContextCache
+    monkeypatch.setattr(services, "context_cache", ContextCache())
+    monkeypatch.setattr(services, "_book_version", None)
+    monkeypatch.setattr(services.llm_settings, "context_cache_ttl", 0)
+    monkeypatch.setattr(services, "_subchapter_table", {})
+    version_route = respx.get("http://127.0.0.1:8001/parser/version").respond(json={"version": "v1"})
+    respx.get("http://127.0.0.1:8001/parser/subchapters").respond(json={"subchapters": {
+        "2.4.12": {"summary": "summary 2.4.12"},
+    }})
+    content_route = respx.post("http://127.0.0.1:8001/parser/subchapters/content").respond(json={"contents": {
+        "2.4.12": {"subchapter_title": "Первая", "pages": [{"page_number": 47}]},
+    }})
+
+    first = asyncio.run(services.abuild_subchapters_context(["2.4.12"]))
+    second = asyncio.run(services.abuild_subchapters_context(["2.4.12"]))
+    assert first == second
+    assert "<content_subchapter id='2.4.12'>" in first
+    assert content_route.call_count == 1
+
+    # Новая версия книги сбрасывает кэш
+    version_route.respond(json={"version": "v2"})
+    asyncio.run(services.abuild_subchapters_context(["2.4.12"]))
+    assert content_route.call_count == 2
+
+@respx.mock
+def test_get_subchapter_summary_from_table(monkeypatch):
+    monkeypatch.setattr(services, "_subchapter_table", {})
+    monkeypatch.setattr(services, "_book_version", None)
+    monkeypatch.setattr(services.llm_settings, "context_cache_ttl", 0)
+    respx.get("http://127.0.0.1:8001/parser/version").respond(json={"version": "v1"})
+    table_route = respx.get("http://127.0.0.1:8001/parser/subchapters").respond(json={"subchapters": {
+        "3.9.1": {"subchapter_title": "Слушание", "summary": "Краткое описание", "pages": [98]},
+    }})
+
+    assert services.get_subchapter_summary_from_knowmap("3.9.1") == "Краткое описание"
+    assert "недоступно" in services.get_subchapter_summary_from_knowmap("9.9.9")
+    # Таблица загружается один раз на версию книги
+    assert table_route.call_count == 1
+
 # --- Тесты для robust_json_parse ---
 
 def test_robust_json_parse_success():
@@ -213,3 +273,327 @@ def test_get_final_answer(monkeypatch):
     monkeypatch.setattr(fake_client.chat.completions, "create", fake_create_final_answer)
     result = services.get_final_answer(fake_client, "dummy prompt", "dummy final content", "dummy question")
     assert isinstance(result, str) and result.strip() != ""
+
+# --- Тесты для асинхронного пайплайна ---
+
+@respx.mock
+def test_arun_full_reasoning_pipeline(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from src.llm_search_and_answer.cache import ContextCache
+    from src.llm_search_and_answer.models import LLMEvaluation
+
+    monkeypatch.setattr(services, "context_cache", ContextCache())
+    monkeypatch.setattr(services, "token_cache", services.TokenCache(services.fetch_token_data))
+    monkeypatch.setattr(services, "_book_version", None)
+    monkeypatch.setattr(services, "_subchapter_table", {})
+    monkeypatch.setattr(services.port_settings, "available_subchapters", ["3.9.1"])
+    respx.get("http://127.0.0.1:8000/token/token").respond(json={"access_token": "token-1"})
+    respx.get("http://127.0.0.1:8001/parser/version").respond(json={"version": "v1"})
+    respx.get("http://127.0.0.1:8001/parser/subchapters").respond(json={"subchapters": {
+        "3.9.1": {"summary": "Краткое описание"},
+    }})
+    respx.post("http://127.0.0.1:8001/parser/subchapters/content").respond(json={"contents": {
+        "3.9.1": {"subchapter_title": "Слушание", "pages": [{"page_number": 98}]},
+    }})
+
+    calls = []
+    async def fake_create(**kwargs):
+        calls.append(kwargs)
+        return LLMEvaluation(evaluation="ВЕРНО", analysis_text="Ответ полный")
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(services, "get_async_llm_client", lambda: fake_client)
+
+    result = asyncio.run(services.arun_full_reasoning_pipeline("вопрос"))
+    assert result["final_answer"].startswith("ИТОГОВАЯ ОЦЕНКА: ВЕРНО")
+    assert "<summary>Краткое описание</summary>" in result["combined_final_content"]
+    assert calls[0]["extra_headers"] == {"Authorization": "Bearer token-1"}
+
+    # Тот же ответ с другим регистром и пробелами берётся из кэша оценок без запроса к модели
+    cached = asyncio.run(services.arun_full_reasoning_pipeline("  ВОПРОС "))
+    assert cached["final_answer"] == result["final_answer"]
+    assert len(calls) == 1
+    assert services.get_evaluation_cache().stats()["hits"] == 1
+
+
+def test_run_full_reasoning_pipeline_runs_async_pipeline(monkeypatch):
+    import asyncio
+    from src.llm_search_and_answer import clients
+    closed = []
+
+    async def fake_pipeline(question):
+        # Общий HTTP клиент создаётся в цикле событий синхронного вызова
+        clients.get_http_client()
+        return {"final_answer": f"оценка {question}"}
+
+    async def fake_close():
+        closed.append(True)
+
+    monkeypatch.setattr(services, "arun_full_reasoning_pipeline", fake_pipeline)
+    monkeypatch.setattr(services, "close_clients", fake_close)
+
+    assert services.run_full_reasoning_pipeline("вопрос") == {"final_answer": "оценка вопрос"}
+    assert closed == [True]
+    asyncio.run(clients.close_clients())
+
+
+@respx.mock
+def test_arun_batch_reasoning_pipeline(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from src.llm_search_and_answer.cache import ContextCache
+    from src.llm_search_and_answer.models import LLMEvaluation
+
+    monkeypatch.setattr(services, "context_cache", ContextCache())
+    monkeypatch.setattr(services, "token_cache", services.TokenCache(services.fetch_token_data))
+    monkeypatch.setattr(services, "_book_version", None)
+    monkeypatch.setattr(services, "_subchapter_table", {"3.9.1": {"summary": "Краткое описание"}})
+    monkeypatch.setattr(services.port_settings, "available_subchapters", ["3.9.1"])
+    monkeypatch.setattr(services.llm_settings, "batch_concurrency", 2)
+    monkeypatch.setattr(services.llm_settings, "router_llm_fallback", False)
+    token_route = respx.get("http://127.0.0.1:8000/token/token").respond(json={"access_token": "token-1", "expires_at": 4102444800000})
+    respx.get("http://127.0.0.1:8001/parser/version").respond(json={"version": None})
+    content_route = respx.post("http://127.0.0.1:8001/parser/subchapters/content").respond(json={"contents": {
+        "3.9.1": {"subchapter_title": "Слушание", "pages": [{"page_number": 98}]},
+    }})
+
+    active, peak = 0, 0
+    async def fake_create(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        question = kwargs["messages"][-1]["content"].split("Вопрос к пользователю: ")[1].split("\n")[0]
+        return LLMEvaluation(evaluation="ВЕРНО", analysis_text=question)
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(services, "get_async_llm_client", lambda: fake_client)
+
+    answers = asyncio.run(services.arun_batch_reasoning_pipeline([f"вопрос {i}" for i in range(5)]))
+    assert [answer.split("\n\n")[1] for answer in answers] == [f"вопрос {i}" for i in range(5)]
+    assert peak == 2
+    assert content_route.call_count == 1
+    assert token_route.call_count == 1
+
+def test_arun_batch_limits_concurrent_selection(monkeypatch):
+    import asyncio
+    monkeypatch.setattr(services.llm_settings, "batch_concurrency", 2)
+    active, peak = 0, 0
+
+    async def fake_select(question):
+        # Выбор подглав может обращаться к LLM, поэтому тоже ограничен batch_concurrency
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return ["3.9.1"]
+
+    async def fake_context(subchapters, detail="summary"):
+        return "контекст"
+
+    async def fake_answer(key, client, system_prompt, final_content, question_user, semaphore=None):
+        return f"оценка {question_user}"
+
+    monkeypatch.setattr(services, "aselect_subchapters", fake_select)
+    monkeypatch.setattr(services, "abuild_subchapters_context", fake_context)
+    monkeypatch.setattr(services, "acoalesced_final_answer", fake_answer)
+    monkeypatch.setattr(services, "aget_access_token", lambda: asyncio.sleep(0, "token"))
+    monkeypatch.setattr(services, "get_async_llm_client", lambda: None)
+
+    answers = asyncio.run(services.arun_batch_reasoning_pipeline([f"вопрос {i}" for i in range(6)]))
+    assert answers == [f"оценка вопрос {i}" for i in range(6)]
+    assert peak == 2
+
+def test_arun_batch_builds_contexts_concurrently(monkeypatch):
+    import asyncio
+    monkeypatch.setattr(services.llm_settings, "batch_concurrency", 2)
+    built, active, peak = [], 0, 0
+
+    async def fake_select(question):
+        return [question[-1]]
+
+    async def fake_context(subchapters, detail="summary"):
+        # Каждая сборка - запрос к book_parser, поэтому различные контексты собираются параллельно
+        nonlocal active, peak
+        built.append(tuple(subchapters))
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return f"контекст {subchapters[0]}"
+
+    async def fake_answer(key, client, system_prompt, final_content, question_user, semaphore=None):
+        return final_content
+
+    monkeypatch.setattr(services, "aselect_subchapters", fake_select)
+    monkeypatch.setattr(services, "abuild_subchapters_context", fake_context)
+    monkeypatch.setattr(services, "acoalesced_final_answer", fake_answer)
+    monkeypatch.setattr(services, "aget_access_token", lambda: asyncio.sleep(0, "token"))
+    monkeypatch.setattr(services, "get_async_llm_client", lambda: None)
+
+    questions = ["вопрос 1", "вопрос 2", "вопрос 3", "ещё вопрос 1"]
+    answers = asyncio.run(services.arun_batch_reasoning_pipeline(questions))
+    assert answers == ["контекст 1", "контекст 2", "контекст 3", "контекст 1"]
+    assert sorted(built) == [("1",), ("2",), ("3",)]
+    assert peak == 2
+
+@respx.mock
+def test_aselect_subchapters_uses_search(monkeypatch):
+    import asyncio
+    monkeypatch.setattr(services.llm_settings, "retrieval_top_k", 2)
+    search_route = respx.get("http://127.0.0.1:8001/parser/search").respond(json={"results": [
+        {"subchapter_number": "3.11.2", "title": "Почему отслеживание работает", "score": 26.5},
+        {"subchapter_number": "3.11.1", "title": "Без отслеживания", "score": 14.2},
+    ]})
+
+    question = "Вот вопрос пользователя: Почему отслеживание работает?\nВот как ответил пользователь: Не знаю"
+    assert asyncio.run(services.aselect_subchapters(question)) == ["3.11.2", "3.11.1"]
+    params = search_route.calls[0].request.url.params
+    assert params["query"] == "Почему отслеживание работает? Не знаю"
+    assert params["k"] == "2"
+
+    # Пустой результат поиска заменяется подглавами из конфига
+    search_route.respond(json={"results": []})
+    assert asyncio.run(services.aselect_subchapters(question)) == list(services.port_settings.available_subchapters)
+
+# --- Тесты для кэша оценок ---
+
+def test_evaluation_key_normalizes_question_and_answer():
+    from src.llm_search_and_answer.cache import evaluation_key
+
+    key = evaluation_key("Вот вопрос пользователя: Что такое ёмкость?\nВот как ответил пользователь: Объём", "промпт", "model", "контекст")
+    assert key == evaluation_key("Вот вопрос пользователя:  что такое емкость?\nВот как ответил пользователь:  ОБЪЁМ ", "промпт", "model", "контекст")
+    assert key != evaluation_key("Вот вопрос пользователя: Что такое ёмкость?\nВот как ответил пользователь: Объём", "промпт", "model", "другой контекст")
+    assert key != evaluation_key("Вот вопрос пользователя: Что такое ёмкость?\nВот как ответил пользователь: Объём", "новый промпт", "model", "контекст")
+
+
+def test_evaluation_cache_disk_tier(tmp_path):
+    from src.llm_search_and_answer.cache import EvaluationCache
+
+    cache = EvaluationCache(tmp_path / "evaluations.sqlite3", max_entries=1)
+    cache.put("a", "оценка a")
+    cache.put("b", "оценка b")  # "a" вытеснена из памяти, но осталась на диске
+    assert cache.get("a") == "оценка a"
+    assert cache.get("c") is None
+    cache.close()
+
+    reopened = EvaluationCache(tmp_path / "evaluations.sqlite3")
+    assert reopened.get("b") == "оценка b"
+    assert reopened.stats() == {"hits": 1, "disk_hits": 1, "misses": 0, "memory_entries": 1}
+    reopened.close()
+
+def test_single_flight_coalesces_concurrent_calls():
+    import asyncio
+    from src.llm_search_and_answer.cache import SingleFlight
+
+    flights = SingleFlight()
+    calls = []
+
+    async def evaluate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "оценка"
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("key", evaluate) for _ in range(3)), flights.do("other", evaluate))
+        return results, flights.in_flight()
+
+    results, in_flight = asyncio.run(run())
+    assert results == ["оценка"] * 4
+    assert len(calls) == 2
+    assert flights.coalesced == 2
+    assert in_flight == 0
+
+
+def test_single_flight_shares_errors():
+    import asyncio
+    from src.llm_search_and_answer.cache import SingleFlight
+
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("ошибка")
+
+    async def run():
+        return await asyncio.gather(flights.do("key", fail), flights.do("key", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.coalesced == 1
+
+# --- Тесты для кэша токена ---
+
+def test_token_cache_single_flight_and_proactive_refresh():
+    import asyncio
+    import time
+    from src.llm_search_and_answer.cache import TokenCache
+
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"access_token": f"token-{len(calls)}", "expires_at": int((time.time() + 600) * 1000)}
+    cache = TokenCache(fetch, refresh_margin=60)
+
+    async def concurrent_gets():
+        return await asyncio.gather(*(cache.get() for _ in range(10)))
+    assert asyncio.run(concurrent_gets()) == ["token-1"] * 10
+    assert len(calls) == 1
+
+    # Токен скоро истекает: запрос получает текущий токен, новый запрашивается в фоне
+    cache.set("old-token", int((time.time() + 30) * 1000))
+    async def get_near_expiry():
+        token = await cache.get()
+        await cache._refresh_task
+        return token
+    assert asyncio.run(get_near_expiry()) == "old-token"
+    assert cache.token == "token-2"
+
+
+def test_acall_with_token_retries_once_on_401(monkeypatch):
+    import asyncio
+    import time
+    from openai import AuthenticationError
+
+    issued = iter(["expired-token", "fresh-token"])
+    async def fetch():
+        return {"access_token": next(issued), "expires_at": int((time.time() + 600) * 1000)}
+    monkeypatch.setattr(services, "token_cache", services.TokenCache(fetch))
+
+    used = []
+    async def call(token):
+        used.append(token)
+        if token == "expired-token":
+            response = httpx.Response(401, request=httpx.Request("POST", "https://gigachat/chat/completions"))
+            raise AuthenticationError("Unauthorized", response=response, body=None)
+        return "ok"
+
+    assert asyncio.run(services.acall_with_token(call)) == "ok"
+    assert used == ["expired-token", "fresh-token"]
+
+
+def test_evaluation_cache_disk_io_off_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(services.llm_settings, "evaluation_cache_db", str(tmp_path / "evaluations.sqlite3"))
+    cache = services.get_evaluation_cache()
+    loop_thread = threading.get_ident()
+    disk_threads = []
+    get, put = cache.get, cache.put
+    monkeypatch.setattr(cache, "get", lambda key: disk_threads.append(threading.get_ident()) or get(key))
+    monkeypatch.setattr(cache, "put", lambda key, answer: disk_threads.append(threading.get_ident()) or put(key, answer))
+
+    async def evaluate_twice():
+        key, answer = await services.alookup_evaluation("промпт", "контекст", "вопрос")
+        assert answer is None
+        await services.astore_evaluation(key, "оценка")
+        # Оценка из памяти возвращается без обращения к SQLite
+        return await services.alookup_evaluation("промпт", "контекст", "вопрос")
+
+    assert asyncio.run(evaluate_twice())[1] == "оценка"
+    assert len(disk_threads) == 2
+    assert loop_thread not in disk_threads
+    services.close_evaluation_cache()